@@ -0,0 +1,660 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+#
+# Measure the query rate and latency an unbound replica sustains with real
+# records loaded.
+#
+# Records come from a records.json.gz, as the manager writes it to the
+# configmap, or from a rendered records.conf.  With --start, unbound is
+# started on loopback with the server section of the chart's unbound.conf
+# (templates/configmap.yaml filled in from values.yaml) and the records
+# loaded the way initialize.py loads them.  Without it, --server and --port
+# name an unbound that already has the same records loaded.
+#
+# An asyncio client sends a mix of A, PTR, .local and missing-name queries
+# over UDP or TCP, keeping --concurrency queries outstanding in each
+# process, optionally capped at --rate queries a second in total.
+# --reload-at reloads unbound partway through the run with initialize.py's
+# check_for_updates, after changing the mounted data ID as a configmap
+# update would, so the effect of a reload shows in the per-second timeline.
+#
+# Results are written as JSON (stdout unless --output is given), with a
+# summary on stderr.
+#
+# Example:
+#   benchmarks/dns_load.py --start --records records.json.gz --duration 30 \
+#       --mix a=60,ptr=20,local=10,miss=10 --reload-at 15
+#
+
+import argparse
+import array
+import asyncio
+import collections
+import ipaddress
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+CHART = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'kubernetes', 'cray-dns-unbound')
+FILES = os.path.join(CHART, 'files')
+sys.path.insert(0, FILES)
+import dnswire
+import initialize
+import records_codec
+
+KINDS = ('a', 'ptr', 'local', 'miss')
+HISTOGRAM_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+PERCENTILES = (50, 90, 99, 99.9)
+
+A_RECORD = re.compile(r'^\s*local-data:\s*"(\S+?)\.?\s+(?:\d+\s+)?(?:IN\s+)?A\s+(\S+)"', re.M)
+STATIC_ZONE = re.compile(r'^\s*local-zone:\s*"([^"]+)"\s+static', re.M)
+TEMPLATE_VALUE = re.compile(r'\{\{\s*\.Values\.(\w+)\s*\}\}')
+TEMPLATE_CONDITION = re.compile(r'\{\{-\s*if\s+(eq|ne)\s+\.Values\.(\w+)\s+"([^"]*)"\s*\}\}')
+RECORD_ZONES_RANGE = '{{- range splitList " " (include "cray-dns-unbound.recordZones" .) }}'
+RECORD_ZONES = re.compile(r'define "cray-dns-unbound.recordZones" -\}\}\n(.*)\n')
+AUTH_ZONE = re.compile(r'^auth-zone:\s*\n\s*name:\s*"([^"]+)"', re.M)
+
+#
+# Records to query, and the records.conf to load when it was given instead
+# of a records.json.gz.  The .local copy of every name in a records.conf is
+# skipped since the local queries add it back.
+#
+def read_records(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:2] == b'\x1f\x8b':
+        return records_codec.decode(data), None
+    text = data.decode('utf-8')
+    records = [{'hostname': name, 'ip-address': ip} for name, ip in A_RECORD.findall(text)
+               if not name.endswith('.local') and name != 'health.check.unbound']
+    return records, text
+
+#
+# The chart's record zones (cray-dns-unbound.recordZones in _helpers.tpl).
+#
+def record_zones():
+    with open(os.path.join(CHART, 'templates', '_helpers.tpl')) as f:
+        return RECORD_ZONES.search(f.read()).group(1).split()
+
+#
+# The server section of the chart's unbound.conf, with template values
+# filled in from values.yaml and records_format, the record zones filled
+# in, blocks conditional on a value being equal to a string kept or left
+# out, and other conditional and repeated blocks (IPv6, extra
+# access-control, local records and zones) left out, rewritten to listen
+# on loopback only.
+#
+def render_unbound_conf(directory, port, control_port, threads, records_format='local-data'):
+    with open(os.path.join(CHART, 'values.yaml')) as f:
+        values = yaml.safe_load(f)
+    values['containerConfigDirectory'] = directory
+    values['recordsFormat'] = records_format
+    with open(os.path.join(CHART, 'templates', 'configmap.yaml')) as f:
+        template = f.read().split('\n')
+
+    start = template.index('  unbound.conf: |-') + 1
+    conf = []
+    # (kept, zones repeated over, lines) for each enclosing block
+    blocks = []
+    for line in template[start:]:
+        stripped = line.strip()
+        if stripped.startswith('{{-'):
+            condition = TEMPLATE_CONDITION.match(stripped)
+            if stripped == RECORD_ZONES_RANGE:
+                blocks.append((True, record_zones(), []))
+            elif condition:
+                equal = str(values.get(condition.group(2))) == condition.group(3)
+                blocks.append(((condition.group(1) == 'eq') == equal, None, []))
+            elif re.match(r'\{\{-\s*(if|range|with)\b', stripped):
+                blocks.append((False, None, []))
+            elif re.match(r'\{\{-\s*end\b', stripped):
+                kept, zones, lines = blocks.pop()
+                if kept:
+                    (blocks[-1][2] if blocks else conf).extend(
+                        lines if zones is None else [line.replace('{{ . }}', zone) for zone in zones for line in lines])
+            continue
+        if line and not line.startswith('    '):
+            break
+        if stripped and not line.startswith('     ') and stripped != 'server:':
+            break
+        if re.match(r'(interface|port|num-threads):', stripped):
+            continue
+        (blocks[-1][2] if blocks else conf).append(TEMPLATE_VALUE.sub(lambda m: str(values[m.group(1)]), line[4:]))
+
+    conf.extend([
+        '    interface: 127.0.0.1',
+        f'    port: {port}',
+        f'    num-threads: {threads}',
+        '    do-ip6: no',
+        '    username: ""',
+        f'    directory: "{directory}"',
+        f'    pidfile: "{directory}/unbound.pid"',
+        'remote-control:',
+        '    control-enable: yes',
+        '    control-use-cert: no',
+        '    control-interface: 127.0.0.1',
+        f'    control-port: {control_port}',
+    ])
+    # The chart's unbound.conf ends by including the auth zones
+    if records_format == 'auth-zone':
+        conf.append(f'include-toplevel: "{directory}/zones.conf"')
+    conf.append('')
+    return '\n'.join(conf)
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp:
+        udp.bind(('127.0.0.1', 0))
+        return udp.getsockname()[1]
+
+class LocalUnbound(object):
+    """
+    unbound started on loopback from a configmap-like directory, with the
+    records loaded and reloaded by initialize.py.
+    """
+
+    def __init__(self, records_path, records_conf, threads, records_format='local-data'):
+        self.directory = tempfile.mkdtemp(prefix='dns-load-')
+        self.configmap_directory = os.path.join(self.directory, 'configmap')
+        self.config_directory = os.path.join(self.directory, 'etc')
+        os.makedirs(self.configmap_directory)
+        os.makedirs(self.config_directory)
+        self.port = free_port()
+        self.control_port = free_port()
+        self.records_conf = records_conf
+        self.records_format = records_format
+        self.generation = 1
+        self.process = None
+
+        unbound_conf = render_unbound_conf(self.config_directory, self.port, self.control_port, threads,
+                                           records_format)
+        for directory in (self.configmap_directory, self.config_directory):
+            with open(os.path.join(directory, 'unbound.conf'), 'w') as f:
+                f.write(unbound_conf)
+            open(os.path.join(directory, 'custom_records.conf'), 'w').close()
+        open(os.path.join(self.configmap_directory, self.data_id()), 'w').close()
+
+        if records_conf is None:
+            shutil.copyfile(records_path, os.path.join(self.configmap_directory, 'records.json.gz'))
+            shutil.copyfile(records_path, os.path.join(self.config_directory, 'records.json.gz'))
+            with open(records_path, 'rb') as f:
+                records = records_codec.decode(f.read())
+            if records_format == 'auth-zone':
+                records_conf = '\n'.join(initialize.render_auth_zones(
+                    records, True, [zone.rstrip('.') + '.' for zone in record_zones()], self.config_directory)[0])
+            else:
+                records_conf = '\n'.join(initialize.render_local_data(records, True))
+        with open(os.path.join(self.config_directory, 'records.conf'), 'w') as f:
+            f.write(records_conf)
+        with open(os.path.join(self.config_directory, 'config_loaded'), 'w') as f:
+            f.write(self.data_id())
+
+    def data_id(self):
+        return f'..{self.generation:04d}'
+
+    #
+    # The environment initialize.py runs in for this unbound.
+    #
+    def environment(self):
+        return dict(os.environ,
+                    UNBOUND_CONFIG_DIRECTORY=self.config_directory,
+                    UNBOUND_CONFIGMAP_DIRECTORY=self.configmap_directory,
+                    UNBOUND_CONTROL_INTERFACE=f'127.0.0.1@{self.control_port}',
+                    UNBOUND_SERVER_PORT=str(self.port),
+                    UNBOUND_RECORDS_FORMAT=self.records_format,
+                    UNBOUND_AUTH_ZONES=','.join(record_zones()))
+
+    #
+    # Zones answered only from the records, static local zones or the
+    # forward auth zones.
+    #
+    def static_zones(self):
+        with open(os.path.join(self.config_directory, 'unbound.conf')) as f:
+            zones = STATIC_ZONE.findall(f.read())
+        if self.records_format == 'auth-zone':
+            with open(os.path.join(self.config_directory, 'zones.conf')) as f:
+                zones.extend(zone for zone in AUTH_ZONE.findall(f.read()) if not zone.endswith('.arpa.'))
+        return zones
+
+    def start(self, timeout=120):
+        self.process = subprocess.Popen(['unbound', '-d', '-c', os.path.join(self.config_directory, 'unbound.conf')],
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.settimeout(0.2)
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError('unbound exited: ' + self.process.stdout.read().decode('utf-8', 'replace'))
+                try:
+                    probe.sendto(dnswire.build_query(1, 'health.check.unbound'), ('127.0.0.1', self.port))
+                    if dnswire.parse_header(probe.recv(512))[1] == dnswire.RCODE_NOERROR:
+                        return
+                except OSError:
+                    time.sleep(0.2)
+        finally:
+            probe.close()
+        raise RuntimeError(f'unbound did not answer within {timeout}s')
+
+    #
+    # Reload as the unbound pod does when the configmap changes: new data ID,
+    # then initialize.py's check_for_updates against this unbound.
+    #
+    def reload(self):
+        environment = self.environment()
+        if self.records_conf is not None:
+            command = ['unbound-control', '-s', f'127.0.0.1@{self.control_port}', 'reload']
+        else:
+            old_id = self.data_id()
+            self.generation += 1
+            os.rename(os.path.join(self.configmap_directory, old_id),
+                      os.path.join(self.configmap_directory, self.data_id()))
+            command = [sys.executable, '-c', 'import initialize; '
+                       f'initialize.check_for_updates({{"unbound_pid": {self.process.pid}}})']
+        p = subprocess.run(command, cwd=FILES, env=environment, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        if p.returncode != 0:
+            print(p.stdout.decode('utf-8', 'replace'), file=sys.stderr)
+            raise RuntimeError(f'reload failed with exit code {p.returncode}')
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        kind, _, weight = item.partition('=')
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(f'unknown query kind {kind}, expected one of {", ".join(KINDS)}')
+        mix[kind] = float(weight or 1)
+    return mix
+
+#
+# A shuffled list of (kind, query without its ID) cycled through by every
+# client.  Missing names are made up under a static local zone so they are
+# answered with NXDOMAIN without leaving unbound.
+#
+def build_queries(records, mix, miss_zones, count, seed):
+    rng = random.Random(seed)
+    kinds = [kind for kind in KINDS if mix.get(kind)]
+    queries = []
+    for kind in rng.choices(kinds, weights=[mix[kind] for kind in kinds], k=count):
+        record = rng.choice(records)
+        hostname = record['hostname'].rstrip('.')
+        if kind == 'a':
+            query = dnswire.build_query(0, hostname)
+        elif kind == 'local':
+            query = dnswire.build_query(0, hostname + '.local')
+        elif kind == 'ptr':
+            query = dnswire.build_query(0, ipaddress.ip_address(record['ip-address']).reverse_pointer,
+                                        dnswire.TYPE_PTR)
+        else:
+            query = dnswire.build_query(0, f'bench-miss-{rng.getrandbits(32):08x}.{rng.choice(miss_zones)}')
+        queries.append((KINDS.index(kind), query[2:]))
+    return queries
+
+class LoadRun(object):
+    """
+    Query pacing and results for one load generating process.
+    """
+
+    def __init__(self, queries, options):
+        self.queries = queries
+        self.options = options
+        self.position = random.randrange(len(queries))
+        self.clients = []
+        self.running = True
+        self.sent = 0
+        self.outcomes = collections.Counter()
+        self.latencies = array.array('d')
+        self.seconds = array.array('l')
+        self.errors = collections.Counter()
+        self.base = 0.0
+
+    def next_query(self):
+        self.position = (self.position + 1) % len(self.queries)
+        return self.queries[self.position]
+
+    def completed(self, client, kind, rcode, sent):
+        now = asyncio.get_running_loop().time()
+        expected = dnswire.RCODE_NXDOMAIN if KINDS[kind] == 'miss' else dnswire.RCODE_NOERROR
+        outcome = dnswire.RCODES.get(rcode, str(rcode))
+        self.outcomes[(KINDS[kind], outcome)] += 1
+        second = int(sent - self.base)
+        if rcode == expected:
+            self.latencies.append(now - sent)
+            self.seconds.append(second)
+        else:
+            self.errors[second] += 1
+        self.refill(client)
+
+    def failed(self, client, kind, sent, outcome):
+        self.outcomes[(KINDS[kind], outcome)] += 1
+        self.errors[int(sent - self.base)] += 1
+        self.refill(client)
+
+    def refill(self, client):
+        if self.running and not self.options['rate'] and client.connected:
+            client.send_query()
+
+    def outstanding(self):
+        return sum(len(client.pending) for client in self.clients)
+
+class Client(object):
+    def __init__(self, run):
+        self.run = run
+        self.pending = {}
+        self.query_id = random.getrandbits(16)
+        self.connected = False
+
+    def send_query(self):
+        kind, body = self.run.next_query()
+        self.query_id = (self.query_id + 1) & 0xffff
+        while self.query_id in self.pending:
+            self.query_id = (self.query_id + 1) & 0xffff
+        self.pending[self.query_id] = (kind, asyncio.get_running_loop().time())
+        self.run.sent += 1
+        self.write(struct.pack('!H', self.query_id) + body)
+
+    def received(self, message):
+        try:
+            query_id, rcode = dnswire.parse_header(message)
+        except struct.error:
+            return
+        entry = self.pending.pop(query_id, None)
+        if entry is not None:
+            self.run.completed(self, entry[0], rcode, entry[1])
+
+    def expire(self, before):
+        for query_id, (kind, sent) in list(self.pending.items()):
+            if sent < before:
+                del self.pending[query_id]
+                self.run.failed(self, kind, sent, 'timeout')
+
+class UdpClient(Client, asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+        self.connected = True
+
+    def datagram_received(self, data, addr):
+        self.received(data)
+
+    def error_received(self, exc):
+        # ICMP port unreachable while unbound rebinds its sockets
+        self.run.outcomes[('all', type(exc).__name__)] += 1
+
+    def write(self, message):
+        self.transport.sendto(message)
+
+class TcpClient(Client, asyncio.Protocol):
+    def connection_made(self, transport):
+        self.transport = transport
+        self.buffer = bytearray()
+        self.connected = True
+
+    def data_received(self, data):
+        self.buffer += data
+        while len(self.buffer) >= 2:
+            length = struct.unpack_from('!H', self.buffer)[0]
+            if len(self.buffer) < 2 + length:
+                break
+            message = bytes(self.buffer[2:2 + length])
+            del self.buffer[:2 + length]
+            self.received(message)
+
+    def connection_lost(self, exc):
+        # unbound closes client connections on reload
+        self.connected = False
+        for kind, sent in self.pending.values():
+            self.run.failed(self, kind, sent, 'connection_lost')
+        self.pending.clear()
+
+    def write(self, message):
+        self.transport.write(struct.pack('!H', len(message)) + message)
+
+async def connect(run, options):
+    loop = asyncio.get_running_loop()
+    address = (options['server'], options['port'])
+    if options['tcp']:
+        _, client = await loop.create_connection(lambda: TcpClient(run), *address)
+    else:
+        _, client = await loop.create_datagram_endpoint(lambda: UdpClient(run), remote_addr=address)
+    return client
+
+async def pace(run, rate, concurrency):
+    loop = asyncio.get_running_loop()
+    interval = 1.0 / rate
+    next_send = loop.time()
+    turn = 0
+    while run.running:
+        now = loop.time()
+        while next_send <= now and run.outstanding() < concurrency:
+            client = run.clients[turn % len(run.clients)]
+            turn += 1
+            if client.connected:
+                client.send_query()
+            next_send += interval
+        if next_send <= now:
+            # The window is full, do not send a burst once it drains
+            next_send = now
+        await asyncio.sleep(max(next_send - loop.time(), 0.0005))
+
+async def expire(run, timeout):
+    loop = asyncio.get_running_loop()
+    while run.running or run.outstanding():
+        await asyncio.sleep(timeout / 4)
+        for client in run.clients:
+            client.expire(loop.time() - timeout)
+
+async def reconnect(run, options):
+    while run.running:
+        await asyncio.sleep(0.05)
+        for i, client in enumerate(run.clients):
+            if not client.connected and run.running:
+                try:
+                    run.clients[i] = await connect(run, options)
+                except OSError:
+                    run.outcomes[('all', 'connect_failed')] += 1
+                    continue
+                if not options['rate']:
+                    for _ in range(options['concurrency'] // len(run.clients)):
+                        run.clients[i].send_query()
+
+async def generate_load(options):
+    run = LoadRun(options['queries'], options)
+    loop = asyncio.get_running_loop()
+    for _ in range(options['connections']):
+        run.clients.append(await connect(run, options))
+
+    await asyncio.sleep(max(options['start_at'] - time.time(), 0))
+    run.base = loop.time()
+    tasks = [asyncio.ensure_future(expire(run, options['timeout']))]
+    if options['tcp']:
+        tasks.append(asyncio.ensure_future(reconnect(run, options)))
+    if options['rate']:
+        tasks.append(asyncio.ensure_future(pace(run, options['rate'], options['concurrency'])))
+    else:
+        for i in range(options['concurrency']):
+            run.clients[i % len(run.clients)].send_query()
+
+    await asyncio.sleep(options['duration'])
+    run.running = False
+    await asyncio.gather(*tasks)
+    for client in run.clients:
+        client.transport.close()
+    return {'sent': run.sent,
+            'outcomes': [[kind, outcome, count] for (kind, outcome), count in run.outcomes.items()],
+            'latencies': run.latencies.tobytes(),
+            'seconds': run.seconds.tobytes(),
+            'errors': dict(run.errors)}
+
+def run_process(options):
+    return asyncio.run(generate_load(options))
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(int(len(ordered) * q / 100), len(ordered) - 1)]
+
+def summarize(results, duration, reload_window):
+    latencies = array.array('d')
+    seconds = array.array('l')
+    outcomes = collections.Counter()
+    errors = collections.Counter()
+    sent = 0
+    for result in results:
+        sent += result['sent']
+        latencies.frombytes(result['latencies'])
+        seconds.frombytes(result['seconds'])
+        outcomes.update({(kind, outcome): count for kind, outcome, count in result['outcomes']})
+        errors.update({int(second): count for second, count in result['errors'].items()})
+
+    by_second = collections.defaultdict(list)
+    for second, latency in zip(seconds, latencies):
+        by_second[second].append(latency)
+    timeline = []
+    for second in range(int(duration)):
+        ordered = sorted(by_second.get(second, ()))
+        timeline.append({'second': second,
+                         'answered': len(ordered),
+                         'errors': errors.get(second, 0),
+                         'p50_ms': percentile(ordered, 50) * 1000 if ordered else None,
+                         'p99_ms': percentile(ordered, 99) * 1000 if ordered else None})
+
+    ordered = sorted(latencies)
+    histogram = collections.OrderedDict((f'le_{bucket}ms', 0) for bucket in HISTOGRAM_BUCKETS_MS)
+    histogram['le_inf'] = 0
+    bucket = 0
+    for latency in ordered:
+        while bucket < len(HISTOGRAM_BUCKETS_MS) and latency * 1000 > HISTOGRAM_BUCKETS_MS[bucket]:
+            bucket += 1
+        histogram[list(histogram)[bucket]] += 1
+
+    failed = sum(errors.values())
+    return {'sent': sent,
+            'answered': len(ordered),
+            'errors': failed,
+            'error_rate': failed / sent if sent else 0.0,
+            'qps': len(ordered) / duration,
+            'latency_ms': dict({f'p{q:g}': percentile(ordered, q) * 1000 if ordered else None for q in PERCENTILES},
+                               max=ordered[-1] * 1000 if ordered else None),
+            'histogram': histogram,
+            'outcomes': {f'{kind}/{outcome}': count for (kind, outcome), count in sorted(outcomes.items())},
+            'reload': reload_window,
+            'timeline': timeline}
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test unbound with the system\'s records.')
+    parser.add_argument('--records', required=True, help='records.json.gz or rendered records.conf')
+    parser.add_argument('--start', action='store_true', help='start unbound on loopback with the chart\'s unbound.conf')
+    parser.add_argument('--records-format', default='local-data', choices=('local-data', 'auth-zone'),
+                        help='how --start loads a records.json.gz (UNBOUND_RECORDS_FORMAT)')
+    parser.add_argument('--threads', type=int, default=2, help='unbound num-threads with --start')
+    parser.add_argument('--server', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5053, help='unbound port without --start')
+    parser.add_argument('--tcp', action='store_true', help='query over TCP instead of UDP')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('a=60,ptr=20,local=10,miss=10'),
+                        help='query kinds and weights (default: a=60,ptr=20,local=10,miss=10)')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to send queries for')
+    parser.add_argument('--concurrency', type=int, default=100, help='outstanding queries per process')
+    parser.add_argument('--connections', type=int, default=4, help='sockets per process')
+    parser.add_argument('--processes', type=int, default=1, help='load generating processes')
+    parser.add_argument('--rate', type=float, default=0.0, help='total queries a second, 0 for as fast as answered')
+    parser.add_argument('--timeout', type=float, default=2.0, help='seconds before a query counts as lost')
+    parser.add_argument('--reload-at', type=float, help='reload unbound this many seconds into the run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results to this file instead of stdout')
+    args = parser.parse_args()
+    if args.reload_at is not None and not args.start:
+        parser.error('--reload-at needs --start')
+
+    records, records_conf = read_records(args.records)
+    if not records:
+        parser.error(f'no records found in {args.records}')
+    if records_conf is not None and args.records_format != 'local-data':
+        parser.error('--records-format needs a records.json.gz')
+
+    unbound = None
+    port = args.port
+    miss_zones = ['local']
+    if args.start:
+        unbound = LocalUnbound(args.records, records_conf, args.threads, args.records_format)
+        miss_zones = [zone for zone in unbound.static_zones() if zone != 'local'] or miss_zones
+        load_ts = time.perf_counter()
+        unbound.start()
+        port = unbound.port
+        print(f'unbound answering on 127.0.0.1:{port} after {time.perf_counter() - load_ts:.1f}s '
+              f'with {len(records)} records', file=sys.stderr)
+
+    try:
+        queries = build_queries(records, args.mix, miss_zones, 1 << 16, args.seed)
+        start_at = time.time() + 1.0
+        options = [{'queries': queries, 'server': args.server if unbound is None else '127.0.0.1', 'port': port,
+                    'tcp': args.tcp, 'connections': max(args.connections, 1),
+                    'concurrency': max(args.concurrency, 1), 'rate': args.rate / args.processes,
+                    'timeout': args.timeout, 'duration': args.duration, 'start_at': start_at}
+                   for _ in range(args.processes)]
+
+        pool = multiprocessing.get_context('fork').Pool(args.processes)
+        pending = pool.map_async(run_process, options)
+        reload_window = None
+        if args.reload_at is not None:
+            time.sleep(max(start_at + args.reload_at - time.time(), 0))
+            reload_ts = time.time()
+            unbound.reload()
+            reload_window = {'start_second': reload_ts - start_at, 'duration_seconds': time.time() - reload_ts}
+        results = pending.get()
+        pool.close()
+        pool.join()
+    finally:
+        if unbound is not None:
+            unbound.stop()
+
+    summary = summarize(results, args.duration, reload_window)
+    latency = summary['latency_ms']
+    print(f'{summary["qps"]:.0f} qps, {summary["answered"]} answered, error rate {summary["error_rate"]:.4%}, '
+          + ', '.join(f'{q} {value:.3f}ms' for q, value in latency.items() if value is not None), file=sys.stderr)
+    if reload_window:
+        print(f'reload at {reload_window["start_second"]:.1f}s took {reload_window["duration_seconds"]:.2f}s',
+              file=sys.stderr)
+
+    document = {'benchmark': 'dns_load',
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'records': len(records),
+                'transport': 'tcp' if args.tcp else 'udp',
+                'mix': args.mix,
+                'duration': args.duration,
+                'concurrency': args.concurrency,
+                'connections': args.connections,
+                'processes': args.processes,
+                'rate': args.rate,
+                'results': summary}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
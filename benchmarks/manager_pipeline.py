@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+#
+# Time each stage of the manager.py merge pipeline on synthetic systems.
+#
+# For every requested size the Kea, SMD and SLS payloads are generated by
+# synthetic.py and run through the same functions manager.py main() uses:
+#
+#   kea_merge      Kea subnet and global reservations merged and cleaned
+#   smd_cnames     SMD EthernetInterfaces xname CNAME join
+#   sls_hardware   SLS hardware nid / alias correlation
+#   sls_networks   SLS network reservation expansion
+#   diff_encode    sort, digest, delta against the previous records and
+#                  records.json.gz encoding
+#
+# Results are written as JSON (stdout unless --output is given) so runs can
+# be compared across releases.
+#
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'kubernetes', 'cray-dns-unbound', 'files'))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+import manager
+import records_codec
+import synthetic
+
+# Keep manager.py logging off stdout, which carries the results
+manager.handler.setStream(sys.stderr)
+
+STAGES = ('kea_merge', 'smd_cnames', 'sls_hardware', 'sls_networks', 'diff_encode')
+
+def run_pipeline(payloads, nic_index, records_version, expansion_workers=1):
+    timings = {}
+    records = []
+
+    ts = time.perf_counter()
+    kea_records = manager.get_kea_records(payloads['kea'])
+    leases = manager.get_kea_subnet_leases(kea_records['subnet4'])
+    records.extend(manager.merge_kea_leases(leases + kea_records['reservations']))
+    timings['kea_merge'] = time.perf_counter() - ts
+
+    ts = time.perf_counter()
+    records.extend(manager.find_smd_cnames(records, payloads['smd_ethernet_interfaces']))
+    timings['smd_cnames'] = time.perf_counter() - ts
+
+    ts = time.perf_counter()
+    nid_records, new_records = manager.correlate_sls_hardware(
+        payloads['sls_hardware'], payloads['smd_ethernet_interfaces'],
+        payloads['smd_state_components'], records)
+    records.extend(new_records)
+    timings['sls_hardware'] = time.perf_counter() - ts
+
+    ts = time.perf_counter()
+    static_records, _ = manager.expand_network_reservations(payloads['sls_networks'], nid_records, nic_index,
+                                                            expansion_workers)
+    records.extend(static_records)
+    timings['sls_networks'] = time.perf_counter() - ts
+
+    # Compare against a previous run that is missing one record in a hundred
+    existing = records_codec.sort_records(list(records)[::-1])
+    del existing[::100]
+    ts = time.perf_counter()
+    records_codec.sort_records(records)
+    records_codec.digest(records, records_version)
+    manager.build_records_delta(existing, records, 2)
+    encoded = manager.encode_binary_data(records, records_version)
+    timings['diff_encode'] = time.perf_counter() - ts
+
+    return timings, len(records), len(encoded)
+
+def main():
+    parser = argparse.ArgumentParser(description='Time each stage of the manager.py merge pipeline.')
+    parser.add_argument('nodes', nargs='*', type=int, default=[1000, 5000],
+                        help='compute node counts to benchmark (default: 1000 5000)')
+    parser.add_argument('--hsn-nics', type=int, default=2, help='HSN NICs per compute node')
+    parser.add_argument('--nic-alias', default='h0',
+                        help='HSN NIC used for the nid alias, or all (HSN_NIC_ALIAS)')
+    parser.add_argument('--records-version', type=int, default=1, choices=records_codec.FORMAT_VERSIONS)
+    parser.add_argument('--expansion-workers', type=int, default=1,
+                        help='processes for the sls_networks stage (MANAGER_EXPANSION_WORKERS)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per size, the fastest is kept')
+    parser.add_argument('--output', help='write results to this file instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    for nodes in args.nodes:
+        payloads_ts = time.perf_counter()
+        payloads = synthetic.generate(nodes, hsn_nics=args.hsn_nics)
+        print(f'{nodes} nodes: generated payloads {time.perf_counter() - payloads_ts:.1f}s',
+              file=sys.stderr)
+
+        best = None
+        for _ in range(args.repeat):
+            timings, record_count, encoded_size = run_pipeline(payloads, args.nic_alias,
+                                                               args.records_version,
+                                                               args.expansion_workers)
+            if best is None or sum(timings.values()) < sum(best.values()):
+                best = timings
+        print(f'{nodes} nodes: ' + ', '.join(f'{stage} {best[stage]:.3f}s' for stage in STAGES),
+              file=sys.stderr)
+        results.append({'nodes': nodes,
+                        'hsn_nics': args.hsn_nics,
+                        'records': record_count,
+                        'encoded_bytes': encoded_size,
+                        'stages': best,
+                        'total': sum(best.values())})
+
+    document = {'benchmark': 'manager_pipeline',
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'records_version': args.records_version,
+                'expansion_workers': args.expansion_workers,
+                'repeat': args.repeat,
+                'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+#
+# Check that manager.py's indexed Kea lease merge and SMD CNAME join give
+# exactly the records, in the same order, as the list scans they replaced.
+#
+# Both are run on synthetic.py systems and on randomized Kea and SMD data
+# with duplicates, incomplete entries, nid hostnames and SMD entries that
+# match a record's hostname before, after or instead of its IP address.
+# Exits non-zero on the first difference.
+#
+# Usage: benchmarks/merge_equivalence.py [rounds] [seed]
+#
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'kubernetes', 'cray-dns-unbound', 'files'))
+os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+import manager
+import synthetic
+
+#
+# The Kea merge as manager.py main() did it before the (hostname, ip) set.
+#
+def list_scan_merge_kea_leases(leases):
+    master_dns_records = []
+    for lease in leases:
+        # Some nodes might be in discovery
+        if 'hostname' not in lease or 'ip-address' not in lease:
+            continue
+
+        # Having empty values is an error
+        if not lease['hostname'].strip() or not lease['ip-address'].strip():
+            continue
+
+        record = None
+        if lease['hostname'].find('nid') > -1:
+            record = {'hostname': lease['hostname'] + '-nmn',
+                      'ip-address': lease['ip-address']}
+        else:
+            record = {'hostname': lease['hostname'],
+                      'ip-address': lease['ip-address']}
+
+        if record not in master_dns_records:
+            master_dns_records.append(record)
+    return master_dns_records
+
+#
+# The SMD CNAME join as manager.py main() did it before the SMD indexes.
+#
+def list_scan_find_smd_cnames(master_dns_records, smd_records):
+    new_records = []
+    for dns in master_dns_records:
+        for smd in smd_records:
+            # Skip records with blank data
+            if smd['IPAddresses'] == [] or not smd['ComponentID'].strip() or \
+                    smd['IPAddresses'][0]['IPAddress'] == '':
+                continue
+
+            # Skip records with same hostname (expected SMD/Kea duplicates)
+            if smd['ComponentID'] == dns['hostname']:
+                break
+
+            if smd['IPAddresses'][0]['IPAddress'] == dns['ip-address']:
+                new_record = {'hostname': smd['ComponentID'], 'ip-address': smd[
+                    'IPAddresses'][0]['IPAddress']}
+                new_records.append(new_record)
+                break
+    return new_records
+
+def random_leases(rnd, count, hostnames, addresses):
+    leases = []
+    for _ in range(count):
+        lease = {'hostname': rnd.choice(hostnames), 'ip-address': rnd.choice(addresses)}
+        kind = rnd.random()
+        if kind < 0.05:
+            del lease[rnd.choice(('hostname', 'ip-address'))]
+        elif kind < 0.10:
+            lease[rnd.choice(('hostname', 'ip-address'))] = rnd.choice(('', ' '))
+        leases.append(lease)
+    return leases
+
+def random_interfaces(rnd, count, hostnames, addresses):
+    interfaces = []
+    for _ in range(count):
+        kind = rnd.random()
+        if kind < 0.05:
+            ip_addresses = []
+        elif kind < 0.10:
+            ip_addresses = [{'IPAddress': ''}]
+        else:
+            ip_addresses = [{'IPAddress': rnd.choice(addresses)}]
+            if rnd.random() < 0.1:
+                ip_addresses.append({'IPAddress': rnd.choice(addresses)})
+        component = rnd.choice(hostnames) if rnd.random() < 0.5 else rnd.choice(('', ' ', 'x9000c0s0b0'))
+        interfaces.append({'ComponentID': component, 'IPAddresses': ip_addresses})
+    return interfaces
+
+def check(name, expected, actual):
+    if expected != actual:
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            if e != a:
+                break
+        else:
+            i = min(len(expected), len(actual))
+        raise SystemExit(f'{name}: {len(expected)} records from the list scan, {len(actual)} indexed, '
+                         f'first difference at {i}: '
+                         f'{expected[i] if i < len(expected) else None} != {actual[i] if i < len(actual) else None}')
+
+def compare(name, leases, interfaces):
+    expected = list_scan_merge_kea_leases(leases)
+    actual = manager.merge_kea_leases(leases)
+    check(f'{name} kea merge', expected, actual)
+    check(f'{name} smd cnames', list_scan_find_smd_cnames(expected, interfaces),
+          manager.find_smd_cnames(actual, interfaces))
+    return len(expected)
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    for nodes in (100, 1000):
+        payloads = synthetic.generate(nodes, seed=seed)
+        kea_records = manager.get_kea_records(payloads['kea'])
+        leases = manager.get_kea_subnet_leases(kea_records['subnet4']) + kea_records['reservations']
+        records = compare(f'synthetic {nodes} nodes', leases, payloads['smd_ethernet_interfaces'])
+        print(f'synthetic {nodes} nodes: {records} records match')
+
+    rnd = random.Random(seed)
+    for i in range(rounds):
+        size = rnd.randrange(1, 60)
+        # Small name and address pools so duplicates and collisions are common
+        hostnames = [f'nid{n:06d}' for n in range(size // 3 + 1)] + \
+                    [f'x3000c0s{n}b0n0' for n in range(size // 3 + 1)] + ['ncn-w001', 'nid']
+        addresses = [f'10.252.{n // 250}.{n % 250 + 1}' for n in range(size // 2 + 1)]
+        compare(f'random round {i} (seed {seed})', random_leases(rnd, size, hostnames, addresses),
+                random_interfaces(rnd, rnd.randrange(0, 60), hostnames + [h + '-nmn' for h in hostnames], addresses))
+    print(f'{rounds} randomized rounds match')
+
+if __name__ == "__main__":
+    main()
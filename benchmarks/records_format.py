@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+#
+# Compare unbound's load time, reload time and memory with the records in
+# each UNBOUND_RECORDS_FORMAT: local-data lines or auth zone files.
+#
+# For each format unbound is started on loopback with the chart's
+# unbound.conf and the records rendered the way initialize.py renders them
+# (dns_load.py's LocalUnbound).  The load time runs from starting unbound
+# until it answers a sample of the records.  The reload time runs from
+# unbound-control reload until unbound has restarted and answers them
+# again.  RSS is unbound's VmRSS once loaded and after the last reload.
+# Every sampled A, .local and PTR name must resolve, and made-up names in
+# the record zones must be NXDOMAIN, in every format, or the run fails.
+#
+# Records come from a records.json.gz, or are generated by manager.py's
+# merge pipeline for a synthetic.py system of --nodes compute nodes.
+# Results are written as JSON (stdout unless --output is given), with a
+# summary on stderr.
+#
+# Usage: benchmarks/records_format.py [--records records.json.gz | --nodes N]
+#            [--reloads 3] [--threads 2] [--output results.json]
+#
+
+import argparse
+import ipaddress
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+import dns_load
+import dnswire
+import initialize
+import manager
+import records_codec
+import synthetic
+
+# Keep manager.py logging off stdout, which carries the results
+manager.handler.setStream(sys.stderr)
+
+FORMATS = ('local-data', 'auth-zone')
+
+def synthetic_records(nodes):
+    payloads = synthetic.generate(nodes)
+    kea_records = manager.get_kea_records(payloads['kea'])
+    records = manager.merge_kea_leases(manager.get_kea_subnet_leases(kea_records['subnet4'])
+                                       + kea_records['reservations'])
+    records.extend(manager.find_smd_cnames(records, payloads['smd_ethernet_interfaces']))
+    nid_records, new_records = manager.correlate_sls_hardware(
+        payloads['sls_hardware'], payloads['smd_ethernet_interfaces'],
+        payloads['smd_state_components'], records)
+    records.extend(new_records)
+    records.extend(manager.expand_network_reservations(payloads['sls_networks'], nid_records, 'h0')[0])
+    return records_codec.sort_records(records)
+
+#
+# (name, type, expected rcode) queries for a sample of the records and for
+# names missing from the record zones.
+#
+def sample_queries(records, zones, count, seed):
+    rng = random.Random(seed)
+    queries = []
+    for record in rng.sample(records, min(count, len(records))):
+        hostname = record['hostname'].rstrip('.')
+        queries.append((hostname, dnswire.TYPE_A, dnswire.RCODE_NOERROR))
+        queries.append((hostname + '.local', dnswire.TYPE_A, dnswire.RCODE_NOERROR))
+        queries.append((ipaddress.ip_address(record['ip-address']).reverse_pointer, dnswire.TYPE_PTR,
+                        dnswire.RCODE_NOERROR))
+    for zone in zones:
+        queries.append((f'bench-miss-{rng.getrandbits(32):08x}.{zone.rstrip(".")}', dnswire.TYPE_A,
+                        dnswire.RCODE_NXDOMAIN))
+    return queries
+
+#
+# The queries not answered as expected, with what they got instead.
+#
+def check_answers(port, queries, timeout=2.0):
+    wrong = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        for query_id, (name, qtype, expected) in enumerate(queries):
+            try:
+                sock.sendto(dnswire.build_query(query_id, name, qtype), ('127.0.0.1', port))
+                response = dnswire.parse_response(sock.recv(4096))
+            except OSError:
+                wrong.append((name, qtype, 'no answer'))
+                continue
+            if response.rcode != expected or (expected == dnswire.RCODE_NOERROR and not response.answers):
+                wrong.append((name, qtype, dnswire.RCODES.get(response.rcode, str(response.rcode))))
+    return wrong
+
+def wait_for_answers(port, queries, timeout):
+    deadline = time.perf_counter() + timeout
+    while True:
+        wrong = check_answers(port, queries)
+        if not wrong or time.perf_counter() >= deadline:
+            return wrong
+        time.sleep(0.05)
+
+def unbound_rss(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return None
+
+def measure(records_path, records, records_format, args):
+    unbound = dns_load.LocalUnbound(records_path, None, args.threads, records_format)
+    try:
+        records_conf = os.path.join(unbound.config_directory, 'records.conf')
+        with open(records_conf) as f:
+            records_conf_lines = sum(1 for _ in f)
+        rendered_bytes = os.path.getsize(records_conf)
+        zone_files = os.path.join(unbound.config_directory, 'zones')
+        if os.path.isdir(zone_files):
+            rendered_bytes += sum(os.path.getsize(os.path.join(zone_files, name)) for name in os.listdir(zone_files))
+        queries = sample_queries(records, unbound.static_zones(), args.sample, args.seed)
+
+        load_ts = time.perf_counter()
+        unbound.start(args.timeout)
+        wrong = wait_for_answers(unbound.port, queries, args.timeout)
+        load_seconds = time.perf_counter() - load_ts
+        if wrong:
+            raise SystemExit(f'{records_format}: {len(wrong)} of {len(queries)} queries answered wrongly after '
+                             f'loading, for example {wrong[:5]}')
+        loaded_rss = unbound_rss(unbound.process.pid)
+
+        # initialize.py's reload wait, against this unbound
+        os.environ.update(UNBOUND_CONTROL_INTERFACE=f'127.0.0.1@{unbound.control_port}',
+                          UNBOUND_SERVER_PORT=str(unbound.port))
+        reload_times = []
+        for _ in range(args.reloads):
+            reload_ts = time.perf_counter()
+            if initialize.unbound_control(['reload']).returncode != 0:
+                raise SystemExit(f'{records_format}: unbound-control reload failed')
+            if initialize.wait_for_reload(reload_ts, True, args.timeout) is None:
+                raise SystemExit(f'{records_format}: unbound did not answer within {args.timeout}s of a reload')
+            wrong = wait_for_answers(unbound.port, queries, args.timeout)
+            if wrong:
+                raise SystemExit(f'{records_format}: {len(wrong)} of {len(queries)} queries answered wrongly after '
+                                 f'a reload, for example {wrong[:5]}')
+            reload_times.append(time.perf_counter() - reload_ts)
+
+        return {'format': records_format,
+                'rendered_bytes': rendered_bytes,
+                'records_conf_lines': records_conf_lines,
+                'load_seconds': load_seconds,
+                'reload_seconds': {'min': min(reload_times), 'median': statistics.median(reload_times),
+                                   'max': max(reload_times)} if reload_times else None,
+                'rss_bytes': {'loaded': loaded_rss, 'reloaded': unbound_rss(unbound.process.pid)},
+                'queries_checked': len(queries)}
+    finally:
+        unbound.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare unbound load and reload with each records format.')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--records', help='records.json.gz to load')
+    source.add_argument('--nodes', type=int, default=5000, help='compute nodes of a synthetic system (default 5000)')
+    parser.add_argument('--formats', default=','.join(FORMATS), help=f'formats to compare (default {",".join(FORMATS)})')
+    parser.add_argument('--reloads', type=int, default=3, help='reloads to time per format')
+    parser.add_argument('--threads', type=int, default=2, help='unbound num-threads')
+    parser.add_argument('--sample', type=int, default=200, help='records whose names are checked')
+    parser.add_argument('--timeout', type=float, default=300.0, help='seconds to wait for unbound to answer')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results to this file instead of stdout')
+    args = parser.parse_args()
+    formats = args.formats.split(',')
+    for records_format in formats:
+        if records_format not in FORMATS:
+            parser.error(f'unknown format {records_format}, expected one of {", ".join(FORMATS)}')
+    for command in ('unbound', 'unbound-control'):
+        if shutil.which(command) is None:
+            parser.error(f'{command} is not on the PATH')
+
+    directory = tempfile.mkdtemp(prefix='records-format-')
+    try:
+        if args.records:
+            records_path = args.records
+            with open(records_path, 'rb') as f:
+                records = records_codec.decode(f.read())
+        else:
+            records = synthetic_records(args.nodes)
+            records_path = os.path.join(directory, 'records.json.gz')
+            with open(records_path, 'wb') as f:
+                f.write(records_codec.encode(records))
+        print(f'{len(records)} records', file=sys.stderr)
+
+        results = []
+        for records_format in formats:
+            result = measure(records_path, records, records_format, args)
+            reload_seconds = result['reload_seconds']
+            print(f'{records_format:10}  load {result["load_seconds"]:.3f}s'
+                  + (f'  reload {reload_seconds["median"]:.3f}s' if reload_seconds else '')
+                  + f'  rss {result["rss_bytes"]["loaded"] / 2**20:.0f}MB'
+                  f' ({result["rss_bytes"]["reloaded"] / 2**20:.0f}MB reloaded)'
+                  f'  rendered {result["rendered_bytes"] / 1e6:.1f}MB', file=sys.stderr)
+            results.append(result)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    document = {'benchmark': 'records_format',
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'unbound': subprocess.run(['unbound', '-V'], stdout=subprocess.PIPE,
+                                          stderr=subprocess.STDOUT).stdout.decode('utf-8').split('\n')[0],
+                'records': len(records),
+                'threads': args.threads,
+                'reloads': args.reloads,
+                'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
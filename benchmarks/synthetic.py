@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+#
+# Synthetic Kea, SMD and SLS payloads shaped like the responses manager.py
+# reads, for a system of a given size.
+#
+# Compute nodes fill Mountain cabinets (x1000 and up, 8 chassis of 8 slots
+# with 2 BMCs of 2 nodes each).  NCNs and UANs sit in River cabinet x3000
+# with zero padded slot numbers in their HSN reservation names, the way
+# CSM names them.  Every compute node has hsn_nics HSN NICs.
+#
+# Usage: benchmarks/synthetic.py nodes [output.json]
+#
+
+import ipaddress
+import json
+import random
+import sys
+
+NMN = int(ipaddress.IPv4Address('10.100.0.0'))
+HMN = int(ipaddress.IPv4Address('10.104.0.0'))
+HSN = int(ipaddress.IPv4Address('10.112.0.0'))
+CHN = int(ipaddress.IPv4Address('10.103.9.0'))
+
+NCN_ROLES = (('m', 'Master', 3), ('w', 'Worker', 5), ('s', 'Storage', 3))
+
+def address(base, index):
+    return str(ipaddress.IPv4Address(base + index))
+
+def mac(index):
+    return ':'.join(f'{b:02x}' for b in (0xb4, 0x2e) + tuple((index >> s) & 255 for s in (24, 16, 8, 0)))
+
+def compute_xname(index):
+    cabinet = 1000 + index // 256
+    chassis = index // 32 % 8
+    slot = index // 4 % 8
+    bmc = index // 2 % 2
+    return f'x{cabinet}c{chassis}s{slot}b{bmc}n{index % 2}'
+
+def generate(nodes, hsn_nics=2, uans=None, seed=1):
+    rnd = random.Random(seed)
+    if uans is None:
+        uans = max(2, nodes // 500)
+
+    kea_global = []
+    kea_subnets = {'nmn': [], 'hmn': []}
+    interfaces = []
+    components = []
+    hardware = []
+    reservations = {'NMN': [], 'HMN': [], 'HSN': [], 'CHN': []}
+
+    # (xname, HSN reservation name prefix, role, subrole, nid, alias, class)
+    machines = []
+    nid = 0
+    for prefix, subrole, count in NCN_ROLES:
+        for i in range(count):
+            nid += 1
+            slot = len(machines) + 1
+            machines.append((f'x3000c0s{slot}b0n0', f'x3000c0s{slot:02d}b0n0', 'Management', subrole,
+                             nid, f'ncn-{prefix}{i + 1:03d}', 'River'))
+    for i in range(uans):
+        slot = len(machines) + 1
+        machines.append((f'x3000c0s{slot}b0n0', f'x3000c0s{slot:02d}b0n0', 'Application', 'UAN',
+                         None, f'uan{i + 1:02d}', 'River'))
+    for i in range(nodes):
+        xname = compute_xname(i)
+        machines.append((xname, xname, 'Compute', None, i + 1, f'nid{i + 1:06d}', 'Mountain'))
+
+    bmcs = set()
+    for index, (xname, hsn_name, role, subrole, nid, alias, hw_class) in enumerate(machines):
+        bmc = xname[:xname.rindex('n')]
+        nmn_ip = address(NMN, index + 1)
+
+        # Kea reserves compute node and BMC addresses; NCNs are static
+        if role == 'Compute':
+            kea_subnets['nmn'].append({'hostname': alias, 'ip-address': nmn_ip,
+                                       'hw-address': mac(index)})
+        if role != 'Management' and bmc not in bmcs:
+            kea_subnets['hmn'].append({'hostname': bmc, 'ip-address': address(HMN, len(bmcs) + 1),
+                                       'hw-address': mac(1 << 24 | len(bmcs))})
+
+        interfaces.append({'ID': mac(index).replace(':', ''), 'Description': 'Ethernet Interface Lan1',
+                           'MACAddress': mac(index), 'IPAddresses': [{'IPAddress': nmn_ip}],
+                           'LastUpdate': '2026-01-01T00:00:00.000000Z', 'ComponentID': xname,
+                           'Type': 'Node'})
+        if bmc not in bmcs:
+            interfaces.append({'ID': mac(1 << 24 | len(bmcs)).replace(':', ''),
+                               'Description': 'Ethernet Interface BMC',
+                               'MACAddress': mac(1 << 24 | len(bmcs)),
+                               'IPAddresses': [{'IPAddress': address(HMN, len(bmcs) + 1)}],
+                               'LastUpdate': '2026-01-01T00:00:00.000000Z', 'ComponentID': bmc,
+                               'Type': 'NodeBMC'})
+            reservations['HMN'].append({'Name': bmc, 'IPAddress': address(HMN, len(bmcs) + 1)})
+            bmcs.add(bmc)
+
+        component = {'ID': xname, 'Type': 'Node', 'State': 'Ready', 'Flag': 'OK',
+                     'Enabled': True, 'Role': role, 'Arch': 'X86', 'Class': hw_class}
+        if subrole:
+            component['SubRole'] = subrole
+        if role == 'Application':
+            component['NID'] = 49000 + index
+        elif nid is not None:
+            component['NID'] = nid
+        components.append(component)
+
+        extra = {'Role': role, 'Aliases': [alias]}
+        if subrole:
+            extra['SubRole'] = subrole
+        if nid is not None:
+            extra['NID'] = nid
+        hardware.append({'Parent': bmc, 'Xname': xname, 'Type': 'comptype_node',
+                         'Class': hw_class, 'TypeString': 'Node', 'ExtraProperties': extra})
+
+        if role != 'Compute':
+            reservations['NMN'].append({'Name': alias, 'IPAddress': nmn_ip,
+                                        'Aliases': [f'{alias}-nmn', f'{xname}-nmn', '']})
+            reservations['CHN'].append({'Name': alias, 'IPAddress': address(CHN, index + 1)})
+
+        nics = hsn_nics if role == 'Compute' else 1
+        for port in range(nics):
+            reservations['HSN'].append({'Name': f'{hsn_name}h{port}',
+                                        'IPAddress': address(HSN, index * hsn_nics + port + 1)})
+
+    # A handful of globals and incomplete reservations, as seen on real systems
+    for i in range(20):
+        kea_global.append({'hostname': f'sw-leaf-{i + 1:03d}', 'ip-address': address(HMN, 60000 + i)})
+    kea_global.append({'hostname': '', 'ip-address': address(HMN, 60100)})
+    kea_global.append({'ip-address': address(HMN, 60101)})
+    for i in range(max(1, len(interfaces) // 50)):
+        interfaces.append({'ID': f'unknown{i}', 'ComponentID': ' ',
+                           'IPAddresses': [{'IPAddress': address(NMN, rnd.randrange(1, nodes + 1))}]})
+
+    kea = [{'result': 0, 'arguments': {'Dhcp4': {
+        'reservations': kea_global,
+        'subnet4': [{'id': 1, 'subnet': '10.100.0.0/14', 'reservations': kea_subnets['nmn']},
+                    {'id': 2, 'subnet': '10.104.0.0/14', 'reservations': kea_subnets['hmn']},
+                    {'id': 3, 'subnet': '10.254.0.0/17'}]}}}]
+
+    def network(name, records, chunk=4096):
+        subnets = [{'Name': f'{name.lower()}_{i // chunk}', 'IPReservations': records[i:i + chunk]}
+                   for i in range(0, len(records), chunk)]
+        return {'Name': name, 'FullName': name, 'Type': 'ethernet',
+                'ExtraProperties': {'Subnets': subnets}}
+
+    networks = [network('HSN', reservations['HSN']),
+                network('NMN', reservations['NMN']),
+                network('HMN', reservations['HMN']),
+                network('CHN', reservations['CHN']),
+                {'Name': 'NMN_RVR', 'ExtraProperties': {'Subnets': []}},
+                {'Name': 'BICAN'}]
+
+    return {'kea': kea,
+            'smd_ethernet_interfaces': interfaces,
+            'smd_state_components': {'Components': components},
+            'sls_hardware': hardware,
+            'sls_networks': networks}
+
+if __name__ == "__main__":
+    payloads = generate(int(sys.argv[1]))
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], 'w') as f:
+            json.dump(payloads, f)
+    else:
+        json.dump(payloads, sys.stdout)
@@ -1,54 +1,182 @@
 #!/usr/bin/env python3
 
+import datetime
+import hashlib
 import os
 import requests
-import shared
+import kubeapi
+import metrics
 import re
 import time
 
-time.sleep(3) # a really quick sleep upfront as it'll give our istio-proxy channel out to be ready
-              # better chance for a successful first attempt connecting out through the mesh
-
-print('Loading current CoreDNS configmap in namespace {}: {}'.format(os.environ['KUBERNETES_COREDNS_NAMESPACE'], os.environ['KUBERNETES_COREDNS_CONFIGMAP_NAME']))
-# we'll give some time for connection errors to settle, as this job will work within the
-# istio service mesh, and connectivity out through the istio-proxy out may take just
-# a few. We'll give it about 30 seconds before we fail hard for the job
-connection_retries = 0
-max_connection_retries = 10
-wait_seconds_between_retries = 3
-while True:
-    try:
-        corefile = shared.run_command(['kubectl', 'get', 'configmap', os.environ['KUBERNETES_COREDNS_CONFIGMAP_NAME'], '-n',
-            os.environ['KUBERNETES_COREDNS_NAMESPACE'], '-o', 'jsonpath={.data[\'Corefile\']}'])
-        break
-    except BaseException as err:
-        connection_retries += 1
-        message = 'Error connecting to Kubernetes API: {}'.format(err)
-        if connection_retries <= max_connection_retries:
-            print('Retrying connection shortly...')
-            time.sleep(wait_seconds_between_retries)
-            continue
+#
+# Point CoreDNS at unbound.
+#
+# The forward and max_concurrent lines of the current Corefile are rewritten
+# and the configmap is only patched when that changes it, so an upgrade that
+# does not change the Corefile leaves CoreDNS alone.  A changed Corefile is
+# picked up by CoreDNS's reload plugin in each running pod, once the kubelet
+# has synced the configmap volume, without restarting it and dropping its
+# cache.  Only a Corefile without the reload plugin is given it and the
+# deployment restarted, once, so the plugin is loaded for later changes.
+#
+# Each pod's reload is confirmed by the Corefile hash in its
+# coredns_reload_version_info metric.
+#
+
+RESTARTED_AT_ANNOTATION = 'kubectl.kubernetes.io/restartedAt'
+RELOAD_VERSION_INFO = re.compile(r'(?m)^coredns_reload_version_info\{[^}]*value="([0-9a-f]+)"')
+
+def render_corefile(corefile, forward_ip, max_concurrent):
+    corefile = re.sub(r'(?m)(^\s*)forward.*$', r'\1forward . %s {' % forward_ip, corefile)
+    corefile = re.sub(r'(?m)(^\s*)max_concurrent.*$', r'\1max_concurrent %s' % max_concurrent, corefile)
+    return corefile
+
+def has_reload_plugin(corefile):
+    return re.search(r'(?m)^\s*reload(\s|$)', corefile) is not None
+
+#
+# Add the reload plugin at the top of every server block, indented like the
+# block's first directive.
+#
+def add_reload_plugin(corefile):
+    return re.sub(r'(?m)^(\S[^\n]*\{[ \t]*\n)([ \t]+)', r'\1\2reload\n\2', corefile)
+
+#
+# Hashes the reload plugin reports a Corefile's contents under, sha512 since
+# CoreDNS 1.8 and md5 before.
+#
+def corefile_hashes(corefile):
+    body = corefile.encode('utf-8')
+    return {hashlib.sha512(body).hexdigest(), hashlib.md5(body).hexdigest()}
+
+def get_deployment(kube, namespace, name):
+    return kube.get(f'/apis/apps/v1/namespaces/{namespace}/deployments/{name}')
+
+def list_deployment_pods(kube, namespace, deployment):
+    match_labels = deployment['spec']['selector'].get('matchLabels', {})
+    selector = ','.join(f'{key}={value}' for key, value in sorted(match_labels.items()))
+    return [pod for pod in kube.list_pods(namespace, selector)
+            if pod.get('status', {}).get('phase') == 'Running' and pod['status'].get('podIP')]
+
+#
+# Trigger a rolling restart the way kubectl rollout restart does.
+#
+def restart_deployment(kube, namespace, name):
+    restarted_at = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    kube.patch(f'/apis/apps/v1/namespaces/{namespace}/deployments/{name}',
+               {'spec': {'template': {'metadata': {'annotations': {RESTARTED_AT_ANNOTATION: restarted_at}}}}})
+
+def loaded_corefile_hash(address, port):
+    response = requests.get(f'http://{address}:{port}/metrics', timeout=5)
+    response.raise_for_status()
+    match = RELOAD_VERSION_INFO.search(response.text)
+    return match.group(1) if match else None
+
+#
+# Poll each pod's metrics until it reports the new Corefile.  Returns the
+# pods that reloaded it and those whose metrics could never be read.
+#
+def wait_for_reloads(pods, corefile, port, timeout, interval=5):
+    hashes = corefile_hashes(corefile)
+    waiting = {pod['metadata']['name']: pod['status']['podIP'] for pod in pods}
+    reachable = set()
+    reloaded = []
+    deadline = time.monotonic() + timeout
+    while waiting:
+        for name, address in list(waiting.items()):
+            try:
+                loaded = loaded_corefile_hash(address, port)
+            except requests.exceptions.RequestException:
+                continue
+            reachable.add(name)
+            if loaded in hashes:
+                print(f'  {name} reloaded the Corefile')
+                reloaded.append(name)
+                del waiting[name]
+        if not waiting or time.monotonic() + interval > deadline:
+            break
+        time.sleep(interval)
+    for name in sorted(waiting):
+        if name in reachable:
+            print(f'  {name} did not reload the Corefile within {timeout:.0f}s')
         else:
-            print(message)
-            raise SystemExit(err)
-
-corefile = re.sub(r'(?m)(^\s*)forward.*$', r'\1forward . %s {' % os.environ['NMN_LOAD_BALANCER_IP'], corefile)
-corefile = re.sub(r'(?m)(^\s*)max_concurrent.*$', r'\1max_concurrent %s' % os.environ['COREDNS_CONCURRENT_CONNECTIONS_FWDER'], corefile)
-
-corefile_patch = """
-data:
-  Corefile: |
-{}
-""".format(re.sub(r'(?m)^', r'    ', corefile))
-with open('/tmp/patch.yaml', 'w') as f:
-    f.write(corefile_patch)
-with open('/tmp/patch.sh', 'w') as f:
-    f.write('#!/bin/bash\nkubectl patch configmap {} -n {} -p "$(cat /tmp/patch.yaml)"'.format(os.environ['KUBERNETES_COREDNS_CONFIGMAP_NAME'], os.environ['KUBERNETES_COREDNS_NAMESPACE']))
-shared.run_command(['chmod', '+x', '/tmp/patch.sh'])
-
-print('Patching the CoreDNS configmap to forward to: {}'.format(os.environ['NMN_LOAD_BALANCER_IP']))
-print(corefile_patch)
-shared.run_command(['/bin/bash', '-c', '/tmp/patch.sh'])
-print('Running a rolling restart of the CoreDNS deployment...')
-shared.run_command(['kubectl', '-n', os.environ['KUBERNETES_COREDNS_NAMESPACE'], 'rollout', 'restart', 'deployment',
-    os.environ['KUBERNETES_COREDNS_DEPLOYMENT_NAME']])
+            print(f'  Unable to read the reloaded Corefile version from {name}')
+    return reloaded, sorted(set(waiting) - reachable)
+
+def report(changed, pods, restarted=0, reloaded=0, unverified=0):
+    print(f'CoreDNS pods: {pods}, restarted: {restarted}, reloaded: {reloaded}'
+          + (f', unverified: {unverified}' if unverified else ''))
+    registry = metrics.Registry.from_environment('cray_dns_unbound_coredns', instance='cray-dns-unbound')
+    registry.set('corefile_changed', int(changed), 'Whether the Corefile was patched')
+    registry.set('pods', pods, 'Running CoreDNS pods')
+    registry.set('pods_restarted', restarted, 'CoreDNS pods restarted to apply the Corefile')
+    registry.set('pods_reloaded', reloaded, 'CoreDNS pods that reloaded the Corefile without a restart')
+    registry.set('pods_unverified', unverified, 'CoreDNS pods whose reload could not be confirmed')
+    registry.write()
+
+def main():
+    namespace = os.environ['KUBERNETES_COREDNS_NAMESPACE']
+    configmap_name = os.environ['KUBERNETES_COREDNS_CONFIGMAP_NAME']
+    deployment_name = os.environ['KUBERNETES_COREDNS_DEPLOYMENT_NAME']
+    forward_ip = os.environ['NMN_LOAD_BALANCER_IP']
+    max_concurrent = os.environ['COREDNS_CONCURRENT_CONNECTIONS_FWDER']
+    metrics_port = int(os.environ.get('COREDNS_METRICS_PORT', '9153'))
+    reload_timeout = float(os.environ.get('COREDNS_RELOAD_TIMEOUT_SECONDS', '180'))
+
+    time.sleep(3) # a really quick sleep upfront as it'll give our istio-proxy channel out to be ready
+                  # better chance for a successful first attempt connecting out through the mesh
+
+    kube = kubeapi.KubernetesAPI()
+    print('Loading current CoreDNS configmap in namespace {}: {}'.format(namespace, configmap_name))
+    # we'll give some time for connection errors to settle, as this job will work within the
+    # istio service mesh, and connectivity out through the istio-proxy out may take just
+    # a few. We'll give it about 30 seconds before we fail hard for the job.  A configmap
+    # modified between our read and patch is read again.
+    connection_retries = 0
+    max_connection_retries = 10
+    wait_seconds_between_retries = 3
+    while True:
+        try:
+            configmap = kube.get_configmap(namespace, configmap_name)
+            corefile = (configmap.get('data') or {}).get('Corefile', '')
+            reloadable = has_reload_plugin(corefile)
+            rendered = render_corefile(corefile, forward_ip, max_concurrent)
+            if not reloadable:
+                rendered = add_reload_plugin(rendered)
+            pods = list_deployment_pods(kube, namespace, get_deployment(kube, namespace, deployment_name))
+            if rendered == corefile:
+                print('The CoreDNS Corefile already forwards to {}, nothing to do'.format(forward_ip))
+                report(False, len(pods))
+                return
+            print('Patching the CoreDNS configmap to forward to: {}'.format(forward_ip))
+            print(rendered)
+            kube.patch_configmap(namespace, configmap_name, {'data': {'Corefile': rendered}},
+                                 resource_version=configmap['metadata']['resourceVersion'])
+            break
+        except kubeapi.ConflictError:
+            print('The CoreDNS configmap changed while patching it, reading it again')
+            continue
+        except BaseException as err:
+            connection_retries += 1
+            message = 'Error connecting to Kubernetes API: {}'.format(err)
+            if connection_retries <= max_connection_retries:
+                print('Retrying connection shortly...')
+                time.sleep(wait_seconds_between_retries)
+                continue
+            else:
+                print(message)
+                raise SystemExit(err)
+
+    if not reloadable:
+        print('The Corefile had no reload plugin, running a rolling restart of the CoreDNS deployment...')
+        restart_deployment(kube, namespace, deployment_name)
+        report(True, len(pods), restarted=len(pods))
+        return
+
+    print('Waiting up to {:.0f}s for {} CoreDNS pods to reload the Corefile...'.format(reload_timeout, len(pods)))
+    reloaded, unverified = wait_for_reloads(pods, rendered, metrics_port, reload_timeout)
+    report(True, len(pods), reloaded=len(reloaded), unverified=len(unverified))
+
+if __name__ == "__main__":
+    main()
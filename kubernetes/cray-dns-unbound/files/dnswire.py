@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+import collections
+import ipaddress
+import struct
+
+#
+# Minimal DNS wire format (RFC 1035) encoding and decoding, enough to send
+# single-question queries to unbound and read the answers back without a
+# resolver binary or third-party library.
+#
+
+TYPE_A = 1
+TYPE_NS = 2
+TYPE_CNAME = 5
+TYPE_SOA = 6
+TYPE_PTR = 12
+TYPE_MX = 15
+TYPE_TXT = 16
+TYPE_AAAA = 28
+TYPE_SRV = 33
+CLASS_IN = 1
+
+RCODE_NOERROR = 0
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+
+TYPES = {'A': TYPE_A, 'NS': TYPE_NS, 'CNAME': TYPE_CNAME, 'SOA': TYPE_SOA, 'PTR': TYPE_PTR, 'MX': TYPE_MX,
+         'TXT': TYPE_TXT, 'AAAA': TYPE_AAAA, 'SRV': TYPE_SRV}
+RCODES = {0: 'NOERROR', 1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+
+FLAG_RD = 0x0100
+
+HEADER = struct.Struct('!HHHHHH')
+RR_FIXED = struct.Struct('!HHIH')
+
+Answer = collections.namedtuple('Answer', ['name', 'type', 'ttl', 'data'])
+Response = collections.namedtuple('Response', ['id', 'rcode', 'answers'])
+
+def encode_name(name):
+    labels = [label for label in name.rstrip('.').split('.') if label]
+    encoded = b''.join(struct.pack('!B', len(label)) + label.encode('ascii') for label in labels)
+    return encoded + b'\0'
+
+def build_query(query_id, name, qtype=TYPE_A, recursion_desired=True):
+    flags = FLAG_RD if recursion_desired else 0
+    return HEADER.pack(query_id, flags, 1, 0, 0, 0) + encode_name(name) + struct.pack('!HH', qtype, CLASS_IN)
+
+#
+# Read the (possibly compressed) name at offset, returning it with a
+# trailing dot and the offset just past it in the message.
+#
+def decode_name(message, offset):
+    labels = []
+    end = None
+    for _ in range(128):
+        length = message[offset]
+        if length & 0xc0 == 0xc0:
+            if end is None:
+                end = offset + 2
+            offset = struct.unpack_from('!H', message, offset)[0] & 0x3fff
+            continue
+        offset += 1
+        if length == 0:
+            return '.'.join(labels) + '.', end if end is not None else offset
+        labels.append(message[offset:offset + length].decode('ascii', errors='replace'))
+        offset += length
+    raise ValueError('DNS name compression loop')
+
+def decode_rdata(message, offset, rtype, length):
+    rdata = message[offset:offset + length]
+    if rtype == TYPE_A and length == 4:
+        return str(ipaddress.IPv4Address(rdata))
+    if rtype == TYPE_AAAA and length == 16:
+        return str(ipaddress.IPv6Address(rdata))
+    if rtype == TYPE_PTR:
+        return decode_name(message, offset)[0]
+    if rtype == TYPE_TXT:
+        strings = []
+        i = 0
+        while i < length:
+            strings.append(rdata[i + 1:i + 1 + rdata[i]].decode('utf-8', errors='replace'))
+            i += 1 + rdata[i]
+        return ''.join(strings)
+    return rdata
+
+#
+# Only the id and rcode of a response, for callers that just count answers.
+#
+def parse_header(message):
+    query_id, flags = struct.unpack_from('!HH', message)
+    return query_id, flags & 0xf
+
+def parse_response(message):
+    query_id, flags, qdcount, ancount, _, _ = HEADER.unpack_from(message)
+    offset = HEADER.size
+    for _ in range(qdcount):
+        offset = decode_name(message, offset)[1] + 4
+    answers = []
+    for _ in range(ancount):
+        name, offset = decode_name(message, offset)
+        rtype, _, ttl, length = RR_FIXED.unpack_from(message, offset)
+        offset += RR_FIXED.size
+        answers.append(Answer(name, rtype, ttl, decode_rdata(message, offset, rtype, length)))
+        offset += length
+    return Response(query_id, flags & 0xf, answers)
@@ -4,4 +4,12 @@ set -ex
 
 sleep 5
 
+if [ "${HEALTH_AGENT_ENABLED}" == "true" ]; then
+    /srv/unbound/healthagent.py &
+fi
+
+if [ "${DNS_INITIALIZE_DAEMON}" == "true" ]; then
+    exec /srv/unbound/initialize.py --daemon
+fi
+
 while true; do /srv/unbound/initialize.py; sleep ${DNS_INITIALIZE_INTERVAL_SECONDS}; done 
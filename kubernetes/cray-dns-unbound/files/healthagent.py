@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+#
+# Health agent for the unbound container.
+#
+# Replaces the exec nslookup liveness and readiness probes: a single
+# process keeps one UDP socket to unbound, queries the liveness and
+# readiness names every HEALTH_AGENT_INTERVAL_SECONDS and serves the latest
+# results on /healthz and /readyz for httpGet probes, so the kubelet no
+# longer forks a resolver binary in the pod every second.
+#
+# A check passes when its name resolved to at least one answer within
+# HEALTH_AGENT_TIMEOUT_SECONDS.  A result older than three intervals is
+# treated as failed so a stuck agent cannot keep a pod ready.
+#
+
+import json
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import dnswire
+
+CHECKS = {
+    '/healthz': 'liveness',
+    '/readyz': 'readiness',
+}
+
+results = {}
+results_lock = threading.Lock()
+
+def open_socket(address, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect((address, port))
+    return sock
+
+def unanswered(names):
+    return {check: {'name': name, 'ok': False, 'rcode': None, 'answers': 0, 'latency_seconds': None}
+            for check, name in names.items()}
+
+#
+# Send one query per check on the shared socket and collect the answers
+# until they are all in or the timeout passes.
+#
+def probe(sock, names, timeout):
+    pending = {}
+    sent = time.perf_counter()
+    for check, name in names.items():
+        query_id = random.getrandbits(16)
+        while query_id in pending:
+            query_id = random.getrandbits(16)
+        pending[query_id] = check
+        sock.send(dnswire.build_query(query_id, name))
+
+    probed = unanswered(names)
+    deadline = sent + timeout
+    while pending:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        sock.settimeout(remaining)
+        try:
+            message = sock.recv(4096)
+        except socket.timeout:
+            break
+        except OSError as err:
+            # ECONNREFUSED from an earlier query while unbound was down
+            print(f'Health probe failed: {err}')
+            continue
+        try:
+            response = dnswire.parse_response(message)
+        except (ValueError, IndexError, struct.error):
+            continue
+        check = pending.pop(response.id, None)
+        if check is None:
+            continue
+        probed[check].update(ok=response.rcode == dnswire.RCODE_NOERROR and len(response.answers) > 0,
+                             rcode=dnswire.RCODES.get(response.rcode, str(response.rcode)),
+                             answers=len(response.answers),
+                             latency_seconds=time.perf_counter() - sent)
+    return probed
+
+def run_probes(sock, names, interval, timeout):
+    while True:
+        started = time.monotonic()
+        try:
+            probed = probe(sock, names, timeout)
+        except OSError as err:
+            print(f'Health probe failed: {err}')
+            probed = unanswered(names)
+        with results_lock:
+            for check, result in probed.items():
+                failures = 0 if result['ok'] else results.get(check, {}).get('consecutive_failures', 0) + 1
+                results[check] = dict(result, checked_at=time.time(), consecutive_failures=failures)
+        time.sleep(max(interval - (time.monotonic() - started), 0))
+
+class Handler(BaseHTTPRequestHandler):
+    max_age = 3.0
+
+    def do_GET(self):
+        check = CHECKS.get(self.path.split('?', 1)[0])
+        if check is None:
+            self.reply(404, {'message': f'{self.path} not found'})
+            return
+        with results_lock:
+            result = dict(results.get(check, {}))
+        if not result:
+            self.reply(503, {'check': check, 'ok': False, 'message': 'not probed yet'})
+            return
+        age = time.time() - result['checked_at']
+        ok = result['ok'] and age <= self.max_age
+        self.reply(200 if ok else 503, dict(result, check=check, ok=ok, age_seconds=age))
+
+    def reply(self, status, document):
+        body = json.dumps(document).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    address = os.environ.get('HEALTH_AGENT_DNS_ADDRESS', '127.0.0.1')
+    dns_port = int(os.environ.get('HEALTH_AGENT_DNS_PORT', '5053'))
+    port = int(os.environ.get('HEALTH_AGENT_PORT', '8081'))
+    interval = float(os.environ.get('HEALTH_AGENT_INTERVAL_SECONDS', '1'))
+    timeout = float(os.environ.get('HEALTH_AGENT_TIMEOUT_SECONDS', '0.5'))
+    names = {
+        'liveness': os.environ.get('HEALTH_AGENT_LIVENESS_NAME', 'health.check.unbound'),
+        'readiness': os.environ.get('HEALTH_AGENT_READINESS_NAME', 'packages.local'),
+    }
+
+    Handler.max_age = 3 * interval + timeout
+    sock = open_socket(address, dns_port)
+    thread = threading.Thread(target=run_probes, args=(sock, names, interval, timeout), daemon=True)
+    thread.start()
+
+    server = ThreadingHTTPServer(('', port), Handler)
+    server.daemon_threads = True
+    print(f'Health agent probing {address}:{dns_port} every {interval}s, serving on port {port}')
+    sys.stdout.flush()
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
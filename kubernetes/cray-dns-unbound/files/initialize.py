@@ -1,105 +1,384 @@
 #!/usr/bin/env python3
 # Copyright 2014-2022 Hewlett Packard Enterprise Development LP
 
+import collections
 import gzip
+import hashlib
+import ipaddress
 import json
 import os
+import re
 import shutil
 import signal
 import subprocess
 import time
 import datetime
 import sys
+import ctypes
+import select
+import struct
+import dnswire
+import healthagent
+import metrics
+import prewarm
+import records_codec
+import reload_lock
+from concurrent.futures import ThreadPoolExecutor
 
-date_time = datetime.datetime.now()
-print(date_time.strftime("%Y-%b-%d %H:%M"), '\n')
-
-# start timer
-ts = time.perf_counter()
-
-# file checks
-config_load_file = os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/config_loaded'
-unbound_conf_file = os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/unbound.conf'
-records_conf_file = os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/records.conf'
-custom_records_conf_file = os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/custom_records.conf'
-check_config_loaded = os.path.isfile(config_load_file)
-check_unbound_conf_exists = os.path.isfile(unbound_conf_file)
-check_records_conf_exists = os.path.isfile(records_conf_file)
-check_custom_records_conf_exists = os.path.isfile(custom_records_conf_file)
-
-# configmap data setup
-folder_contents = sorted(os.listdir(os.environ['UNBOUND_CONFIGMAP_DIRECTORY']))
-config_load_id = ''
-reload_configs = False
-unbound_cmd = ('unbound -c ' + os.environ['UNBOUND_CONFIG_DIRECTORY'] +  '/unbound.conf &')
-
-# create empty records.conf and unbound.conf if they are missing
-if not check_records_conf_exists:
-    print('Recreating /etc/unbound/records.conf')
-    open(records_conf_file, 'a').close()
-
-if not check_unbound_conf_exists:
-    print('Recreating /etc/unbound/unbound.conf')
-    open(unbound_conf_file, 'a').close()
-
-if not check_custom_records_conf_exists:
-    print('Recreating /etc/unbound/unbound.conf')
-    open(custom_records_conf_file, 'a').close()
-
-# make sure unbound pid is running
-try:
-    unbound_pid = int(subprocess.check_output(["pidof", "unbound"]))
-except Exception as err:
-    print(f'Unbound PID not detected.  Starting unbound')
-    os.system(unbound_cmd)
-
-if not check_config_loaded:
-    reload_configs = True
-
-if check_config_loaded:
-    f = open(config_load_file, 'r')
-    config_load_id = f.read()
-    f.close()
-
-print('Starting check for updates to DNS records')
-print('ID for loaded data	{}'.format(config_load_id))
-print('ID for mounted data	{}'.format(folder_contents[0]), '\n')
-
-if config_load_id != folder_contents[0]:
-    reload_configs = True
-    print('Difference in IDs between mounted and loaded data detected\n')
-else:
-    print('No Difference in IDs between mounted and loaded data detected\n')
-
-if reload_configs:
-    print('Copying data from mounted folder to Unbound config folder.')
-    # If unable to read records.json.gz or unbound.conf from the configmap fail gracefully so Unbound
-    # continues running with the existing config instead of going into CrashLoopBackOff because this
-    # copy fails.
+registry = metrics.Registry.from_environment('cray_dns_unbound_initialize')
+
+UPTIME = re.compile(r'(?m)^uptime: (\d+) seconds')
+
+#
+# unbound's uptime in whole seconds from unbound-control status, None while
+# it does not answer on its control interface.  A reload restarts it from 0.
+#
+def unbound_uptime():
+    p = unbound_control(['status'])
+    if p.returncode != 0:
+        return None
+    match = UPTIME.search(p.stdout.decode('utf-8', errors='replace'))
+    return int(match.group(1)) if match else None
+
+#
+# Wait for the reload started at reload_ts to finish: for unbound's uptime
+# to restart, when its control interface reported one before the reload,
+# and then for it to answer its health check names.  The control interface
+# can still answer before the reload starts, so it is not enough alone.
+# Returns the seconds since reload_ts, None if the timeout passed first.
+#
+def wait_for_reload(reload_ts, check_uptime, timeout):
+    deadline = reload_ts + timeout
+    while check_uptime:
+        uptime = unbound_uptime()
+        if uptime is not None and uptime <= time.perf_counter() - reload_ts:
+            break
+        if time.perf_counter() >= deadline:
+            return None
+        time.sleep(0.05)
+    if wait_until_healthy(deadline - time.perf_counter()) is None:
+        return None
+    return time.perf_counter() - reload_ts
+
+#
+# Run unbound-control against the local control interface.
+#
+def unbound_control(args, input_lines=None):
+    control_interface = os.environ.get('UNBOUND_CONTROL_INTERFACE', '127.0.0.1')
+    stdin = None
+    if input_lines is not None:
+        stdin = ('\n'.join(input_lines) + '\n').encode('utf-8')
+    return subprocess.run(['unbound-control', '-s', control_interface] + args, input=stdin,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+#
+# Read a gzip'd records JSON file in either format version, None if it is
+# missing or unreadable.
+#
+def read_records(path):
     try:
-        shutil.copyfile(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'] + '/records.json.gz', os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/records.json.gz')
-        shutil.copyfile(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'] + '/unbound.conf', os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/unbound.conf')
-        shutil.copyfile(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'] + '/custom_records.conf', os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/custom_records.conf')
-    except FileNotFoundError:
-        print('Unable to load config and records from ConfigMap. Leaving existing configuration in place')
-        sys.exit(0)
-
-    print('Processing data.')
-    records_conf = []
+        with open(path, 'rb') as f:
+            return records_codec.decode(f.read())
+    except (OSError, ValueError, KeyError, IndexError):
+        return None
+
+#
+# Read a file as bytes, None if it is missing.
+#
+def read_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
 
-    records_json_path = '{}/records.json.gz'.format(os.environ['UNBOUND_CONFIG_DIRECTORY'])
-    records_conf_path = '{}/records.conf'.format(os.environ['UNBOUND_CONFIG_DIRECTORY'])
+#
+# The PTR owner name of an address, without the trailing dot.
+#
+def reverse_pointer(ip):
+    octets = ip.split('.')
+    if len(octets) == 4:
+        return '.'.join(reversed(octets)) + '.in-addr.arpa'
+    return ipaddress.ip_address(ip).reverse_pointer
 
-    create_ptr_records = os.environ.get('UNBOUND_CREATE_PTR_RECORDS', 'true')
+#
+# Map each owner name to the set of resource records records.conf creates
+# for it, in the form accepted by unbound-control local_datas.
+#
+def local_data_by_name(records, create_ptr):
+    names = {}
+    for zone in records:
+        hostname = zone['hostname']
+        ip = zone['ip-address']
+        ptr_name = reverse_pointer(ip) if create_ptr else None
+        for name in (hostname, hostname + '.local'):
+            names.setdefault(name, set()).add(f'{name} A {ip}')
+            if create_ptr:
+                names.setdefault(ptr_name, set()).add(f'{ptr_name} PTR {name}')
+    return names
 
-    print('Reading A records JSON file at {} and translating to {}'.format(records_json_path, records_conf_path))
-    with gzip.open(records_json_path, 'rb') as f:
-        f_content = str(f.read(), "utf-8")
-    f.close()
+#
+# Apply only the differences between two record sets to the running unbound.
+# Every name whose data changed is removed and re-added with its complete new
+# data, in batches, so the message and rrset caches are kept.  With auth
+# zones, the zones whose names changed are reloaded from the zone files
+# already written for the new records instead.
+#
+def apply_record_delta(old_records, new_records, create_ptr, forward_zones=None, batch_size=5000):
+    old_names = local_data_by_name(old_records, create_ptr)
+    new_names = local_data_by_name(new_records, create_ptr)
 
-    records = json.loads(f_content)
+    changed_zones = []
+    if forward_zones is not None:
+        old_zones, old_names = group_auth_zones(old_names, forward_zones)
+        new_zones, new_names = group_auth_zones(new_names, forward_zones)
+        # zones.conf only takes effect on a full reload
+        if old_zones.keys() != new_zones.keys():
+            raise RuntimeError('the auth zones changed')
+        changed_zones = sorted(zone for zone in new_zones if old_zones[zone] != new_zones[zone])
+
+    changed = sorted(name for name in old_names.keys() | new_names.keys()
+                     if old_names.get(name) != new_names.get(name))
+    removals = [name for name in changed if name in old_names]
+    additions = [rr for name in changed if name in new_names for rr in sorted(new_names[name])]
+
+    for command, lines in (('local_datas_remove', removals), ('local_datas', additions)):
+        for i in range(0, len(lines), batch_size):
+            p = unbound_control([command], lines[i:i + batch_size])
+            if p.returncode != 0:
+                raise RuntimeError(f'unbound-control {command} failed: {p.stderr.decode("utf-8")}')
+    for zone in changed_zones:
+        p = unbound_control(['auth_zone_reload', zone])
+        if p.returncode != 0:
+            raise RuntimeError(f'unbound-control auth_zone_reload {zone} failed: {p.stderr.decode("utf-8")}')
+
+    return len(removals), len(additions), len(changed_zones)
+
+#
+# Owner names, lower case and fully qualified, that records.conf creates
+# local data for.
+#
+def local_data_names(records, create_ptr):
+    names = set()
     for zone in records:
-        if 'true' in create_ptr_records:
+        hostname = zone['hostname'].rstrip('.').lower()
+        names.add(hostname + '.')
+        names.add(hostname + '.local.')
+        if create_ptr:
+            names.add(reverse_pointer(zone['ip-address']) + '.')
+    return names
+
+#
+# Dump unbound's caches with unbound-control dump_cache.  Returns None if the
+# dump fails or goes over the size or time budget, so a huge cache never
+# holds up the reload.
+#
+def dump_cache(max_bytes, timeout):
+    control_interface = os.environ.get('UNBOUND_CONTROL_INTERFACE', '127.0.0.1')
+    proc = subprocess.Popen(['unbound-control', '-s', control_interface, 'dump_cache'],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    chunks = []
+    size = 0
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(proc.args, timeout)
+            if not select.select([proc.stdout], [], [], remaining)[0]:
+                continue
+            chunk = os.read(proc.stdout.fileno(), 1 << 16)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                print(f'Cache dump is larger than {max_bytes} bytes, skipping it')
+                return None
+            chunks.append(chunk)
+        if proc.wait(timeout=max(deadline - time.monotonic(), 0)) != 0:
+            print('unbound-control dump_cache failed')
+            return None
+    except subprocess.TimeoutExpired:
+        print(f'Cache dump took longer than {timeout}s, skipping it')
+        return None
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+    return b''.join(chunks).decode('utf-8', errors='replace')
+
+#
+# Drop the cached rrsets owned by, and messages involving, names the new
+# local data answers.  Returns the filtered dump and the number of rrsets
+# and messages kept and dropped.
+#
+# dump_cache writes rrsets as a ";rrset [nsec_apex] ttl rr_count rrsig_count
+# trust security" line followed by their records, and messages as a "msg
+# qname class type flags qdcount ttl security an ns ar" line followed by one
+# "name class type flags" reference per rrset.
+#
+def filter_cache_dump(dump, local_names):
+    lines = dump.split('\n')
+    kept_lines = []
+    kept = {'rrsets': 0, 'messages': 0}
+    dropped = 0
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        fields = line.split()
+        if line.startswith(';rrset'):
+            end = i + 1 + int(fields[-4]) + int(fields[-3])
+            names = [rr.split(None, 1)[0].lower() for rr in lines[i + 1:end] if rr.strip()]
+            kind = 'rrsets'
+        elif line.startswith('msg '):
+            end = i + 1 + int(fields[8]) + int(fields[9]) + int(fields[10])
+            names = [fields[1].lower()] + [ref.split(None, 1)[0].lower() for ref in lines[i + 1:end] if ref.strip()]
+            kind = 'messages'
+        else:
+            kept_lines.append(line)
+            i += 1
+            continue
+
+        if any(name in local_names for name in names):
+            dropped += 1
+        else:
+            kept_lines.extend(lines[i:end])
+            kept[kind] += 1
+        i = end
+    return '\n'.join(kept_lines), kept['rrsets'], kept['messages'], dropped
+
+#
+# Load a filtered cache dump back into unbound, within the time budget.
+#
+def load_cache(dump, timeout):
+    control_interface = os.environ.get('UNBOUND_CONTROL_INTERFACE', '127.0.0.1')
+    try:
+        p = subprocess.run(['unbound-control', '-s', control_interface, 'load_cache'],
+                           input=dump.encode('utf-8'), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                           timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print(f'Cache load took longer than {timeout}s, the rest of the cache was not restored')
+        return False
+    if p.returncode != 0:
+        print(f'unbound-control load_cache failed: {p.stderr.decode("utf-8")}')
+        return False
+    return True
+
+#
+# The size and time budget for dumping and loading the cache.
+#
+def cache_dump_budget():
+    max_bytes = int(os.environ.get('UNBOUND_CACHE_PRESERVE_MAX_BYTES', str(256 * 1024 * 1024)))
+    timeout = float(os.environ.get('UNBOUND_CACHE_PRESERVE_TIMEOUT_SECONDS', '10'))
+    return max_bytes, timeout
+
+#
+# Dump and filter unbound's caches ahead of a reload, None when the cache is
+# not preserved.
+#
+def preserve_cache(records, create_ptr):
+    dump_ts = time.perf_counter()
+    dump = dump_cache(*cache_dump_budget())
+    if dump is None:
+        registry.set('cache_preserved', 0, 'Whether the last reload preserved the cache')
+        return None
+    dump, rrsets, messages, dropped = filter_cache_dump(dump, local_data_names(records, create_ptr))
+    dump_seconds = time.perf_counter() - dump_ts
+    print(f'Dumped the cache in {dump_seconds:.3f}s, keeping {rrsets} rrsets and {messages} messages, '
+          f'dropping {dropped} entries overridden by local data')
+    registry.set('cache_dump_duration_seconds', dump_seconds, 'Time taken to dump and filter the cache')
+    registry.set('cache_entries_kept', rrsets, 'Cache entries kept across the last reload', cache='rrset')
+    registry.set('cache_entries_kept', messages, 'Cache entries kept across the last reload', cache='message')
+    registry.set('cache_entries_dropped', dropped, 'Cache entries dropped for new local data')
+    return dump
+
+#
+# Load a cache preserved by preserve_cache into the reloaded unbound.
+#
+def restore_cache(dump):
+    timeout = cache_dump_budget()[1]
+    load_ts = time.perf_counter()
+    loaded = load_cache(dump, timeout)
+    load_seconds = time.perf_counter() - load_ts
+    if loaded:
+        print(f'Loaded the preserved cache in {load_seconds:.3f}s')
+    registry.set('cache_load_duration_seconds', load_seconds, 'Time taken to load the preserved cache')
+    registry.set('cache_preserved', int(loaded), 'Whether the last reload preserved the cache')
+
+def hot_names_path():
+    return os.environ.get('UNBOUND_PREWARM_FILE',
+                          os.path.join(os.environ['UNBOUND_CONFIG_DIRECTORY'], 'hot-names.json'))
+
+#
+# Fold the names in a cache dump taken ahead of a full reload, and in the
+# query log if one is configured, into the on-disk hot-name list.
+#
+def sample_hot_names(records, create_ptr, dump):
+    sample_ts = time.perf_counter()
+    local_names = local_data_names(records, create_ptr)
+    sample = prewarm.sample_cache_dump(dump, local_names) if dump is not None else collections.Counter()
+    query_log = os.environ.get('UNBOUND_PREWARM_QUERY_LOG', '')
+    if query_log:
+        try:
+            sample.update(prewarm.sample_query_log(query_log, cache_dump_budget()[0], local_names))
+        except OSError as err:
+            print(f'Unable to sample the query log {query_log}: {err}')
+    if not sample:
+        print('No names sampled for prewarming')
+        return
+    hot_names = prewarm.update_hot_names(hot_names_path(), sample,
+                                         int(os.environ.get('UNBOUND_PREWARM_MAX_NAMES', '1000')))
+    sample_seconds = time.perf_counter() - sample_ts
+    print(f'Sampled {len(sample)} names in {sample_seconds:.3f}s, '
+          f'keeping the {len(hot_names)} hottest for prewarming')
+    registry.set('prewarm_sampled_names', len(sample), 'Names sampled from the cache and query log before the reload')
+    registry.set('prewarm_sample_duration_seconds', sample_seconds, 'Time taken to sample and rank hot names')
+
+#
+# Resolve the hot names against the reloaded unbound so they are cached
+# before clients ask for them, within UNBOUND_PREWARM_BUDGET_SECONDS.
+# Reports the share of the names' sampled queries that would now hit the
+# cache.
+#
+def prewarm_hot_names():
+    hot_names = prewarm.read_hot_names(hot_names_path())
+    if not hot_names:
+        return
+    budget = float(os.environ.get('UNBOUND_PREWARM_BUDGET_SECONDS', '10'))
+    concurrency = int(os.environ.get('UNBOUND_PREWARM_CONCURRENCY', '50'))
+    query_timeout = float(os.environ.get('UNBOUND_PREWARM_QUERY_TIMEOUT_SECONDS', '2'))
+    port = int(os.environ.get('UNBOUND_SERVER_PORT', '5053'))
+    prewarm_ts = time.perf_counter()
+    # Queries sent while unbound is still reloading are only dropped
+    if wait_until_healthy(budget) is None:
+        print(f'Unbound did not answer within {budget:.0f}s of the reload, not prewarming')
+        return
+    rcodes = prewarm.resolve(hot_names, '127.0.0.1', port, concurrency,
+                             budget - (time.perf_counter() - prewarm_ts), query_timeout)
+    prewarm_seconds = time.perf_counter() - prewarm_ts
+
+    # NXDOMAIN answers are cached as well
+    warmed = [hot for hot in hot_names
+              if rcodes.get((hot.name, hot.type)) in (dnswire.RCODE_NOERROR, dnswire.RCODE_NXDOMAIN)]
+    total = sum(hot.score for hot in hot_names)
+    recovered = sum(hot.score for hot in warmed) / total if total else 0.0
+    print(f'Prewarmed {len(warmed)} of {len(hot_names)} hot names in {prewarm_seconds:.3f}s, '
+          f'covering {recovered:.1%} of their sampled queries')
+    registry.set('prewarm_names', len(hot_names), 'Hot names resolved after the reload')
+    registry.set('prewarm_names_warmed', len(warmed), 'Hot names answered into the cache after the reload')
+    registry.set('prewarm_recovered_ratio', recovered,
+                 'Share of the hot names\' sampled queries that hit the cache again after prewarming')
+    registry.set('prewarm_duration_seconds', prewarm_seconds, 'Time taken to prewarm the cache')
+
+#
+# Render records.conf as one local-data (and local-data-ptr) line per record
+# and name, in record order.
+#
+def render_local_data(records, create_ptr):
+    records_conf = []
+    for zone in records:
+        if create_ptr:
             records_conf.extend([
                 f'local-data: "{zone["hostname"]} A {zone["ip-address"]}"',
                 f'local-data-ptr: "{zone["ip-address"]} {zone["hostname"]}"',
@@ -111,47 +390,686 @@ if reload_configs:
                 f'local-data: "{zone["hostname"]} A {zone["ip-address"]}"',
                 f'local-data: "{zone["hostname"]}.local A {zone["ip-address"]}"',
             ])
-    f = open(records_conf_path, 'w')
-    f.write("\n".join(records_conf))
-    f.close()
-
-    print('Processing data completed.\n')
-    # reload only if records is not empty
-    if len(records) > 0:
-        unbound_pid = 0
-        pid_check_tries = 0
-        print('Warm reload of Unbound started')
-        # check for pid
+    return records_conf
+
+#
+# With UNBOUND_RECORDS_FORMAT auth-zone the names in the record zones of
+# UNBOUND_AUTH_ZONES, and the PTR names of every IPv4 /24, are written as
+# RFC 1035 zone files that unbound loads as auth zones, instead of as a
+# local-data line per name.  zones.conf, included at the top level of
+# unbound.conf, lists them.  Names in no such zone, such as single-label
+# hostnames, stay local-data in records.conf.
+#
+AUTH_ZONE_TTL = 3600
+
+def auth_zone_names():
+    return [zone.rstrip('.').lower() + '.' for zone in os.environ.get('UNBOUND_AUTH_ZONES', '').split(',') if zone]
+
+#
+# The auth zone a local-data owner name belongs in, None if it has none.
+#
+def auth_zone_of(name, forward_zones):
+    labels = name.rstrip('.').lower().split('.')
+    if len(labels) == 6 and labels[-2:] == ['in-addr', 'arpa']:
+        return '.'.join(labels[1:]) + '.'
+    for i in range(1, len(labels)):
+        zone = '.'.join(labels[i:]) + '.'
+        if zone in forward_zones:
+            return zone
+    return None
+
+#
+# Split local_data_by_name's names into those of each auth zone and those
+# left as local data.  Every forward zone is kept, empty or not, so names
+# missing from it are still answered NXDOMAIN.
+#
+def group_auth_zones(names, forward_zones):
+    zones = {zone: {} for zone in forward_zones}
+    local_names = {}
+    for name, rrs in names.items():
+        zone = auth_zone_of(name, forward_zones)
+        if zone is None:
+            local_names[name] = rrs
+        else:
+            zones.setdefault(zone, {})[name] = rrs
+    return zones, local_names
+
+def render_zone_file(zone, names):
+    lines = [
+        f'$TTL {AUTH_ZONE_TTL}',
+        # Negative answers are cached no longer than cache-max-negative-ttl
+        f'{zone} IN SOA localhost. nobody.invalid. 1 3600 1200 604800 5',
+        f'{zone} IN NS localhost.',
+    ]
+    for name in sorted(names):
+        for rr in sorted(names[name]):
+            owner, rr_type, rdata = rr.split(' ', 2)
+            if rr_type == 'PTR':
+                rdata = rdata.rstrip('.') + '.'
+            lines.append(f'{owner.rstrip(".")}. IN {rr_type} {rdata}')
+    return '\n'.join(lines) + '\n'
+
+def zone_file_path(directory, zone):
+    return os.path.join(directory, 'zones', f'{zone}zone')
+
+#
+# Write a zone file per auth zone and zones.conf listing them, removing zone
+# files of zones that are gone.  Each zone is made a transparent local zone
+# as well, so built-in static zones such as 10.in-addr.arpa. do not answer
+# NXDOMAIN for its names before the auth zone is consulted.  Returns the
+# records.conf lines of the names left as local data and the auth zones.
+#
+def render_auth_zones(records, create_ptr, forward_zones, directory):
+    zones, local_names = group_auth_zones(local_data_by_name(records, create_ptr), forward_zones)
+
+    os.makedirs(os.path.join(directory, 'zones'), exist_ok=True)
+    zones_conf = ['server:']
+    zones_conf.extend(f'    local-zone: "{zone}" transparent' for zone in sorted(zones))
+    for zone in sorted(zones):
+        path = zone_file_path(directory, zone)
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(render_zone_file(zone, zones[zone]))
+        os.replace(f'{path}.tmp', path)
+        zones_conf.extend(['', 'auth-zone:', f'    name: "{zone}"', f'    zonefile: "{path}"',
+                           '    for-downstream: yes', '    for-upstream: no'])
+    for filename in os.listdir(os.path.join(directory, 'zones')):
+        if filename.endswith('zone') and filename[:-len('zone')] not in zones:
+            os.remove(os.path.join(directory, 'zones', filename))
+    with open(os.path.join(directory, 'zones.conf'), 'w') as f:
+        f.write('\n'.join(zones_conf) + '\n')
+
+    records_conf = [f'local-data: "{rr}"' for name in sorted(local_names) for rr in sorted(local_names[name])]
+    return records_conf, zones
+
+#
+# Records sharded across several ConfigMaps are listed, with the SHA-256 of
+# each shard file, in a manifest mounted next to records.json.gz.
+#
+SHARD_WORKERS = 8
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, records_codec.MANIFEST_KEY)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def manifest_digests(manifest):
+    if manifest is None:
+        return None
+    return [shard['sha256'] for shard in manifest['shards']]
+
+#
+# Digests of the record shards and configuration in directory.  Those
+# unbound last loaded are kept next to config_loaded, written only once a
+# reload or delta has loaded them, so records whose render or reload failed
+# are never taken for loaded ones.
+#
+LOADED_DIGESTS_FILE = 'loaded_digests.json'
+
+def file_digest(path):
+    data = read_file(path)
+    return None if data is None else hashlib.sha256(data).hexdigest()
+
+def loaded_digests(directory, manifest):
+    return {'shards': manifest_digests(manifest),
+            'unbound.conf': file_digest(os.path.join(directory, 'unbound.conf')),
+            'custom_records.conf': file_digest(os.path.join(directory, 'custom_records.conf'))}
+
+def read_loaded_digests(directory):
+    try:
+        with open(os.path.join(directory, LOADED_DIGESTS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_loaded_digests(directory, manifest):
+    path = os.path.join(directory, LOADED_DIGESTS_FILE)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(loaded_digests(directory, manifest), f)
+    os.replace(f'{path}.tmp', path)
+
+#
+# Read one shard, refusing it unless it is the one the manifest lists.  The
+# kubelet can briefly mount a new manifest with an older shard.
+#
+def read_shard(directory, shard):
+    data = read_file(os.path.join(directory, shard['path']))
+    if data is None or hashlib.sha256(data).hexdigest() != shard['sha256']:
+        raise ValueError(f'{shard["path"]} does not match the records manifest')
+    return records_codec.decode(data)
+
+#
+# Whether every shard file matches the manifest.
+#
+def shards_match(directory, manifest):
+    for shard in manifest['shards']:
+        data = read_file(os.path.join(directory, shard['path']))
+        if data is None or hashlib.sha256(data).hexdigest() != shard['sha256']:
+            return False
+    return True
+
+#
+# Read the records of every shard in the manifest, in parallel.
+#
+def read_sharded_records(directory, manifest):
+    shards = manifest['shards']
+    with ThreadPoolExecutor(max_workers=max(1, min(len(shards), SHARD_WORKERS))) as executor:
+        return [record for records in executor.map(lambda shard: read_shard(directory, shard), shards)
+                for record in records]
+
+#
+# Read and render every shard in the manifest.  Shards are read and rendered
+# in parallel, and a shard rendered before with the same digest and options
+# is reused from state, so only changed shards are decoded again.
+#
+def render_shards(directory, manifest, render, create_ptr, state):
+    rendered = state.setdefault('rendered_shards', {})
+
+    def load(shard):
+        key = (shard['sha256'], render, create_ptr)
+        cached = rendered.get(shard['path'])
+        if cached is not None and cached[0] == key:
+            return cached
+        records = read_shard(directory, shard)
+        return (key, records, render(records, create_ptr))
+
+    shards = manifest['shards']
+    with ThreadPoolExecutor(max_workers=max(1, min(len(shards), SHARD_WORKERS))) as executor:
+        results = list(executor.map(load, shards))
+
+    state['rendered_shards'] = {shard['path']: result for shard, result in zip(shards, results)}
+    records = [record for _, shard_records, _ in results for record in shard_records]
+    records_conf = [line for _, _, lines in results for line in lines]
+    return records, records_conf
+
+#
+# Read the records last loaded into unbound, sharded or not, None if they
+# are missing or unreadable.
+#
+def read_loaded_records(directory):
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return read_records(os.path.join(directory, 'records.json.gz'))
+    try:
+        return read_sharded_records(directory, manifest)
+    except (OSError, ValueError, KeyError, IndexError):
+        return None
+
+#
+# Return the unbound PID, reusing the cached one while that process is still
+# unbound so long-running callers don't have to run pidof every time.
+#
+def get_unbound_pid(state, retry_delay=None):
+    pid = state.get('unbound_pid')
+    if pid:
         try:
-            unbound_pid = int(subprocess.check_output(["pidof", "unbound"]))
-        except Exception as err:
-            time.sleep(5)
-            try:
-                unbound_pid = int(subprocess.check_output(["pidof", "unbound"]))
-            except Exception as err:
-                print ("Failed getting Unbound PID twice")
-                pass
-        if unbound_pid != 0 and isinstance(unbound_pid, int):
-            print('Warm reload of unbound to update configurations')
-            print('Unbound pid is: {}'.format(unbound_pid))
+            with open(f'/proc/{pid}/comm') as f:
+                if f.read().strip() == 'unbound':
+                    return pid
+        except OSError:
+            pass
+        state['unbound_pid'] = None
+
+    try:
+        pid = int(subprocess.check_output(["pidof", "unbound"]))
+    except Exception as err:
+        if retry_delay is None:
+            raise
+        time.sleep(retry_delay)
+        pid = int(subprocess.check_output(["pidof", "unbound"]))
+    state['unbound_pid'] = pid
+    return pid
+
+#
+# Record when the records generation stamped by the manager was loaded, and
+# how long after the manager wrote it.
+#
+def record_propagation(directory):
+    try:
+        with open(os.path.join(directory, records_codec.PROPAGATION_KEY)) as f:
+            propagation = json.load(f)
+    except (OSError, ValueError):
+        return
+    loaded_at = time.time()
+    delay = loaded_at - propagation['written_at']
+    print(f'Loaded records generation {propagation["generation"]} {delay:.1f}s after the manager wrote it\n')
+    registry.set('records_generation', propagation['generation'], 'Generation of the loaded records')
+    registry.set('records_written_timestamp_seconds', propagation['written_at'],
+                 'When the manager wrote the loaded records generation')
+    registry.set('records_loaded_timestamp_seconds', loaded_at, 'When the loaded records generation was loaded')
+    registry.set('records_propagation_seconds', delay,
+                 'Time from the manager writing the loaded records generation to it being loaded')
+
+#
+# Take one of the slots limiting how many replicas reload at once, after a
+# delay fixed per pod.  Returns the held semaphore, or None when reloads are
+# not coordinated or no slot could be had within UNBOUND_RELOAD_WAIT_SECONDS,
+# in which case the reload goes ahead anyway rather than leaving old records
+# in place.
+#
+def acquire_reload_slot():
+    try:
+        semaphore = reload_lock.from_environment()
+    except Exception as err:
+        print(f'Unable to set up reload coordination, reloading without it: {err}')
+        return None
+    if semaphore is None:
+        return None
+
+    identity = os.environ.get('POD_NAME') or os.uname().nodename
+    delay = reload_lock.jitter(identity, float(os.environ.get('UNBOUND_RELOAD_JITTER_SECONDS', '30')))
+    wait = float(os.environ.get('UNBOUND_RELOAD_WAIT_SECONDS', '600'))
+    print(f'Waiting {delay:.1f}s before taking a reload slot')
+    time.sleep(delay)
+    wait_ts = time.perf_counter()
+    try:
+        acquired = semaphore.acquire(wait)
+    except Exception as err:
+        print(f'Unable to take a reload slot, reloading anyway: {err}')
+        return None
+    waited = time.perf_counter() - wait_ts
+    registry.set('reload_slot_wait_seconds', delay + waited, 'Time spent waiting for a reload slot')
+    if not acquired:
+        print(f'No reload slot free after {wait:.0f}s, reloading anyway')
+        return None
+    print(f'Took reload {semaphore.describe()} after {waited:.1f}s')
+    return semaphore
+
+#
+# Query unbound until it answers the UNBOUND_RELOAD_HEALTH_NAMES again.
+# Returns the seconds it took, None if it did not within the timeout.
+#
+def wait_until_healthy(timeout):
+    port = int(os.environ.get('UNBOUND_SERVER_PORT', '5053'))
+    names = {name: name for name in os.environ.get('UNBOUND_RELOAD_HEALTH_NAMES', 'health.check.unbound').split(',')
+             if name}
+    health_ts = time.perf_counter()
+    sock = healthagent.open_socket('127.0.0.1', port)
+    try:
+        while time.perf_counter() - health_ts < timeout:
             try:
-                os.kill(int(unbound_pid), signal.SIGHUP)
-            except Exception as err:
-                raise SystemExit(err)
+                probed = healthagent.probe(sock, names, 1.0)
+            except OSError:
+                probed = healthagent.unanswered(names)
+            if all(result['ok'] for result in probed.values()):
+                return time.perf_counter() - health_ts
+            time.sleep(0.2)
+    finally:
+        sock.close()
+    return None
+
+#
+# Check the mounted configmap for updates and load them into unbound.
+#
+def check_for_updates(state):
+    date_time = datetime.datetime.now()
+    print(date_time.strftime("%Y-%b-%d %H:%M"), '\n')
+
+    # start timer
+    ts = time.perf_counter()
+
+    # file checks
+    config_load_file = os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/config_loaded'
+    unbound_conf_file = os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/unbound.conf'
+    records_conf_file = os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/records.conf'
+    custom_records_conf_file = os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/custom_records.conf'
+    zones_conf_file = os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/zones.conf'
+    check_config_loaded = os.path.isfile(config_load_file)
+    check_unbound_conf_exists = os.path.isfile(unbound_conf_file)
+    check_records_conf_exists = os.path.isfile(records_conf_file)
+    check_custom_records_conf_exists = os.path.isfile(custom_records_conf_file)
+
+    # configmap data setup
+    folder_contents = sorted(os.listdir(os.environ['UNBOUND_CONFIGMAP_DIRECTORY']))
+    config_load_id = ''
+    reload_configs = False
+    unbound_cmd = ('unbound -c ' + os.environ['UNBOUND_CONFIG_DIRECTORY'] +  '/unbound.conf &')
+
+    # create empty records.conf and unbound.conf if they are missing
+    if not check_records_conf_exists:
+        print('Recreating /etc/unbound/records.conf')
+        open(records_conf_file, 'a').close()
 
-            # write config version
+    if not check_unbound_conf_exists:
+        print('Recreating /etc/unbound/unbound.conf')
+        open(unbound_conf_file, 'a').close()
+
+    if not check_custom_records_conf_exists:
+        print('Recreating /etc/unbound/unbound.conf')
+        open(custom_records_conf_file, 'a').close()
+
+    # Empty auth zones keep answering NXDOMAIN for the record zones until the
+    # records are loaded
+    auth_zones = auth_zone_names() if os.environ.get('UNBOUND_RECORDS_FORMAT', 'local-data') == 'auth-zone' else None
+    if auth_zones is not None and not os.path.isfile(zones_conf_file):
+        print('Recreating /etc/unbound/zones.conf')
+        render_auth_zones([], False, auth_zones, os.environ['UNBOUND_CONFIG_DIRECTORY'])
+
+    # make sure unbound pid is running
+    try:
+        unbound_pid = get_unbound_pid(state)
+    except Exception as err:
+        print(f'Unbound PID not detected.  Starting unbound')
+        os.system(unbound_cmd)
+
+    if not check_config_loaded:
+        reload_configs = True
+
+    if check_config_loaded:
+        f = open(config_load_file, 'r')
+        config_load_id = f.read()
+        f.close()
+
+    print('Starting check for updates to DNS records')
+    print('ID for loaded data	{}'.format(config_load_id))
+    print('ID for mounted data	{}'.format(folder_contents[0]), '\n')
+
+    if config_load_id != folder_contents[0]:
+        reload_configs = True
+        print('Difference in IDs between mounted and loaded data detected\n')
+    else:
+        print('No Difference in IDs between mounted and loaded data detected\n')
+
+    # Sharded records only need loading when a shard's digest changed
+    manifest = read_manifest(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'])
+    if manifest is not None and reload_configs:
+        if not shards_match(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'], manifest):
+            print('Mounted record shards do not match the manifest yet, checking again later\n')
+            return
+        if check_config_loaded and \
+                read_loaded_digests(os.environ['UNBOUND_CONFIG_DIRECTORY']) == \
+                loaded_digests(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'], manifest):
+            print('Record shards and configuration unchanged, not reloading Unbound\n')
+            reload_configs = False
             f = open(config_load_file, 'w')
             f.write(folder_contents[0])
             f.close()
-            print('Warm reload of Unbound completed.\n')
+
+    delta_reload = os.environ.get('UNBOUND_DELTA_RELOAD', 'false').lower() == 'true'
+    previous_records = None
+    previous_unbound_conf = None
+    previous_custom_records_conf = None
+    if reload_configs and delta_reload and check_config_loaded:
+        # Keep the previously loaded data so only the differences need applying
+        previous_records = read_loaded_records(os.environ['UNBOUND_CONFIG_DIRECTORY'])
+        previous_unbound_conf = read_file(unbound_conf_file)
+        previous_custom_records_conf = read_file(custom_records_conf_file)
+
+    if reload_configs:
+        print('Copying data from mounted folder to Unbound config folder.')
+        # If unable to read records.json.gz or unbound.conf from the configmap fail gracefully so Unbound
+        # continues running with the existing config instead of going into CrashLoopBackOff because this
+        # copy fails.
+        try:
+            shutil.copyfile(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'] + '/records.json.gz', os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/records.json.gz')
+            shutil.copyfile(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'] + '/unbound.conf', os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/unbound.conf')
+            shutil.copyfile(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'] + '/custom_records.conf', os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/custom_records.conf')
+            manifest_path = os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/' + records_codec.MANIFEST_KEY
+            if manifest is not None:
+                # Shards first, then the manifest that was verified against them
+                for shard in manifest['shards']:
+                    shutil.copyfile(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'] + '/' + shard['path'], os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/' + shard['path'])
+                with open(manifest_path, 'w') as f:
+                    json.dump(manifest, f)
+            elif os.path.isfile(manifest_path):
+                os.remove(manifest_path)
+            propagation_path = os.environ['UNBOUND_CONFIG_DIRECTORY'] + '/' + records_codec.PROPAGATION_KEY
+            if os.path.isfile(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'] + '/' + records_codec.PROPAGATION_KEY):
+                shutil.copyfile(os.environ['UNBOUND_CONFIGMAP_DIRECTORY'] + '/' + records_codec.PROPAGATION_KEY, propagation_path)
+            elif os.path.isfile(propagation_path):
+                os.remove(propagation_path)
+        except FileNotFoundError:
+            print('Unable to load config and records from ConfigMap. Leaving existing configuration in place')
+            return
+
+        print('Processing data.')
+
+        records_json_path = '{}/records.json.gz'.format(os.environ['UNBOUND_CONFIG_DIRECTORY'])
+        records_conf_path = '{}/records.conf'.format(os.environ['UNBOUND_CONFIG_DIRECTORY'])
+
+        create_ptr_records = os.environ.get('UNBOUND_CREATE_PTR_RECORDS', 'true')
+
+        if manifest is not None:
+            print('Reading {} record shards in {} and translating to {}'.format(
+                len(manifest['shards']), os.environ['UNBOUND_CONFIG_DIRECTORY'], records_conf_path))
+            render_ts = time.perf_counter()
+            try:
+                if auth_zones is None:
+                    records, records_conf = render_shards(os.environ['UNBOUND_CONFIG_DIRECTORY'], manifest,
+                                                          render_local_data,
+                                                          'true' in create_ptr_records, state)
+                else:
+                    records = read_sharded_records(os.environ['UNBOUND_CONFIG_DIRECTORY'], manifest)
+            except (OSError, ValueError, KeyError, IndexError) as err:
+                print(f'Unable to read record shards, leaving existing configuration in place: {err}')
+                return
         else:
-            print('Did not detect Unbound pid.\n')
-            print('This can happen on the first run of initialize.py before Unbound has started.')
-    else:
-        print('Record data is empty, not reloading Unbound.')
+            print('Reading A records JSON file at {} and translating to {}'.format(records_json_path, records_conf_path))
+            with gzip.open(records_json_path, 'rb') as f:
+                f_content = str(f.read(), "utf-8")
+            f.close()
+
+            render_ts = time.perf_counter()
+            records = records_codec.loads(f_content)
+            if auth_zones is None:
+                records_conf = render_local_data(records, 'true' in create_ptr_records)
+        if auth_zones is not None:
+            records_conf, zones = render_auth_zones(records, 'true' in create_ptr_records, auth_zones,
+                                                    os.environ['UNBOUND_CONFIG_DIRECTORY'])
+            print(f'Wrote {len(zones)} auth zone files')
+            registry.set('auth_zones', len(zones), 'Number of auth zone files written')
+        f = open(records_conf_path, 'w')
+        f.write("\n".join(records_conf))
+        f.close()
+        registry.set('render_duration_seconds', time.perf_counter() - render_ts,
+                     'Time taken to decode records.json.gz and write records.conf')
+        registry.set('records', len(records), 'Number of records loaded from the configmap')
+        registry.set('records_conf_lines', len(records_conf), 'Number of lines written to records.conf')
+
+        print('Processing data completed.\n')
+
+        # Apply record changes in place when only records.json.gz changed,
+        # falling back to a full reload for configuration changes or errors.
+        delta_applied = False
+        if len(records) > 0 and previous_records is not None and \
+                read_file(unbound_conf_file) == previous_unbound_conf and \
+                read_file(custom_records_conf_file) == previous_custom_records_conf:
+            print('Applying record changes through unbound-control')
+            delta_ts = time.perf_counter()
+            try:
+                removed, added, zones_reloaded = apply_record_delta(previous_records, records,
+                                                                    'true' in create_ptr_records, auth_zones)
+                delta_applied = True
+                print(f'Removed {removed} names and added {added} records in place, '
+                      f'reloaded {zones_reloaded} auth zones')
+                registry.set('delta_duration_seconds', time.perf_counter() - delta_ts,
+                             'Time taken to apply record changes through unbound-control')
+                registry.set('delta_names_removed', removed, 'Names removed by the last record delta')
+                registry.set('delta_records_added', added, 'Records added by the last record delta')
+                registry.set('delta_zones_reloaded', zones_reloaded, 'Auth zones reloaded by the last record delta')
+
+                # write config version
+                f = open(config_load_file, 'w')
+                f.write(folder_contents[0])
+                f.close()
+                write_loaded_digests(os.environ['UNBOUND_CONFIG_DIRECTORY'], manifest)
+                print('Incremental update of Unbound completed.\n')
+                record_propagation(os.environ['UNBOUND_CONFIG_DIRECTORY'])
+            except Exception as err:
+                print(f'Unable to apply record changes incrementally, falling back to reload: {err}')
+
+        # reload only if records is not empty
+        if len(records) > 0 and not delta_applied:
+            unbound_pid = 0
+            pid_check_tries = 0
+            print('Warm reload of Unbound started')
+            # check for pid
+            try:
+                unbound_pid = get_unbound_pid(state, retry_delay=5)
+            except Exception as err:
+                print ("Failed getting Unbound PID twice")
+                pass
+            if unbound_pid != 0 and isinstance(unbound_pid, int):
+                print('Warm reload of unbound to update configurations')
+                print('Unbound pid is: {}'.format(unbound_pid))
+                # Replicas take turns at flushing their caches, except on the
+                # first load when this one is not serving yet
+                semaphore = acquire_reload_slot() if check_config_loaded else None
+                try:
+                    # A preserved cache is reloaded through unbound-control, which
+                    # finishes the reload before accepting the load_cache connection
+                    cache_dump = None
+                    preserve = os.environ.get('UNBOUND_PRESERVE_CACHE', 'false').lower() == 'true'
+                    prewarm_cache = os.environ.get('UNBOUND_PREWARM', 'false').lower() == 'true'
+                    if preserve:
+                        cache_dump = preserve_cache(records, 'true' in create_ptr_records)
+                    if prewarm_cache:
+                        # Sample the preserved cache rather than dumping it twice
+                        sample_hot_names(records, 'true' in create_ptr_records,
+                                         cache_dump if preserve else dump_cache(*cache_dump_budget()))
+                    check_uptime = unbound_uptime() is not None
+                    reload_ts = time.perf_counter()
+                    if cache_dump is not None and unbound_control(['reload']).returncode != 0:
+                        print('unbound-control reload failed, not restoring the cache')
+                        registry.set('cache_preserved', 0, 'Whether the last reload preserved the cache')
+                        cache_dump = None
+                    if cache_dump is None:
+                        reload_ts = time.perf_counter()
+                        try:
+                            os.kill(int(unbound_pid), signal.SIGHUP)
+                        except Exception as err:
+                            state['unbound_pid'] = None
+                            raise SystemExit(err)
+
+                    # Any reload slot is held until this replica answers again
+                    reload_timeout = float(os.environ.get('UNBOUND_RELOAD_HEALTH_TIMEOUT_SECONDS', '120'))
+                    reload_seconds = wait_for_reload(reload_ts, check_uptime, reload_timeout)
+                    if reload_seconds is None:
+                        print(f'Unbound did not answer again within {reload_timeout:.0f}s of the reload')
+                    else:
+                        print(f'Unbound reloaded and answered again after {reload_seconds:.3f}s')
+                        registry.set('reload_duration_seconds', reload_seconds,
+                                     'Time from the reload until unbound answered its health check names again')
+                    if cache_dump is not None:
+                        restore_cache(cache_dump)
+                    if prewarm_cache:
+                        prewarm_hot_names()
+                finally:
+                    if semaphore is not None:
+                        semaphore.release()
 
+                # write config version
+                f = open(config_load_file, 'w')
+                f.write(folder_contents[0])
+                f.close()
+                write_loaded_digests(os.environ['UNBOUND_CONFIG_DIRECTORY'], manifest)
+                print('Warm reload of Unbound completed.\n')
+                record_propagation(os.environ['UNBOUND_CONFIG_DIRECTORY'])
+            else:
+                print('Did not detect Unbound pid.\n')
+                print('This can happen on the first run of initialize.py before Unbound has started.')
+        elif len(records) == 0:
+            print('Record data is empty, not reloading Unbound.')
+
+
+    # end timer
+    te = time.perf_counter()
+    print('Total time taken to run ({0:.5}s)'.format(te - ts), '\n')
+    registry.set('reload', int(reload_configs), 'Whether this run reloaded the configuration')
+    registry.set('duration_seconds', te - ts, 'Total time taken by initialize.py')
+    registry.write()
+    print('Completed check for updates to DNS records\n')
+
+#
+# Minimal inotify support through libc, used to notice the kubelet swapping
+# the configmap volume's ..data symlink as soon as it happens.
+#
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+def inotify_watch(directory, mask=IN_CREATE | IN_MOVED_TO):
+    libc = ctypes.CDLL(None, use_errno=True)
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        errno = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(errno, f'inotify_add_watch failed for {directory}')
+    return fd
+
+def read_inotify_names(fd):
+    names = []
+    try:
+        data = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return names
+    offset = 0
+    while offset + INOTIFY_EVENT.size <= len(data):
+        _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+        offset += INOTIFY_EVENT.size
+        names.append(os.fsdecode(data[offset:offset + length].rstrip(b'\0')))
+        offset += length
+    return names
+
+#
+# Block until the kubelet publishes new configmap data or the polling
+# interval expires.  Bursts of events are debounced so a single check runs
+# once the volume has settled.
+#
+def wait_for_configmap_change(fd, interval, debounce):
+    if fd is None:
+        time.sleep(interval)
+        return
+
+    deadline = time.monotonic() + interval
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        readable, _, _ = select.select([fd], [], [], remaining)
+        if not readable:
+            return
+        if '..data' in read_inotify_names(fd):
+            break
+
+    while select.select([fd], [], [], debounce)[0]:
+        read_inotify_names(fd)
+
+#
+# Stay resident, checking for updates whenever the configmap volume changes
+# and at least every DNS_INITIALIZE_INTERVAL_SECONDS.
+#
+def run_daemon(state):
+    interval = float(os.environ.get('DNS_INITIALIZE_INTERVAL_SECONDS', '90'))
+    debounce = float(os.environ.get('DNS_INITIALIZE_DEBOUNCE_SECONDS', '0.2'))
+    configmap_directory = os.environ['UNBOUND_CONFIGMAP_DIRECTORY']
+
+    try:
+        fd = inotify_watch(configmap_directory)
+        print(f'Watching {configmap_directory} for updates, polling every {interval}s as a fallback')
+    except (OSError, AttributeError) as err:
+        print(f'Unable to watch {configmap_directory} ({err}), polling every {interval}s')
+        fd = None
+
+    while True:
+        try:
+            check_for_updates(state)
+        except (Exception, SystemExit) as err:
+            print(f'Check for updates to DNS records failed: {err}')
+        sys.stdout.flush()
+        wait_for_configmap_change(fd, interval, debounce)
+
+def main():
+    state = {'unbound_pid': None}
+    if '--daemon' in sys.argv[1:]:
+        run_daemon(state)
+    else:
+        check_for_updates(state)
 
-# end timer
-te = time.perf_counter()
-print('Total time taken to run ({0:.5}s)'.format(te - ts), '\n')
-print('Completed check for updates to DNS records\n')
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+import os
+import json
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+SERVICE_ACCOUNT_DIRECTORY = '/var/run/secrets/kubernetes.io/serviceaccount'
+
+class ConflictError(Exception):
+    """
+    The object was modified since it was read (HTTP 409).
+    """
+
+class NotFoundError(requests.exceptions.HTTPError):
+    """
+    The object does not exist (HTTP 404).
+    """
+
+class KubernetesAPI(object):
+    """
+    Minimal Kubernetes API client using the pod's service account.
+
+    The endpoint defaults to the in-cluster API server and can be pointed at
+    a local fake API server with KUBERNETES_API_ENDPOINT.
+
+    Example use:
+        kube = KubernetesAPI()
+        configmap = kube.get_configmap('services', 'cray-dns-unbound')
+        kube.patch_configmap('services', 'cray-dns-unbound',
+                             {'data': {'key': 'value'}},
+                             resource_version=configmap['metadata']['resourceVersion'])
+    """
+
+    def __init__(self, endpoint=None, service_account_directory=SERVICE_ACCOUNT_DIRECTORY,
+                 timeout=(10, 60)):
+        if endpoint is None:
+            endpoint = os.environ.get('KUBERNETES_API_ENDPOINT')
+        if not endpoint:
+            endpoint = 'https://{}:{}'.format(os.environ.get('KUBERNETES_SERVICE_HOST', 'kubernetes.default.svc'),
+                                              os.environ.get('KUBERNETES_SERVICE_PORT', '443'))
+        self._endpoint = endpoint.rstrip('/')
+        self._timeout = timeout
+
+        retry_strategy = Retry(
+            total=5,
+            backoff_factor=0.1,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"]
+        )
+        adapter = HTTPAdapter(max_retries=retry_strategy)
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+        token_file = os.path.join(service_account_directory, 'token')
+        if os.path.isfile(token_file):
+            with open(token_file) as f:
+                self._session.headers['Authorization'] = 'Bearer ' + f.read().strip()
+
+        ca_file = os.path.join(service_account_directory, 'ca.crt')
+        if os.path.isfile(ca_file):
+            self._session.verify = ca_file
+
+    def _request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self._timeout)
+        response = self._session.request(method, self._endpoint + path, **kwargs)
+        if response.status_code == 409:
+            raise ConflictError(f'{method} {path}: {response.text}')
+        if response.status_code == 404:
+            raise NotFoundError(f'{method} {path}: {response.text}')
+        response.raise_for_status()
+        return response.json()
+
+    def get(self, path, params=None):
+        return self._request('GET', path, params=params)
+
+    def create(self, path, document):
+        return self._request('POST', path, data=json.dumps(document),
+                             headers={'Content-Type': 'application/json'})
+
+    def replace(self, path, document):
+        # The document's resourceVersion makes this fail with a 409 if the
+        # object changed since it was read.
+        return self._request('PUT', path, data=json.dumps(document),
+                             headers={'Content-Type': 'application/json'})
+
+    def patch(self, path, patch, resource_version=None,
+              content_type='application/strategic-merge-patch+json'):
+        # A resourceVersion in the patch makes the API server reject it with
+        # a 409 if the object changed since it was read.
+        if resource_version is not None:
+            patch = dict(patch)
+            patch['metadata'] = dict(patch.get('metadata', {}), resourceVersion=resource_version)
+        return self._request('PATCH', path, data=json.dumps(patch),
+                             headers={'Content-Type': content_type})
+
+    def get_configmap(self, namespace, name):
+        return self.get(f'/api/v1/namespaces/{namespace}/configmaps/{name}')
+
+    def patch_configmap(self, namespace, name, patch, resource_version=None):
+        return self.patch(f'/api/v1/namespaces/{namespace}/configmaps/{name}', patch,
+                          resource_version=resource_version)
+
+    def list_pods(self, namespace, label_selector):
+        return self.get(f'/api/v1/namespaces/{namespace}/pods', params={'labelSelector': label_selector})['items']
+
+    def get_lease(self, namespace, name):
+        return self.get(f'/apis/coordination.k8s.io/v1/namespaces/{namespace}/leases/{name}')
+
+    def create_lease(self, namespace, lease):
+        return self.create(f'/apis/coordination.k8s.io/v1/namespaces/{namespace}/leases', lease)
+
+    def replace_lease(self, namespace, lease):
+        return self.replace(f'/apis/coordination.k8s.io/v1/namespaces/{namespace}/leases/{lease["metadata"]["name"]}',
+                            lease)
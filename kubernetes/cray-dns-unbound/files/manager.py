@@ -4,17 +4,25 @@
 import os
 import re
 import sys
-import gzip
 import json
 import yaml
 import time
 import codecs
+import hashlib
+import functools
+import resource
 import shared
+import metrics
+import kubeapi
+import records_codec
+import snapshot_cache
 import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 import subprocess
 from urllib.parse import urljoin
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
 import logging
 from tempfile import NamedTemporaryFile
 
@@ -28,6 +36,8 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 log.addHandler(handler)
 
+registry = metrics.Registry.from_environment('cray_dns_unbound_manager', instance='cray-dns-unbound')
+
 class APIRequest(object):
     """
 
@@ -46,9 +56,13 @@ class APIRequest(object):
         print()
         print (f"response.json")
         print (f"{response.json()}")
+
+    Each instance owns one long-lived, pooled keep-alive session for its
+    base URL so repeated calls reuse connections.  Responses are requested
+    gzip encoded and every request is bounded by a (connect, read) timeout.
     """
 
-    def __init__(self, base_url, headers=None):
+    def __init__(self, base_url, headers=None, pool_maxsize=10, timeout=(10, 120)):
         if not base_url.endswith('/'):
             base_url += '/'
         self._base_url = base_url
@@ -58,6 +72,23 @@ class APIRequest(object):
         else:
             self._headers = {}
 
+        self._timeout = timeout
+
+        retry_strategy = Retry(
+            total=10,
+            backoff_factor=0.1,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["PATCH", "DELETE", "POST","HEAD", "GET", "OPTIONS"]
+        )
+
+        adapter = HTTPAdapter(max_retries=retry_strategy,
+                              pool_connections=1,
+                              pool_maxsize=pool_maxsize)
+        self._session = requests.Session()
+        self._session.headers.update({'Accept-Encoding': 'gzip'})
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
     def __call__(self, method, route, **kwargs):
 
         if route.startswith('/'):
@@ -67,20 +98,14 @@ class APIRequest(object):
 
         headers = kwargs.pop('headers', {})
         headers.update(self._headers)
+        kwargs.setdefault('timeout', self._timeout)
 
-        retry_strategy = Retry(
-            total=10,
-            backoff_factor=0.1,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["PATCH", "DELETE", "POST","HEAD", "GET", "OPTIONS"]
-        )
+        response = self._session.request(method=method, url=url, headers=headers, **kwargs)
 
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        http = requests.Session()
-        http.mount("https://", adapter)
-        http.mount("http://", adapter)
-
-        response = http.request(method=method, url=url, headers=headers, **kwargs)
+        # Formatting headers and the response body is expensive for large
+        # payloads, only do it when it will actually be logged.
+        if not log.isEnabledFor(logging.DEBUG):
+            return response
 
         if 'data' in kwargs:
             log.debug(f"{method} {url} with headers:"
@@ -100,6 +125,143 @@ class APIRequest(object):
 
         return response
 
+#
+# Projections used by the streaming parser.  Only the fields the merge
+# logic reads are kept from each SMD and SLS item.
+#
+def project_smd_ethernet_interface(smd):
+    return {'ComponentID': smd['ComponentID'],
+            'IPAddresses': [{'IPAddress': ip['IPAddress']} for ip in smd['IPAddresses'][:1]]}
+
+def project_smd_state_component(component):
+    return {k: component[k] for k in ('ID', 'NID') if k in component}
+
+def project_sls_hardware(sls):
+    record = {k: sls[k] for k in ('Xname', 'Parent') if k in sls}
+    if 'ExtraProperties' in sls:
+        record['ExtraProperties'] = {k: sls['ExtraProperties'][k]
+                                     for k in ('Role', 'Aliases', 'NID')
+                                     if k in sls['ExtraProperties']}
+    return record
+
+# (projection, top-level key holding the array) for each streamed source
+STREAMED_SOURCES = {
+    'smd_ethernet_interfaces': (project_smd_ethernet_interface, None),
+    'smd_state_components': (project_smd_state_component, 'Components'),
+    'sls_hardware': (project_sls_hardware, None),
+}
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+#
+# Issue a single upstream request and decode the JSON response, logging
+# the latency of the request.  Sources listed in STREAMED_SOURCES can be
+# parsed item by item while the response downloads, keeping only the
+# projected fields instead of the whole document.
+#
+# Returns the data and the SHA-256 of the response body.  With a snapshot
+# cache, GETs are made conditional on the validators of the last response
+# and a 304 Not Modified is answered from the cached snapshot.
+#
+def fetch_json(name, api, method, route, streaming=False, cache=None, **kwargs):
+    ts = time.perf_counter()
+    streamed = streaming and name in STREAMED_SOURCES
+    snapshot = name + '-streamed' if streamed else name
+    validators = None
+    if cache is not None and cache.enabled and method == 'GET':
+        validators = cache.get_validators(snapshot)
+    request_kwargs = dict(kwargs)
+    if validators:
+        headers = dict(request_kwargs.get('headers', {}))
+        if validators['etag']:
+            headers['If-None-Match'] = validators['etag']
+        if validators['last_modified']:
+            headers['If-Modified-Since'] = validators['last_modified']
+        request_kwargs['headers'] = headers
+
+    data = None
+    digest = hashlib.sha256()
+    response_bytes = 0
+    if streamed:
+        project, key = STREAMED_SOURCES[name]
+        with api(method, route, stream=True, **request_kwargs) as resp:
+            def chunks():
+                nonlocal response_bytes
+                for chunk in resp.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    response_bytes += len(chunk)
+                    digest.update(chunk)
+                    yield chunk
+            if resp.status_code != 304:
+                data = [project(item) for item in shared.iter_json_array(chunks(), key)]
+                if key is not None:
+                    data = {key: data}
+    else:
+        resp = api(method, route, **request_kwargs)
+        if resp.status_code != 304:
+            data = resp.json()
+            response_bytes = len(resp.content)
+            digest.update(resp.content)
+
+    if resp.status_code == 304:
+        source_digest = validators['digest']
+        data = cache.get_source(snapshot, source_digest)
+        if data is None:
+            log.warning(f'Cached {name} data is missing, fetching it again')
+            return fetch_json(name, api, method, route, streaming=streaming, **kwargs)
+        log.info(f'{name} data not modified, using cached snapshot')
+    else:
+        source_digest = digest.hexdigest()
+        etag = resp.headers.get('ETag')
+        last_modified = resp.headers.get('Last-Modified')
+        if cache is not None and (etag or last_modified):
+            cache.put_source(snapshot, source_digest, data, etag, last_modified)
+
+    te = time.perf_counter()
+    log.info(f'Retrieved {name} data {te - ts:.3f}s')
+    registry.set('upstream_latency_seconds', te - ts,
+                 'Latency of each upstream request in seconds', source=name)
+    registry.set('upstream_response_bytes', response_bytes,
+                 'Decoded size of each upstream response in bytes', source=name)
+    return data, source_digest
+
+#
+# Record the duration of a manager phase.
+#
+def observe_phase(phase, seconds):
+    registry.set('phase_duration_seconds', seconds,
+                 'Duration of each manager phase in seconds', phase=phase)
+
+#
+# Record the number of records produced or read by each source.
+#
+def observe_records(source, count):
+    registry.set('records', count, 'Number of records per source', source=source)
+
+#
+# Fetch Kea, SMD and SLS data concurrently.  None of the calls depend on
+# each other so the wall-clock time is that of the slowest call.  Returns
+# the data and the response digest of each source.
+#
+def fetch_sources(kea_api, smd_api, sls_api, streaming=False, cache=None):
+    kea_headers = {"Content-Type": "application/json"}
+    kea_request = {"command": "config-get", "service": ["dhcp4"]}
+
+    calls = {
+        'kea': (kea_api, 'POST', '/', {'headers': kea_headers, 'json': kea_request}),
+        'smd_ethernet_interfaces': (smd_api, 'GET', '/hsm/v2/Inventory/EthernetInterfaces', {}),
+        'smd_state_components': (smd_api, 'GET', '/hsm/v2/State/Components/', {}),
+        'sls_hardware': (sls_api, 'GET', '/v1/hardware', {}),
+        'sls_networks': (sls_api, 'GET', '/v1/networks', {}),
+    }
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        futures = {name: executor.submit(fetch_json, name, api, method, route,
+                                         streaming=streaming, cache=cache, **kwargs)
+                   for name, (api, method, route, kwargs) in calls.items()}
+        results = {name: future.result() for name, future in futures.items()}
+    return ({name: data for name, (data, _) in results.items()},
+            {name: digest for name, (_, digest) in results.items()})
+
 #
 # Perform Kea error checking and and data validation.
 #
@@ -133,6 +295,770 @@ def get_kea_records(kea_response_json):
 
     return kea_records
 
+#
+# Merge global and local Kea leases/reservations - with cleanup.
+# Duplicates are dropped with a (hostname, ip) set rather than a list scan.
+#
+def merge_kea_leases(leases):
+    records = []
+    seen = set()
+    for lease in leases:
+        # Some nodes might be in discovery
+        if 'hostname' not in lease or 'ip-address' not in lease:
+            continue
+
+        # Having empty values is an error
+        if not lease['hostname'].strip() or not lease['ip-address'].strip():
+            log.error('Kea returned lease with incomplete data, continuing {lease}')
+            continue
+
+        # CASMNET-124: change nid to nid-nmn for v1.3 because nid is HSN
+        #   TODO - move this to Central DNS after data naming cleanup
+        hostname = lease['hostname']
+        if hostname.find('nid') > -1:
+            hostname += '-nmn'
+
+        key = (hostname, lease['ip-address'])
+        if key in seen:
+            continue
+        seen.add(key)
+        records.append({'hostname': hostname, 'ip-address': lease['ip-address']})
+
+    return records
+
+#
+# Index usable SMD EthernetInterfaces by IP address and by ComponentID,
+# keeping the position of the first occurrence of each.
+#
+def index_smd_records(smd_records):
+    by_ip = {}
+    by_component = {}
+    for position, smd in enumerate(smd_records):
+        # Skip records with blank data
+        if smd['IPAddresses'] == [] or not smd['ComponentID'].strip() or \
+                smd['IPAddresses'][0]['IPAddress'] == '':
+            continue
+        by_ip.setdefault(smd['IPAddresses'][0]['IPAddress'], position)
+        by_component.setdefault(smd['ComponentID'], position)
+
+    return by_ip, by_component
+
+#
+# Find CNAME records in SMD
+#
+# Not all records in SMD are desired, only those with matching IP addresses
+# and different hostnames - resulting in CNAMES.  The first usable SMD entry
+# matching either the hostname or the IP address of a record decides: a
+# hostname match is an expected SMD/Kea duplicate and yields nothing.
+#
+def find_smd_cnames(dns_records, smd_records):
+    by_ip, by_component = index_smd_records(smd_records)
+
+    new_records = []
+    for dns in dns_records:
+        ip_position = by_ip.get(dns['ip-address'])
+        if ip_position is None:
+            continue
+
+        component_position = by_component.get(dns['hostname'])
+        if component_position is not None and component_position <= ip_position:
+            continue
+
+        smd = smd_records[ip_position]
+        new_records.append({'hostname': smd['ComponentID'],
+                            'ip-address': smd['IPAddresses'][0]['IPAddress']})
+
+    return new_records
+
+#
+# Collect the reservations of every Kea subnet.
+#
+def get_kea_subnet_leases(kea_subnets):
+    leases = []
+    for subnet in kea_subnets:
+        if 'reservations' not in subnet:
+            continue
+        for lease in subnet['reservations']:
+            record = {'hostname': lease['hostname'],
+                      'ip-address': lease['ip-address']}
+            leases.append(record)
+    return leases
+
+#
+# Index the usable SMD EthernetInterfaces by ComponentID.  Each entry keeps
+# its position so matches for several xnames can be merged back into SMD
+# order.
+#
+def index_smd_addresses(smd_records):
+    by_component = {}
+    for position, smd in enumerate(smd_records):
+        # Skip records with blank entries
+        if not smd['ComponentID'].strip() or smd['IPAddresses'] == [] or \
+                smd['IPAddresses'][0]['IPAddress'] == '':
+            continue
+        by_component.setdefault(smd['ComponentID'], []).append(
+            (position, smd['ComponentID'], smd['IPAddresses'][0]['IPAddress']))
+    return by_component
+
+#
+# Index the nid names among the DNS records by the alias they match, with
+# the position of each record so matches keep DNS record order.
+#
+def index_nid_aliases(dns_records):
+    by_alias = {}
+    for position, dns in enumerate(dns_records):
+        if dns['hostname'].find('nid') > -1:
+            by_alias.setdefault(dns['hostname'].replace('-nmn', ''), []).append(position)
+    return by_alias
+
+#
+# Correlate SLS hardware with Kea nid names and SMD addresses.  Returns the
+# nid name / xname correlations and the new alias records.
+#
+# SMD state components, DNS records and SMD addresses are indexed once so
+# each SLS hardware entry is a handful of lookups.
+#
+def correlate_sls_hardware(sls_records, smd_records, smd_state_components, dns_records):
+    # The last component with a NID decides, as SMD lists each once
+    nid_by_xname = {}
+    for record in smd_state_components['Components']:
+        if 'NID' in record:
+            nid_by_xname[record['ID']] = 'nid' + str(record['NID'])
+    nid_aliases = index_nid_aliases(dns_records)
+    smd_by_component = index_smd_addresses(smd_records)
+
+    nid_records = []
+    new_records = []
+    # Not all records in SLS are desired, only those with xnames
+    # where the SubRole is UAN.
+    for sls in sls_records:
+        # Skip records without minimal required data
+        if 'ExtraProperties' not in sls or \
+                'Role' not in sls['ExtraProperties'] or \
+                'Aliases' not in sls['ExtraProperties']:
+            continue
+
+        aliases = sls['ExtraProperties']['Aliases']
+
+        # check for UAN artficial NID number
+        # smd_state_components data is tied to discovery data
+        # the data will be dynamic and reason for extra logic for error handling
+        if sls['ExtraProperties']['Role'] == 'Application':
+            xname = sls['Xname']
+            nidname = nid_by_xname.get(xname, '')
+            if nidname != '':
+                nid_records.append({'nidname': nidname, 'xname': xname})
+
+        # get NCN nid number
+        if sls['ExtraProperties']['Role'] == 'Management':
+            nidname = 'nid' + str(sls['ExtraProperties']['NID'])
+            xname = sls['Xname']
+            nid_records.append({'nidname': nidname, 'xname': xname})
+
+        # Assemble nid name / xname correlation for HSN records later
+        # TODO: move this correlation around in Central DNS
+        matches = sorted((position, alias) for alias in set(aliases)
+                         for position in nid_aliases.get(alias, ()))
+        for _, nidname in matches:
+            nid_records.append({'nidname': nidname, 'xname': sls['Xname']})
+
+        if sls['ExtraProperties']['Role'] == 'Management' or \
+                sls['ExtraProperties']['Role'] == 'Application':
+
+            hmn_xname = sls['Parent']
+            nmn_xname = sls['Xname']
+
+            addresses = smd_by_component.get(hmn_xname, [])
+            if nmn_xname != hmn_xname:
+                addresses = sorted(addresses + smd_by_component.get(nmn_xname, []))
+            for _, component, ip in addresses:
+                # Get the HMN IP address
+                if component == hmn_xname:
+                    for alias in aliases:
+                        mgmt_alias = alias + '-mgmt'
+                        new_records.append({'hostname': mgmt_alias, 'ip-address': ip})
+
+                # Get the NMN IP address
+                if component == nmn_xname:
+                    # create records for all aliases for node in NMN
+                    for alias in aliases:
+                        # get alias and create record
+                        new_records.append({'hostname': alias, 'ip-address': ip})
+                        # add -nmn to alias and create record
+                        nmn_alias = alias + '-nmn'
+                        new_records.append({'hostname': nmn_alias, 'ip-address': ip})
+
+    return nid_records, new_records
+
+#
+# Parse an SLS HSN reservation name such as x1003c7s07b1n1h0 into the xname
+# SLS hardware uses (port removed, zero padding dropped: x1003c7s7b1n1) and
+# the port.  Names repeat across networks and runs, so results are cached.
+#
+NETWORK_SUBDOMAIN = re.compile(r'^(NMN|HMN|HSN|MTL|CAN|CHN|CMN)_.*$')
+XNAME_PORT = re.compile(r'h\d+$')
+XNAME_PADDING = re.compile(r'([a-z])0+([0-9]+[a-z])')
+RESERVATION_PORT = re.compile(r'^(.*)h(\d+)$')
+
+@functools.lru_cache(maxsize=1 << 16)
+def parse_reservation_name(name):
+    xname = XNAME_PADDING.sub(r'\1\2', XNAME_PORT.sub('', name))
+    port = RESERVATION_PORT.sub(r'\2', name)
+    return xname, port
+
+#
+# Expand a run of reservations from one subnet into static and alias
+# records.  Returns the records and the number of HSN nid matches.
+#
+def expand_reservations(reservations, subdomain, nids_by_xname, nic_index):
+    hsn_matches = 0
+    static_records = []
+    for reservation in reservations:
+        if 'Name' in reservation and reservation['Name'].strip():
+            # TODO: split this out as A Record in central DNS.
+            # NOTE: APPEND SUBDOMAIN to A Record to enforce part of DNS hierarchy.
+            record = {'hostname': '{}.{}'.format(reservation['Name'], subdomain),
+                      'ip-address': reservation['IPAddress']}
+            static_records.append(record)
+
+            # CASMNET-379 - default no subdomain requests to NMN.  This needs to
+            # be removed when the full domain hierarchy is put into place.
+            if subdomain == 'nmn':
+                record = {'hostname': '{}'.format(reservation['Name']),
+                          'ip-address': reservation['IPAddress']}
+                static_records.append(record)
+        if 'Aliases' in reservation:
+            for alias in reservation['Aliases']:
+                # TODO: split this out as a CNAME in central DNS.
+                if not alias:
+                    continue
+                record = {'hostname': alias, 'ip-address': reservation['IPAddress']}
+                static_records.append(record)
+
+        # CASMINST-1114 PART 2: nid aliases for HSN xname records.
+        # TODO: This needs to be done differently in central DNS.
+        # Three records per: nid002023 x1003c7s7b1n1h0 nid002023-hsn0
+        # Operate only on xnames
+        if reservation['Name'][0] == 'x':
+            reservation_xname, port = parse_reservation_name(reservation['Name'])
+            for nidname in nids_by_xname.get(reservation_xname, ()):
+                hsn_matches += 1
+
+                if subdomain != 'chn':
+
+                    ipv4 = reservation['IPAddress']
+
+                    if nic_index in reservation['Name'] or nic_index == 'all':
+                        record = {'hostname': nidname, 'ip-address': ipv4}
+                        static_records.append(record)
+
+                    record = {'hostname': nidname + '-hsn' + port, 'ip-address': ipv4}
+                    static_records.append(record)
+
+                    record = {'hostname': reservation['Name'], 'ip-address': ipv4}
+                    static_records.append(record)
+
+    return static_records, hsn_matches
+
+#
+# Reservation runs of every subnet, in SLS order, as (subdomain,
+# reservations) pairs.
+#
+def get_reservation_runs(sls_networks):
+    runs = []
+    for network in sls_networks:
+        if not 'ExtraProperties' in network:
+            continue
+
+        if not 'Subnets' in network['ExtraProperties'] or \
+                not network['ExtraProperties']['Subnets']:
+            continue
+
+        subnets = network['ExtraProperties']['Subnets']
+        for subnet in subnets:
+            if not 'IPReservations' in subnet:
+                continue
+
+            subdomain = NETWORK_SUBDOMAIN.sub(r'\1', network['Name']).lower()
+            runs.append((subdomain, subnet['IPReservations']))
+    return runs
+
+#
+# Process pool workers are forked with the reservation runs and nid index
+# already in memory, so tasks only name the slice of a run to expand.
+#
+expansion_inputs = {}
+
+def init_expansion_worker(runs, nids_by_xname, nic_index):
+    expansion_inputs.update(runs=runs, nids_by_xname=nids_by_xname, nic_index=nic_index)
+
+def expand_reservation_slice(task):
+    run, start, stop = task
+    subdomain, reservations = expansion_inputs['runs'][run]
+    return expand_reservations(reservations[start:stop], subdomain,
+                               expansion_inputs['nids_by_xname'], expansion_inputs['nic_index'])
+
+#
+# Expand SLS network IP reservations into static and alias records.  Returns
+# the static records and the number of HSN nid matches.
+#
+# With more than one worker and at least threshold reservations the
+# subnets are cut into slices expanded by a process pool.  Slices are
+# merged back in SLS order, so the result is identical to the serial path.
+#
+def expand_network_reservations(sls_networks, nid_records, nic_index, workers=1, threshold=0):
+    # Nid names by SLS xname, in nid_records order
+    nids_by_xname = {}
+    for nid in nid_records:
+        nids_by_xname.setdefault(nid['xname'], []).append(nid['nidname'])
+
+    runs = get_reservation_runs(sls_networks)
+    total = sum(len(reservations) for _, reservations in runs)
+    if workers <= 1 or total < max(threshold, 1):
+        results = [expand_reservations(reservations, subdomain, nids_by_xname, nic_index)
+                   for subdomain, reservations in runs]
+    else:
+        # A few slices per worker keeps the pool busy when subnets differ in size
+        size = max(1, -(-total // (workers * 4)))
+        tasks = [(run, start, start + size) for run, (_, reservations) in enumerate(runs)
+                 for start in range(0, len(reservations), size)]
+        log.info(f'Expanding {total} SLS reservations in {len(tasks)} slices with {workers} processes')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                 initializer=init_expansion_worker,
+                                 initargs=(runs, nids_by_xname, nic_index)) as executor:
+            results = list(executor.map(expand_reservation_slice, tasks))
+
+    static_records = [record for records, _ in results for record in records]
+    return static_records, sum(matches for _, matches in results)
+
+#
+# Encode a JSON document as the base64, gzip'd value stored in binaryData.
+#
+def encode_binary_data(document, version=1):
+    data = records_codec.encode(document, version)  # Deterministic gzip'd bytes
+    return codecs.encode(data, encoding='base64')
+
+#
+# Decode a base64, gzip'd binaryData value back into a JSON document.
+#
+def decode_binary_data(value):
+    if isinstance(value, str):
+        value = codecs.encode(value, encoding='utf-8')  # Bytes object
+    value = codecs.decode(value, encoding='base64')
+    return records_codec.decode(value)
+
+#
+# Compute the exact (hostname, ip) records added and removed since the
+# records currently in the configmap.  Consumers can apply the delta in
+# time proportional to the change; the generation increases by one with
+# every write so a gap tells a consumer to fall back to records.json.gz.
+#
+RECORDS_DELTA_KEY = 'records-delta.json.gz'
+RECORDS_DELTA_VERSION = 1
+
+def build_records_delta(existing_records, new_records, generation):
+    existing = {(r['hostname'], r['ip-address']) for r in existing_records}
+    new = {(r['hostname'], r['ip-address']) for r in new_records}
+    return {
+        'version': RECORDS_DELTA_VERSION,
+        'generation': generation,
+        'base_generation': generation - 1,
+        'added': [{'hostname': h, 'ip-address': ip} for h, ip in sorted(new - existing)],
+        'removed': [{'hostname': h, 'ip-address': ip} for h, ip in sorted(existing - new)],
+    }
+
+#
+# Generation of the records currently in the configmap, 0 if unknown.
+#
+def get_records_generation(configmap):
+    try:
+        return int(decode_binary_data(configmap['binaryData'][RECORDS_DELTA_KEY])['generation'])
+    except Exception:
+        return 0
+
+#
+# ConfigMap annotation tying the stored records to the upstream responses
+# they were generated from.
+#
+SOURCES_ANNOTATION = 'dns.cray.io/sources-sha256'
+CARRIED_ANNOTATIONS = (records_codec.DIGEST_ANNOTATION, SOURCES_ANNOTATION)
+
+#
+# Digest of this script and the record encoding, so a new release never
+# reuses results computed by an older one.
+#
+def get_code_digest():
+    digest = hashlib.sha256()
+    for path in (__file__, records_codec.__file__):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+#
+# Digest of everything a run derives records from: every upstream response,
+# the settings that change the result and the code itself.
+#
+def get_inputs_digest(code_digest, source_digests, nic_index, records_version, records_shards, canary=''):
+    return snapshot_cache.SnapshotCache.key(code_digest, nic_index, records_version, records_shards, canary,
+                                            *(f'{name}={source_digests[name]}'
+                                              for name in sorted(source_digests)))
+
+#
+# Sources annotation value for records generated from inputs_digest.  The
+# stored records value is part of it so records changed by anything else
+# are never mistaken for ones the manager wrote.
+#
+def get_sources_digest(inputs_digest, records_value):
+    if isinstance(records_value, bytes):
+        records_value = records_value.decode('utf-8')
+    return hashlib.sha256((inputs_digest + ''.join(records_value.split())).encode('utf-8')).hexdigest()
+
+#
+# Value the sources digest of the stored records is computed from: the
+# records, or the shard manifest when the records are sharded.
+#
+def get_records_value(configmap):
+    value = configmap['binaryData']['records.json.gz']
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    return value + (configmap.get('data') or {}).get(records_codec.MANIFEST_KEY, '')
+
+def get_stored_sources_digest(configmap):
+    annotations = configmap['metadata'].get('annotations') or {}
+    return annotations.get(SOURCES_ANNOTATION)
+
+#
+# Memoize a derived stage by the key of its inputs in the snapshot cache.
+#
+def memoize_stage(cache, stage, key, compute):
+    value, hit = cache.memoize(stage, key, compute)
+    if hit:
+        log.info(f'Reusing {stage} results for unchanged inputs')
+    registry.set('stage_cache_hit', int(hit), 'Whether a stage was answered from the snapshot cache',
+                 stage=stage)
+    return value
+
+#
+# Log and record the peak resident memory of the run.
+#
+def log_peak_rss():
+    # ru_maxrss is reported in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    log.info(f'Peak resident memory {peak_rss / (1024 * 1024):.1f}MiB')
+    registry.set('peak_rss_bytes', peak_rss, 'Peak resident set size of the manager')
+
+#
+# Read the unbound configmap, either through the Kubernetes API or kubectl.
+#
+def read_configmap(kube=None):
+    name = os.environ['KUBERNETES_UNBOUND_CONFIGMAP_NAME']
+    namespace = os.environ['KUBERNETES_NAMESPACE']
+    if kube is not None:
+        log.info(f'Reading existing records and configuration from the Kubernetes API.')
+        return kube.get_configmap(namespace, name)
+
+    log.info(f'Running kubectl to retrieve existing records and configuration.')
+    output = shared.run_command(['kubectl', 'get', 'configmap', name, '-n', namespace, '-o', 'yaml'],
+                                quiet=True)
+    configmap = yaml.load(output, Loader=yaml.FullLoader)
+    # Only the records and sources digest annotations are carried over by
+    # kubectl replace
+    annotations = configmap['metadata'].pop('annotations', None) or {}
+    carried = {key: annotations[key] for key in CARRIED_ANNOTATIONS if key in annotations}
+    if carried:
+        configmap['metadata']['annotations'] = carried
+    return configmap
+
+#
+# Digest annotation stored with the records, None if there is none.
+#
+def get_records_digest(configmap):
+    annotations = configmap['metadata'].get('annotations') or {}
+    return annotations.get(records_codec.DIGEST_ANNOTATION)
+
+#
+# Digest annotation value for records with records_digest.  Like the
+# sources digest it covers the stored records value, so records reset by
+# the chart or changed by anything else never match the annotation.
+#
+def get_records_annotation(records_digest, records_value):
+    return get_sources_digest(records_digest, records_value)
+
+#
+# Records can be sharded across ConfigMaps named after the unbound configmap
+# once one object would come close to the etcd object size limit.  The
+# unbound configmap then holds a manifest listing each shard's ConfigMap,
+# mounted path and SHA-256 digest instead of the records themselves.
+#
+SHARD_WORKERS = 8
+
+def get_shard_configmap_name(configmap, index):
+    return f'{configmap["metadata"]["name"]}-records-{index}'
+
+def get_records_manifest(configmap):
+    try:
+        return json.loads((configmap.get('data') or {})[records_codec.MANIFEST_KEY])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+#
+# Read a shard ConfigMap, either through the Kubernetes API or kubectl.
+#
+def read_shard_configmap(namespace, name, kube=None):
+    if kube is not None:
+        return kube.get_configmap(namespace, name)
+    output = shared.run_command(['kubectl', 'get', 'configmap', name, '-n', namespace, '-o', 'yaml'],
+                                quiet=True)
+    return yaml.load(output, Loader=yaml.FullLoader)
+
+#
+# Read the stored records value of every shard in the manifest, in
+# parallel.  Returns None when the records are not sharded.
+#
+def read_record_shards(configmap, kube=None):
+    manifest = get_records_manifest(configmap)
+    if manifest is None:
+        return None
+
+    namespace = configmap['metadata']['namespace']
+    def read_shard(shard):
+        shard_configmap = read_shard_configmap(namespace, shard['configmap'], kube)
+        return (shard_configmap.get('binaryData') or {}).get('records.json.gz')
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(len(manifest['shards']), SHARD_WORKERS))) as executor:
+            return list(executor.map(read_shard, manifest['shards']))
+    except Exception as err:
+        raise SystemExit(err)
+
+#
+# SHA-256 digest of the records in a stored shard value, as listed in the
+# manifest, None if there is no valid value.
+#
+def get_shard_digest(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = codecs.encode(value, encoding='utf-8')
+    try:
+        return hashlib.sha256(codecs.decode(value, encoding='base64')).hexdigest()
+    except ValueError:
+        return None
+
+#
+# Whether every shard still holds the records the manifest lists for it.
+#
+def shards_match_manifest(manifest, shard_values):
+    return all(get_shard_digest(value) == shard['sha256']
+               for shard, value in zip(manifest['shards'], shard_values))
+
+#
+# Decode the records stored in the configmap, reading the shards when the
+# records are sharded and shard_values were not read already.
+#
+def get_existing_records(configmap, kube=None, shard_values=None):
+    manifest = get_records_manifest(configmap)
+    if manifest is not None and shard_values is None:
+        shard_values = read_record_shards(configmap, kube)
+    try:
+        if manifest is None:
+            return decode_binary_data(configmap['binaryData']['records.json.gz'])
+        return [record for value in shard_values for record in decode_binary_data(value)]
+    except Exception as err:
+        raise SystemExit(err)
+
+#
+# The stored records without the canary write_records adds, so they compare
+# equal to freshly generated records.
+#
+def without_canary(records):
+    return [record for record in records if records_codec.canary_generation(record['ip-address']) is None]
+
+#
+# The canary record written with the stored generation, None without one.
+#
+def get_stored_canary(configmap):
+    try:
+        propagation = json.loads((configmap.get('data') or {})[records_codec.PROPAGATION_KEY])
+        return {'hostname': propagation['canary'], 'ip-address': propagation['address']}
+    except (KeyError, TypeError, ValueError):
+        return None
+
+#
+# Store one shard of the records in its ConfigMap.
+#
+def write_shard(namespace, name, value, kube=None):
+    value = value.decode('utf-8').replace('\n', '')
+    if kube is not None:
+        try:
+            kube.patch_configmap(namespace, name, {'binaryData': {'records.json.gz': value}})
+        except requests.exceptions.HTTPError as err:
+            raise SystemExit(f'Unable to write records shard {name}, the chart creates one ConfigMap '
+                             f'per shard when recordsShards is set: {err}')
+        return
+
+    # The shard is read and replaced whole so its chart labels are kept
+    try:
+        shard_configmap = read_shard_configmap(namespace, name)
+        command = 'replace'
+    except SystemExit:
+        shard_configmap = {'apiVersion': 'v1', 'kind': 'ConfigMap',
+                           'metadata': {'name': name, 'namespace': namespace}}
+        command = 'create'
+    shard_configmap['binaryData'] = {'records.json.gz': value}
+    with NamedTemporaryFile(mode='w', encoding='utf-8', suffix=".yaml") as tmp:
+        yaml.dump(shard_configmap, tmp, default_flow_style=False)
+        tmp.flush()
+        shared.run_command(['kubectl', command, '-f', tmp.name], quiet=True)
+
+#
+# Split the records into shards and write the shards whose digest differs
+# from the current manifest, or from the stored shard_values when they
+# were read.  Returns the new manifest.
+#
+def write_record_shards(configmap, records, shards, records_version, kube=None, shard_values=None):
+    current = get_records_manifest(configmap) or {}
+    if shard_values is None:
+        current_digests = {shard['configmap']: shard['sha256'] for shard in current.get('shards', [])}
+    else:
+        current_digests = {shard['configmap']: get_shard_digest(value)
+                           for shard, value in zip(current.get('shards', []), shard_values)}
+    namespace = configmap['metadata']['namespace']
+
+    manifest = {'version': records_codec.MANIFEST_VERSION, 'shards': []}
+    changed = []
+    for index, shard_records in enumerate(records_codec.partition_records(records, shards)):
+        name = get_shard_configmap_name(configmap, index)
+        data = records_codec.encode(shard_records, records_version)
+        shard_digest = hashlib.sha256(data).hexdigest()
+        manifest['shards'].append({'configmap': name, 'path': records_codec.shard_path(index),
+                                   'sha256': shard_digest, 'records': len(shard_records)})
+        if current_digests.get(name) != shard_digest:
+            changed.append((name, codecs.encode(data, encoding='base64')))
+
+    log.info(f'  Writing {len(changed)} of {shards} record shards')
+    registry.set('records_shards_written', len(changed), 'Record shards rewritten by the last write')
+    with ThreadPoolExecutor(max_workers=max(1, min(len(changed), SHARD_WORKERS))) as executor:
+        for future in [executor.submit(write_shard, namespace, name, value, kube) for name, value in changed]:
+            future.result()
+    return manifest
+
+#
+# Store the new records and their delta in the configmap and apply it.
+#
+# Through the Kubernetes API only the binaryData keys are strategic-merge
+# patched, guarded by the resourceVersion that was read.  Otherwise the
+# whole configmap is replaced with kubectl.
+#
+# With shards the changed shards are written first and the manifest last,
+# so the manifest never lists a shard that has not been stored yet.
+#
+# With a canary name every generation is written with a canary record for
+# that generation and its write time, so the time it takes the unbound
+# replicas to answer with it can be measured.  Only the canary name is part
+# of records_digest, so a new generation alone is never a difference.
+#
+def write_records(configmap, records, records_digest, existing_records, kube=None,
+                  records_version=1, inputs_digest=None, shards=0, canary=None, shard_values=None):
+    generation = get_records_generation(configmap) + 1
+    # existing_records come without the stored canary, which the delta removes
+    stored_canary = get_stored_canary(configmap)
+    if stored_canary is not None:
+        existing_records = existing_records + [stored_canary]
+    propagation = None
+    if canary:
+        canary_record = records_codec.canary_record(canary, generation)
+        records = records_codec.sort_records(records + [canary_record])
+        propagation = json.dumps({'generation': generation, 'written_at': time.time(),
+                                  'canary': canary, 'address': canary_record['ip-address']})
+        log.info(f'  Canary {canary} {canary_record["ip-address"]} for generation {generation}')
+    delta = build_records_delta(existing_records, records, generation)
+    log.info(f'  Records generation {generation}: {len(delta["added"])} added, '
+             f'{len(delta["removed"])} removed')
+    registry.set('records_generation', generation, 'Generation of the records written to the configmap')
+    registry.set('records_delta', len(delta['added']), 'Records changed by the last write', change='added')
+    registry.set('records_delta', len(delta['removed']), 'Records changed by the last write', change='removed')
+
+    if shards and len(delta['added']) + len(delta['removed']) > len(records) // shards:
+        # A delta larger than a shard could push the unbound configmap past
+        # the size limit sharding avoids.  Without a base generation readers
+        # fall back to the full records.
+        delta.update(base_generation=None, added=[], removed=[])
+
+    # Data keys to set, None removes a key
+    data = {}
+    if shards:
+        manifest = write_record_shards(configmap, records, shards, records_version, kube, shard_values)
+        data[records_codec.MANIFEST_KEY] = json.dumps(manifest, indent=1)
+        # Readers without shard support render these empty records into an
+        # empty records.conf and only skip the reload, so unbound loses its
+        # records at its next reload or restart.  recordsShards may only be
+        # set once every replica runs an initialize.py that reads shards.
+        records_value = encode_binary_data([])
+    else:
+        if get_records_manifest(configmap) is not None:
+            data[records_codec.MANIFEST_KEY] = None
+        records_value = encode_binary_data(records, records_version)
+    if propagation is not None:
+        data[records_codec.PROPAGATION_KEY] = propagation
+    elif records_codec.PROPAGATION_KEY in (configmap.get('data') or {}):
+        data[records_codec.PROPAGATION_KEY] = None
+
+    binary_data = {'records.json.gz': records_value,
+                   RECORDS_DELTA_KEY: encode_binary_data(delta)}
+    configmap['binaryData'].update(binary_data)
+    for key, value in data.items():
+        if value is None:
+            configmap.get('data', {}).pop(key, None)
+        else:
+            configmap.setdefault('data', {})[key] = value
+    annotations = {records_codec.DIGEST_ANNOTATION: get_records_annotation(records_digest,
+                                                                           get_records_value(configmap))}
+    if inputs_digest is not None:
+        annotations[SOURCES_ANNOTATION] = get_sources_digest(inputs_digest, get_records_value(configmap))
+    configmap['metadata'].setdefault('annotations', {}).update(annotations)
+
+    if kube is not None:
+        patch = {'metadata': {'annotations': annotations},
+                 'binaryData': {key: value.decode('utf-8').replace('\n', '')
+                                for key, value in binary_data.items()}}
+        if data:
+            patch['data'] = data
+        log.info(f'  Patching the configmap')
+        try:
+            kube.patch_configmap(configmap['metadata']['namespace'], configmap['metadata']['name'],
+                                 patch, resource_version=configmap['metadata']['resourceVersion'])
+        except kubeapi.ConflictError as err:
+            raise SystemExit(f'ConfigMap was modified while records were generated, '
+                             f'leaving it for the next run: {err}')
+        return
+
+    with NamedTemporaryFile(mode='w', encoding='utf-8', suffix=".yaml") as tmp:
+        yaml.dump(configmap, tmp, default_flow_style=False)
+        try:
+            log.info(f'  Applying the configmap')
+            shared.run_command(['kubectl', 'replace', '--force', '-f', tmp.name])
+        except SystemExit:
+            log.error(f'  Failed to apply the configmap, retrying.')
+            shared.run_command(['kubectl', 'replace', '--force', '-f', tmp.name])
+
+#
+# Update annotations on the configmap without touching its data.
+#
+def annotate_configmap(configmap, annotations, kube=None):
+    configmap['metadata'].setdefault('annotations', {}).update(annotations)
+    namespace = configmap['metadata']['namespace']
+    name = configmap['metadata']['name']
+    if kube is not None:
+        try:
+            kube.patch_configmap(namespace, name, {'metadata': {'annotations': annotations}},
+                                 resource_version=configmap['metadata']['resourceVersion'])
+        except kubeapi.ConflictError as err:
+            log.warning(f'ConfigMap was modified, not updating its annotations: {err}')
+        return
+
+    shared.run_command(['kubectl', 'annotate', 'configmap', name, '-n', namespace, '--overwrite'] +
+                       [f'{key}={value}' for key, value in annotations.items()])
+
 def main():
     #
     # Give istio-proxy channel a chance to be ready
@@ -146,10 +1072,13 @@ def main():
 
     api_errors = False
 
-    # setup api urls
-    kea_api = APIRequest(os.environ['KEA_API_ENDPOINT'])
-    smd_api = APIRequest(os.environ['SMD_API_ENDPOINT'])
-    sls_api = APIRequest(os.environ['SLS_API_ENDPOINT'])
+    # setup api urls with one pooled session each
+    api_pool_maxsize = int(os.environ.get('API_POOL_MAXSIZE', '10'))
+    api_timeout = (float(os.environ.get('API_CONNECT_TIMEOUT_SECONDS', '10')),
+                   float(os.environ.get('API_READ_TIMEOUT_SECONDS', '120')))
+    kea_api = APIRequest(os.environ['KEA_API_ENDPOINT'], pool_maxsize=api_pool_maxsize, timeout=api_timeout)
+    smd_api = APIRequest(os.environ['SMD_API_ENDPOINT'], pool_maxsize=api_pool_maxsize, timeout=api_timeout)
+    sls_api = APIRequest(os.environ['SLS_API_ENDPOINT'], pool_maxsize=api_pool_maxsize, timeout=api_timeout)
 
     # Setup HSN NIC used for nid alias
     #
@@ -184,25 +1113,103 @@ def main():
     master_dns_records = []
 
     #
-    # Query Kea for active server lease information
+    # Query Kea, SMD and SLS concurrently
     #
-    log.info(f'Querying Kea in the cluster to find any updated records we need to set')
+    log.info(f'Querying Kea, SMD and SLS in the cluster to find any updated records we need to set')
     ts = time.perf_counter()
-    kea_headers = {"Content-Type": "application/json"}
-    kea_request = {"command": "config-get", "service": ["dhcp4"]}
+    streaming = os.environ.get('MANAGER_STREAMING_JSON', 'false').lower() == 'true'
+    cache = snapshot_cache.SnapshotCache.from_environment()
+    sources, source_digests = fetch_sources(kea_api, smd_api, sls_api, streaming=streaming, cache=cache)
+    te = time.perf_counter()
+    log.info(f'Retrieved Kea, SMD and SLS data {te - ts:.3f}s')
+    observe_phase('fetch', te - ts)
 
-    resp = kea_api('POST', '/', headers=kea_headers, json=kea_request)
-    kea_response_json = resp.json()
+    #
+    # Load current running DNS entries
+    #
+    ts = time.perf_counter()
+    kube = None
+    if os.environ.get('MANAGER_CONFIGMAP_CLIENT', 'kubectl') == 'api':
+        kube = kubeapi.KubernetesAPI()
+    try:
+        # Main data structure used below
+        configmap = read_configmap(kube)
+
+        # Check for base64 encoded and gzip'd records
+        try:
+            configmap['binaryData']['records.json.gz']  # String
+        except KeyError as key:
+            # If the binaryData."records.json.gz" key is missing from the ConfigMap then set it to the
+            # base64 encoded, gzipped representation of [] to ensure there is a blank set of records to
+            # use for comparison forcing manager.py to add all the records it generated to the configmap.
+            log.error(f'Key {key} missing from ConfigMap. Setting to [] to force rebuild of records.')
+            configmap['binaryData'] = {"records.json.gz": "H4sICLQ/Z2AAA3JlY29yZHMuanNvbgCLjuUCAETSaHADAAAA"}
+            configmap['metadata'].get('annotations', {}).pop(records_codec.DIGEST_ANNOTATION, None)
+    except Exception as err:
+        raise SystemExit(err)
+
+    # The digest annotations cover the manifest of sharded records but not
+    # the shard ConfigMaps, so they only hold while every shard matches its
+    # manifest digest.
+    shard_values = read_record_shards(configmap, kube)
+    if shard_values is not None and not shards_match_manifest(get_records_manifest(configmap), shard_values):
+        log.warning(f'Record shards differ from the manifest, ignoring the stored digests')
+        annotations = configmap['metadata'].get('annotations') or {}
+        for key in CARRIED_ANNOTATIONS:
+            annotations.pop(key, None)
+    te = time.perf_counter()
+    log.info(f'Loaded current DNS configmap {te - ts:.3f}s')
+    observe_phase('configmap_read', te - ts)
+
+    # The digest covers the encoding too, so changing the format version
+    # rewrites the stored records.
+    records_version = int(os.environ.get('MANAGER_RECORDS_FORMAT_VERSION', '1'))
+    if records_version not in records_codec.FORMAT_VERSIONS:
+        log.error(f'Unknown records format version {records_version}, using 1')
+        records_version = 1
+
+    # Number of ConfigMaps the records are sharded across, 0 keeps them all
+    # in the unbound configmap.  Must match the chart's recordsShards.
+    try:
+        records_shards = max(0, int(os.environ.get('MANAGER_RECORDS_SHARDS', '0')))
+    except ValueError:
+        log.error(f'MANAGER_RECORDS_SHARDS is not a number, not sharding records')
+        records_shards = 0
+
+    # Name of the canary record stamped on every records generation to trace
+    # its propagation to the unbound replicas, empty for none
+    canary = os.environ.get('MANAGER_PROPAGATION_CANARY', '').strip().rstrip('.')
+
+    #
+    # Records are a pure function of the upstream responses, the settings
+    # above and this code.  When they all match what the stored records
+    # were generated from there is nothing to recompute or compare.
+    #
+    skip_unchanged = os.environ.get('MANAGER_SKIP_UNCHANGED_SOURCES', 'false').lower() == 'true'
+    code_digest = get_code_digest()
+    inputs_digest = get_inputs_digest(code_digest, source_digests, nic_index, records_version,
+                                      records_shards, canary)
+    sources_digest = get_sources_digest(inputs_digest, get_records_value(configmap))
+    sources_unchanged = get_stored_sources_digest(configmap) == sources_digest
+    registry.set('sources_unchanged', int(sources_unchanged),
+                 'Whether the upstream data matches what the stored records were generated from')
+    if skip_unchanged and sources_unchanged:
+        log.info(f'    Kea, SMD and SLS data unchanged since the records were generated.  Skipping DNS update')
+        registry.set('differences', 0, 'Whether generated records differ from the configmap')
+        log_peak_rss()
+        return
+
+    #
+    # Kea active server lease information
+    #
+    kea_response_json = sources['kea']
     if len(kea_response_json) == 0:
         log.warning(f'Did not get any data from Kea API call')
         api_errors = True
 
     # Retrieve cleansed records that are pointing to the correct location
-    kea_records = get_kea_records(kea_response_json)
-
     # Kea leases or generally canonical as to what should exist in DNS
-    te = time.perf_counter()
-    log.info(f'Retrieved Kea data {int(te - ts)}s')
+    kea_records = get_kea_records(kea_response_json)
 
     # Global lease check - non-fatal in v1.4
     kea_global_leases = []
@@ -225,45 +1232,23 @@ def main():
         kea_subnets = kea_records['subnet4']
         log.info(f'Found {len(kea_subnets)} subnets in Kea')
 
-    for subnet in kea_subnets:
-        if 'reservations' not in subnet:
-            continue
-        for lease in subnet['reservations']:
-            record = {'hostname': lease['hostname'],
-                      'ip-address': lease['ip-address']}
-            kea_local_leases.append(record)
+    kea_local_leases.extend(get_kea_subnet_leases(kea_subnets))
 
     te = time.perf_counter()
-    log.info(f'Found {len(kea_local_leases)} leases and reservations in Kea local subnets {int(te - ts)}s')
+    log.info(f'Found {len(kea_local_leases)} leases and reservations in Kea local subnets {te - ts:.3f}s')
+    observe_phase('kea_subnets', te - ts)
 
     # Merge global and local Kea leases/reservations - with cleanup.
     #
     ts = time.perf_counter()
-    for lease in kea_local_leases + kea_global_leases:
-        # Some nodes might be in discovery
-        if 'hostname' not in lease or 'ip-address' not in lease:
-            continue
-
-        # Having empty values is an error
-        if not lease['hostname'].strip() or not lease['ip-address'].strip():
-            log.error('Kea returned lease with incomplete data, continuing {lease}')
-            continue
-
-        # CASMNET-124: change nid to nid-nmn for v1.3 because nid is HSN
-        #   TODO - move this to Central DNS after data naming cleanup
-        record = None
-        if lease['hostname'].find('nid') > -1:
-            record = {'hostname': lease['hostname'] + '-nmn',
-                      'ip-address': lease['ip-address']}
-        else:
-            record = {'hostname': lease['hostname'],
-                      'ip-address': lease['ip-address']}
-
-        if record not in master_dns_records:
-            master_dns_records.append(record)
+    kea_key = cache.key(code_digest, source_digests['kea'])
+    master_dns_records.extend(memoize_stage(cache, 'kea_merge', kea_key,
+                                            lambda: merge_kea_leases(kea_local_leases + kea_global_leases)))
 
     te = time.perf_counter()
-    log.info(f'Gathered {len(master_dns_records)} total leases and reservations local and global {int(te - ts)}s')
+    log.info(f'Gathered {len(master_dns_records)} total leases and reservations local and global {te - ts:.3f}s')
+    observe_phase('kea_merge', te - ts)
+    observe_records('kea', len(master_dns_records))
 
 
     #
@@ -281,54 +1266,31 @@ def main():
     #     "Type": "Node"
     #   }
     # ]
-    ts = time.perf_counter()
-    resp = smd_api('GET', '/hsm/v2/Inventory/EthernetInterfaces')
-    smd_records = resp.json()
-
-    resp = smd_api('GET', '/hsm/v2/State/Components/')
-    smd_state_components = resp.json()
+    smd_records = sources['smd_ethernet_interfaces']
+    smd_state_components = sources['smd_state_components']
 
     if len(smd_records) == 0:
         log.warning(f'Did not get any data from SMD EthernetInterfaces API call')
         api_errors = True
 
-    te = time.perf_counter()
-    log.info(f'Queried SMD to find any xname records we need to set {int(te - ts)}s')
     log.info(f'Found {len(smd_records)} records in SMD')
 
     #
     # Find CNAME records in SMD
     #
     ts = time.perf_counter()
-    new_records = []
-    for dns in master_dns_records:
-        # Not all records in SMD are desired, only those with matching
-        # IP addresses and different hostnames - resulting in CNAMES.
-        for smd in smd_records:
-            # Skip records with blank data
-            if smd['IPAddresses'] == [] or not smd['ComponentID'].strip() or \
-                    smd['IPAddresses'][0]['IPAddress'] == '':
-                continue
-
-            # Skip records with same hostname (expected SMD/Kea duplicates)
-            if smd['ComponentID'] == dns['hostname']:
-                break
-
-            if smd['IPAddresses'][0]['IPAddress'] == dns['ip-address']:
-                new_record = {'hostname': smd['ComponentID'], 'ip-address': smd[
-                    'IPAddresses'][0]['IPAddress']}
-                old_record = {'hostname': dns['hostname'], 'ip-address': dns['ip-address']}
-                # print('    New CNAME {}'.format(new_record))
-                # print('     A record {}'.format(old_record))
-                new_records.append(new_record)
-                break
+    smd_key = cache.key(kea_key, source_digests['smd_ethernet_interfaces'])
+    new_records = memoize_stage(cache, 'smd_cnames', smd_key,
+                                lambda: find_smd_cnames(master_dns_records, smd_records))
 
     #
     # Merge SMD xnames/CNAMES with DNS nid-names.  Kea is generally is SoR
     #
     master_dns_records.extend(new_records)
     te = time.perf_counter()
-    log.info(f'Merged new SMD xnames into DNS data structure {int(te - ts)}s')
+    log.info(f'Merged new SMD xnames into DNS data structure {te - ts:.3f}s')
+    observe_phase('smd_cnames', te - ts)
+    observe_records('smd', len(new_records))
 
     #
     # CASMNET-130 and CASMNET-137: UANs and Management NCNs need to have
@@ -352,8 +1314,7 @@ def main():
     #   }
     # }
     ts = time.perf_counter()
-    resp = sls_api('GET','/v1/hardware')
-    sls_records = resp.json()
+    sls_records = sources['sls_hardware']
 
     if len(sls_records) == 0:
         log.warning(f'Did not get any data from SLS hardware API call')
@@ -365,84 +1326,16 @@ def main():
     # NOTE:  This is the one place where we are NOT using Kea as SoR because
     #        NCNs currently are NOT dynamic/DHCP.
     #
-    nid_records = []
-    new_records = []
-    # Not all records in SLS are desired, only those with xnames
-    # where the SubRole is UAN.
-    for sls in sls_records:
-        # Skip records without minimal required data
-        if 'ExtraProperties' not in sls or \
-                'Role' not in sls['ExtraProperties'] or \
-                'Aliases' not in sls['ExtraProperties']:
-            continue
-
-        # check for UAN artficial NID number
-        # smd_state_components data is tied to discovery data
-        # the data will be dynamic and reason for extra logic for error handling
-        if sls['ExtraProperties']['Role'] == 'Application':
-            xname = sls['Xname']
-            nidname = ''
-            for record in smd_state_components['Components']:
-                if record['ID'] == xname:
-                    if 'NID' in record:
-                        nidname = 'nid' + str(record['NID'])
-            if nidname != '':
-                nid_records.append({'nidname': nidname, 'xname': xname})
-
-        # get NCN nid number
-        if sls['ExtraProperties']['Role'] == 'Management':
-            nidname = 'nid' + str(sls['ExtraProperties']['NID'])
-            xname = sls['Xname']
-            nid_records.append({'nidname': nidname, 'xname': xname})
-
-        # Assemble nid name / xname correlation for HSN records later
-        # TODO: move this correlation around in Central DNS
-        for dns in master_dns_records:
-            if dns['hostname'].find('nid') > -1:
-                if dns['hostname'].replace('-nmn', '') not in sls['ExtraProperties']['Aliases']:
-                    continue
-                nidname = dns['hostname'].replace('-nmn', '')
-                xname = sls['Xname']
-                nid_records.append({'nidname': nidname, 'xname': xname})
-
-        if sls['ExtraProperties']['Role'] == 'Management' or \
-                sls['ExtraProperties']['Role'] == 'Application':
-
-            hmn_xname = sls['Parent']
-            nmn_xname = sls['Xname']
-
-            for smd in smd_records:
-                # Skip records with blank entries
-                if not smd['ComponentID'].strip() or smd['IPAddresses'] == [] or \
-                        smd['IPAddresses'][0]['IPAddress'] == '':
-                    continue
-
-                # Get the HMN IP address
-                if smd['ComponentID'] == hmn_xname:
-                    for alias in sls['ExtraProperties']['Aliases']:
-                        mgmt_alias = alias + '-mgmt'
-                        new_record = {'hostname': mgmt_alias, 'ip-address': smd[
-                            'IPAddresses'][0]['IPAddress']}
-                        old_record = {'hostname': hmn_xname, 'ip-address': smd[
-                            'IPAddresses'][0]['IPAddress']}
-                        new_records.append(new_record)
-
-                # Get the NMN IP address
-                if smd['ComponentID'] == nmn_xname:
-                    # create records for all aliases for node in NMN
-                    for alias in sls['ExtraProperties']['Aliases']:
-                        # get alias and create record
-                        record = {'hostname': alias, 'ip-address': smd[
-                            'IPAddresses'][0]['IPAddress']}
-                        new_records.append(record)
-                        # add -nmn to alias and create record
-                        nmn_alias = alias + '-nmn'
-                        nmn_alias_record = {'hostname': nmn_alias, 'ip-address': smd[
-                            'IPAddresses'][0]['IPAddress']}
-                        new_records.append(nmn_alias_record)
+    sls_key = cache.key(smd_key, source_digests['smd_state_components'], source_digests['sls_hardware'])
+    nid_records, new_records = memoize_stage(
+        cache, 'sls_hardware', sls_key,
+        lambda: list(correlate_sls_hardware(sls_records, smd_records, smd_state_components,
+                                            master_dns_records)))
 
     te = time.perf_counter()
-    log.info(f'Queried SLS to find Management, Application and HSN nid records {int(te - ts)}')
+    log.info(f'Correlated SLS Management, Application and HSN nid records {te - ts:.3f}s')
+    observe_phase('sls_hardware', te - ts)
+    observe_records('sls_hardware', len(new_records))
     log.info(f'Found {len(sls_records)} SLS Hardware records.')
     #
     # Merge SLS CNAMES with DNS records.
@@ -454,16 +1347,12 @@ def main():
     #
     # v1.4+:  Retrieve network structures
     #
-    ts = time.perf_counter()
-    resp = sls_api('GET', '/v1/networks')
-    sls_networks = resp.json()
+    sls_networks = sources['sls_networks']
 
     if len(sls_networks) == 0:
         log.warning(f'Did not get any data from SLS network API call')
         api_errors = True
 
-    te = time.perf_counter()
-    log.info(f'Queried SLS to find Network records {int(te - ts)}')
     log.info(f'Found {len(sls_networks)} SLS Network records.')
 
     #
@@ -472,180 +1361,116 @@ def main():
     #        proper CNAMES
     #
     ts = time.perf_counter()
-    hsn_matches = 0
-    static_records = []
-    for network in sls_networks:
-        if not 'ExtraProperties' in network:
-            continue
-
-        if not 'Subnets' in network['ExtraProperties'] or \
-                not network['ExtraProperties']['Subnets']:
-            continue
-
-        subnets = network['ExtraProperties']['Subnets']
-        for subnet in subnets:
-            if not 'IPReservations' in subnet:
-                continue
-
-            subdomain = re.sub(r'^(NMN|HMN|HSN|MTL|CAN|CHN|CMN)_.*$', r'\1', network['Name']).lower()
-            reservations = subnet['IPReservations']
-            for reservation in reservations:
-                if 'Name' in reservation and reservation['Name'].strip():
-                    # TODO: split this out as A Record in central DNS.
-                    # NOTE: APPEND SUBDOMAIN to A Record to enforce part of DNS hierarchy.
-                    record = {'hostname': '{}.{}'.format(reservation['Name'], subdomain),
-                              'ip-address': reservation['IPAddress']}
-                    static_records.append(record)
-
-                    # CASMNET-379 - default no subdomain requests to NMN.  This needs to
-                    # be removed when the full domain hierarchy is put into place.
-                    if subdomain == 'nmn':
-                        record = {'hostname': '{}'.format(reservation['Name']),
-                                  'ip-address': reservation['IPAddress']}
-                        static_records.append(record)
-                if 'Aliases' in reservation:
-                    for alias in reservation['Aliases']:
-                        # TODO: split this out as a CNAME in central DNS.
-                        if not alias:
-                            continue
-                        record = {'hostname': alias, 'ip-address': reservation['IPAddress']}
-                        static_records.append(record)
-
-                # CASMINST-1114 PART 2: nid aliases for HSN xname records.
-                # TODO: This needs to be done differently in central DNS.
-                # Three records per: nid002023 x1003c7s7b1n1h0 nid002023-hsn0
-                # Operate only on xnames
-                if reservation['Name'][0] == 'x':
-                    reservation_xname = re.sub(r'h\d+$', '', reservation['Name'])  # remove port
-                    reservation_xname = re.sub(r'([a-z])0+([0-9]+[a-z])', r'\1\2', reservation_xname)  # zero padding
-                    for nid in nid_records:
-                        if nid['xname'] == reservation_xname:
-                            hsn_matches += 1
-
-                            if subdomain != 'chn':
-
-                                ipv4 = reservation['IPAddress']
-
-                                if nic_index in reservation['Name'] or nic_index == 'all':
-                                    record = {'hostname': nid['nidname'], 'ip-address': ipv4}
-                                    static_records.append(record)
-
-                                port = re.sub(r'^(.*)h(\d+)$', r'\2', reservation['Name'])
-                                record = {'hostname': nid['nidname'] + '-hsn' + port, 'ip-address': ipv4}
-                                static_records.append(record)
-
-                                record = {'hostname': reservation['Name'], 'ip-address': ipv4}
-                                static_records.append(record)
+    # Large systems can expand reservations across several processes
+    expansion_workers = int(os.environ.get('MANAGER_EXPANSION_WORKERS', '1'))
+    expansion_threshold = int(os.environ.get('MANAGER_EXPANSION_THRESHOLD', '50000'))
+    net_key = cache.key(sls_key, source_digests['sls_networks'], nic_index)
+    static_records, hsn_matches = memoize_stage(
+        cache, 'sls_networks', net_key,
+        lambda: list(expand_network_reservations(sls_networks, nid_records, nic_index,
+                                                 expansion_workers, expansion_threshold)))
 
     te = time.perf_counter()
     master_dns_records.extend(static_records)
-    log.info(f'Merged new static and alias SLS entries into DNS data structure {int(te - ts)}')
+    log.info(f'Merged new static and alias SLS entries into DNS data structure {te - ts:.3f}s')
+    observe_phase('sls_networks', te - ts)
+    observe_records('sls_networks', len(static_records))
 
     log.info(f'Found {len(nid_records)} compute node nid definitions in SLS hardware.')
     log.info(f'Matched {hsn_matches} compute node nid definitions in SLS network reservations.')
 
-    #
-    # Load current running DNS entries
-    #
-    ts = time.perf_counter()
-    log.info(f'Running kubectl to retrieve existing records and configuration.')
-    output = shared.run_command(['kubectl', 'get', 'configmap',
-                                 os.environ['KUBERNETES_UNBOUND_CONFIGMAP_NAME'],
-                                 '-n', os.environ['KUBERNETES_NAMESPACE'],
-                                 '-o', 'yaml'])
-    try:
-        # Main data structure used below
-        configmap = yaml.load(output, Loader=yaml.FullLoader)
-        configmap['metadata'].pop('annotations', None)
-
-        # Read in base64 encoded and gzip'd records
-        try:
-            configmap_records = configmap['binaryData']['records.json.gz']  # String
-        except KeyError as key:
-            # If the binaryData."records.json.gz" key is missing from the ConfigMap then set it to the
-            # base64 encoded, gzipped representation of [] to ensure there is a blank set of records to
-            # use for comparison forcing manager.py to add all the records it generated to the configmap.
-            log.error(f'Key {key} missing from ConfigMap. Setting to [] to force rebuild of records.')
-            configmap['binaryData'] = {"records.json.gz": "H4sICLQ/Z2AAA3JlY29yZHMuanNvbgCLjuUCAETSaHADAAAA"}
-            configmap_records = configmap['binaryData']['records.json.gz']  # String
-
-        configmap_records = codecs.encode(configmap_records, encoding='utf-8')  # Bytes object
-        configmap_records = codecs.decode(configmap_records, encoding='base64')
-        configmap_records = gzip.decompress(configmap_records)
-        existing_records = json.loads(configmap_records)
-    except Exception as err:
-        raise SystemExit(err)
-    # DEBUG
-    # f = gzip.open('/etc/unbound/records.json.gz')
-    # existing_records = json.load(f)
-    te = time.perf_counter()
-    log.info(f'Loaded current DNS entries from configmap {int(te - ts)}')
-
     #
     # Any diff between master records and configmap will trigger a reload.
     #
-    log.info(f'Number of existing records {len(existing_records)}')
+    # Records are put in canonical order and compared by SHA-256 digest with
+    # the digest annotation of the stored records, which also covers the
+    # stored value so records reset or edited since never match it.  The
+    # stored records only need decoding when the annotation does not match.
+    #
     log.info(f'Number of new records (including duplicates) {len(master_dns_records)}')
     ts = time.perf_counter()
 
-    diffs = False
-    if len(existing_records) != len(master_dns_records):
-        diffs = True
+    records_codec.sort_records(master_dns_records)
+    records_digest = records_codec.digest(master_dns_records, records_version)
+    if records_shards:
+        # Changing the number of shards rewrites the records like a format change
+        records_digest = snapshot_cache.SnapshotCache.key(records_digest, f'shards={records_shards}')
+    if canary:
+        records_digest = snapshot_cache.SnapshotCache.key(records_digest, f'canary={canary}')
+    stored_digest = get_records_digest(configmap)
+    records_annotation = get_records_annotation(records_digest, get_records_value(configmap))
+    existing_records = None
+    if stored_digest == records_annotation:
+        log.info(f'New records digest {records_digest} matches the stored records')
+        diffs = False
     else:
-        master_dns_records.sort(key=lambda r: r['hostname'])
-        if master_dns_records != existing_records:
-            diffs = True
+        if stored_digest is None:
+            log.info(f'No stored records digest, comparing new and existing records')
+        else:
+            log.info(f'Stored records digest does not match, comparing new and existing records')
+        existing_records = records_codec.sort_records(
+            without_canary(get_existing_records(configmap, kube, shard_values)))
+        diffs = master_dns_records != existing_records or \
+            (get_records_manifest(configmap) is not None) != bool(records_shards) or \
+            (get_stored_canary(configmap) is not None) != bool(canary)
+    if existing_records is not None:
+        log.info(f'Number of existing records {len(existing_records)}')
+        observe_records('existing', len(existing_records))
 
     te = time.perf_counter()
-    log.info(f'Comparing new and existing DNS records {int(te - ts)}')
+    log.info(f'Comparing new and existing DNS records {te - ts:.3f}s')
+    observe_phase('compare', te - ts)
+    observe_records('master', len(master_dns_records))
 
-    if not api_errors and diffs:
+    registry.set('api_errors', int(api_errors), 'Whether any upstream API returned no data')
+    registry.set('differences', int(diffs), 'Whether generated records differ from the configmap')
+
+    # Only records written by this run are known to match the sources
+    written_inputs_digest = inputs_digest if skip_unchanged else None
+    if not diffs:
+        log.info(f'    No differences found.  Skipping DNS update')
+        annotations = {}
+        if stored_digest != records_annotation:
+            log.info(f'    Recording the records digest on the configmap')
+            annotations[records_codec.DIGEST_ANNOTATION] = records_annotation
+        if skip_unchanged and not api_errors:
+            log.info(f'    Recording the Kea, SMD and SLS data digest on the configmap')
+            annotations[SOURCES_ANNOTATION] = sources_digest
+        if annotations:
+            annotate_configmap(configmap, annotations, kube)
+    elif not api_errors:
         ts = time.perf_counter()
         log.info(f'    Differences found.  Writing new DNS records to our configmap.')
-        records_string = json.dumps(master_dns_records).replace('"', '\"')  # String
-        records_string = codecs.encode(records_string, encoding='utf-8')  # Bytes object
-        records_string = gzip.compress(records_string)
-        records_string = codecs.encode(records_string, encoding='base64')
-        configmap['binaryData']['records.json.gz'] = records_string
-        with NamedTemporaryFile(mode='w', encoding='utf-8', suffix=".yaml") as tmp:
-            yaml.dump(configmap, tmp, default_flow_style=False)
-            try:
-                log.info(f'  Applying the configmap')
-                shared.run_command(['kubectl', 'replace', '--force', '-f', tmp.name])
-            except SystemExit:
-                log.error(f'  Failed to apply the configmap, retrying.')
-                shared.run_command(['kubectl', 'replace', '--force', '-f', tmp.name])
+        write_records(configmap, master_dns_records, records_digest, existing_records, kube,
+                      records_version, written_inputs_digest, records_shards, canary, shard_values)
 
         te = time.perf_counter()
-        log.info(f'Merged records and reloaded configmap {int(te - ts)}')
+        log.info(f'Merged records and reloaded configmap {te - ts:.3f}s')
+        observe_phase('configmap_write', te - ts)
 
-    elif api_errors and len(master_dns_records) > len(existing_records):
+    elif len(master_dns_records) > len(existing_records):
         ts = time.perf_counter()
         log.info(f'    Differences found.  Writing new DNS records to our configmap.')
         log.info(f'    API errors occured but generated more records than previous created.')
-        records_string = json.dumps(master_dns_records).replace('"', '\"')  # String
-        records_string = codecs.encode(records_string, encoding='utf-8')  # Bytes object
-        records_string = gzip.compress(records_string)
-        records_string = codecs.encode(records_string, encoding='base64')
-        configmap['binaryData']['records.json.gz'] = records_string
-        with NamedTemporaryFile(mode='w', encoding='utf-8', suffix=".yaml") as tmp:
-            yaml.dump(configmap, tmp, default_flow_style=False)
-            try:
-                log.info(f'  Applying the configmap')
-                shared.run_command(['kubectl', 'replace', '--force', '-f', tmp.name])
-            except SystemExit:
-                log.error(f'  Failed to apply the configmap, retrying.')
-                shared.run_command(['kubectl', 'replace', '--force', '-f', tmp.name])
+        write_records(configmap, master_dns_records, records_digest, existing_records, kube,
+                      records_version, written_inputs_digest, records_shards, canary, shard_values)
 
         te = time.perf_counter()
-        log.info(f'Merged records and reloaded configmap {int(te - ts)}s)')
-    elif api_errors and len(master_dns_records) < len(existing_records):
+        log.info(f'Merged records and reloaded configmap {te - ts:.3f}s')
+        observe_phase('configmap_write', te - ts)
+    elif len(master_dns_records) < len(existing_records):
         ts = time.perf_counter()
         log.info(f'    Differences found.  NOT writing DNS records to configmap.')
         log.info(f'    API errors and generated record was less than previous list')
         te = time.perf_counter()
-        log.info(f'NO CHANGES to unbound configmap {int(te - ts)}')
+        log.info(f'NO CHANGES to unbound configmap {te - ts:.3f}s')
     else:
         log.info(f'    No differences found.  Skipping DNS update')
+
+    log_peak_rss()
+
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        registry.write()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+import os
+import socket
+import time
+from contextlib import contextmanager
+
+#
+# Minimal Prometheus instrumentation shared by manager.py and initialize.py.
+#
+# Samples are kept as gauges and rendered in the Prometheus text exposition
+# format, either to a textfile (node_exporter textfile collector layout) or
+# pushed to a pushgateway.  A registry with neither output configured is
+# disabled and every call on it returns immediately.
+#
+class Registry(object):
+    """
+
+    Example use:
+        registry = Registry('cray_dns_unbound_manager', textfile='/tmp/manager.prom')
+        registry.set('records', 1024, 'Number of records', source='kea')
+        with registry.timer('phase_duration_seconds', 'Phase duration', phase='merge'):
+            merge()
+        registry.write()
+    """
+
+    def __init__(self, namespace, textfile=None, pushgateway=None, job=None, instance=None):
+        self._namespace = namespace
+        self._textfile = textfile
+        self._pushgateway = pushgateway
+        self._job = job or namespace
+        self._instance = instance or socket.gethostname()
+        self._help = {}
+        self._samples = {}
+        self.enabled = bool(textfile or pushgateway)
+
+    #
+    # Jobs and single-replica deployments run in a new pod each time, so they
+    # pass a stable instance, overridden by METRICS_INSTANCE, to push to the
+    # same pushgateway group on every run.  Pods of the unbound deployment
+    # keep their hostname so each replica has its own group.
+    #
+    @classmethod
+    def from_environment(cls, namespace, job=None, instance=None):
+        return cls(namespace,
+                   textfile=os.environ.get('METRICS_TEXTFILE') or None,
+                   pushgateway=os.environ.get('METRICS_PUSHGATEWAY_URL') or None,
+                   job=job,
+                   instance=os.environ.get('METRICS_INSTANCE') or instance)
+
+    def set(self, name, value, help_text='', **labels):
+        if not self.enabled:
+            return
+        name = f'{self._namespace}_{name}'
+        self._help.setdefault(name, help_text)
+        self._samples[(name, tuple(sorted(labels.items())))] = float(value)
+
+    def inc(self, name, value=1, help_text='', **labels):
+        if not self.enabled:
+            return
+        key = (f'{self._namespace}_{name}', tuple(sorted(labels.items())))
+        self.set(name, self._samples.get(key, 0.0) + value, help_text, **labels)
+
+    @contextmanager
+    def timer(self, name, help_text='', **labels):
+        if not self.enabled:
+            yield
+            return
+        ts = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.set(name, time.perf_counter() - ts, help_text, **labels)
+
+    def render(self):
+        lines = []
+        for metric in sorted(self._help):
+            lines.append(f'# HELP {metric} {self._help[metric]}')
+            lines.append(f'# TYPE {metric} gauge')
+            for (name, labels), value in sorted(self._samples.items()):
+                if name != metric:
+                    continue
+                if labels:
+                    label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f'{name}{{{label_text}}} {value!r}')
+                else:
+                    lines.append(f'{name} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        if not self.enabled or not self._samples:
+            return
+
+        body = self.render()
+
+        # Write to a temporary file and rename so collectors never read a
+        # partially written file.
+        if self._textfile:
+            tmp_file = self._textfile + '.tmp'
+            with open(tmp_file, 'w') as f:
+                f.write(body)
+            os.replace(tmp_file, self._textfile)
+
+        # Metrics are best effort, never fail the caller because the
+        # pushgateway is unavailable.
+        if self._pushgateway:
+            import requests
+            url = f'{self._pushgateway.rstrip("/")}/metrics/job/{self._job}/instance/{self._instance}'
+            try:
+                requests.put(url, data=body.encode('utf-8'), timeout=(5, 10),
+                             headers={'Content-Type': 'text/plain; version=0.0.4'})
+            except requests.exceptions.RequestException as err:
+                print(f'Unable to push metrics to {url}: {err}')
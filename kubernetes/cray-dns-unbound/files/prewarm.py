@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+import collections
+import json
+import os
+import random
+import re
+import select
+import socket
+import struct
+import time
+
+import dnswire
+
+#
+# Hot-name cache prewarming for full unbound reloads.
+#
+# A full reload empties unbound's caches, so the first client queries for
+# the external and forwarded names clients use most all go upstream.  Before
+# a reload the names in unbound's message cache, and in its query log when
+# one is kept, are sampled into a bounded list of the hottest names on disk.
+# Right after the reload those names are resolved against the local unbound
+# so they are cached again before clients ask for them.
+#
+# dump_cache carries no hit counts, so a name's score is the number of
+# samples it appeared in, halved (decay) at every later sample, plus one per
+# query in the log.  Names that stay cached reload after reload, or are
+# queried often, rank highest.
+#
+
+QUERY_LOG_LINE = re.compile(r' info: \S+ (\S+) (\S+) IN$')
+
+HotName = collections.namedtuple('HotName', ['name', 'type', 'score'])
+
+#
+# Count the (qname, qtype) of every message in a dump_cache dump, leaving
+# out names the local data answers.
+#
+def sample_cache_dump(dump, local_names):
+    counts = collections.Counter()
+    for line in dump.split('\n'):
+        if not line.startswith('msg '):
+            continue
+        fields = line.split()
+        name = fields[1].lower()
+        if fields[2] == 'IN' and fields[3] in dnswire.TYPES and name not in local_names:
+            counts[(name, fields[3])] += 1
+    return counts
+
+#
+# Count the queries in the last max_bytes of an unbound log written with
+# log-queries: yes.
+#
+def sample_query_log(path, max_bytes, local_names):
+    counts = collections.Counter()
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(f.tell() - max_bytes, 0))
+        tail = f.read().decode('utf-8', errors='replace')
+    for line in tail.split('\n'):
+        match = QUERY_LOG_LINE.search(line)
+        if match is None:
+            continue
+        name = match.group(1).lower()
+        if match.group(2) in dnswire.TYPES and name not in local_names:
+            counts[(name, match.group(2))] += 1
+    return counts
+
+def read_hot_names(path):
+    try:
+        with open(path) as f:
+            return [HotName(*entry) for entry in json.load(f)]
+    except (OSError, ValueError, TypeError):
+        return []
+
+#
+# Fold a sample into the hot-name list at path, keeping the max_names
+# highest scores.  Returns the updated list, hottest first.
+#
+def update_hot_names(path, sample, max_names, decay=0.5):
+    scores = collections.Counter()
+    for hot in read_hot_names(path):
+        scores[(hot.name, hot.type)] = hot.score * decay
+    scores.update(sample)
+    hot_names = [HotName(name, qtype, round(score, 6))
+                 for (name, qtype), score in scores.most_common(max_names) if score >= 0.01]
+
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump([list(hot) for hot in hot_names], f)
+    os.replace(tmp, path)
+    return hot_names
+
+#
+# Resolve the hot names against unbound with up to concurrency queries in
+# flight on one UDP socket, within budget seconds.  Returns the rcode
+# answered for each (name, type), None for queries that went unanswered
+# within query_timeout; names not reached before the budget ran out are left
+# out.
+#
+def resolve(hot_names, address, port, concurrency, budget, query_timeout):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect((address, port))
+    sock.setblocking(False)
+    pending = {}
+    rcodes = {}
+    i = 0
+    deadline = time.monotonic() + budget
+    try:
+        while i < len(hot_names) or pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            while i < len(hot_names) and len(pending) < concurrency:
+                query_id = random.getrandbits(16)
+                while query_id in pending:
+                    query_id = random.getrandbits(16)
+                hot = hot_names[i]
+                i += 1
+                try:
+                    sock.send(dnswire.build_query(query_id, hot.name, dnswire.TYPES[hot.type]))
+                except OSError:
+                    rcodes[(hot.name, hot.type)] = None
+                    continue
+                pending[query_id] = ((hot.name, hot.type), now)
+            for query_id, (key, sent) in list(pending.items()):
+                if now - sent > query_timeout:
+                    rcodes[key] = None
+                    del pending[query_id]
+
+            if not pending or not select.select([sock], [], [], min(0.05, deadline - now))[0]:
+                continue
+            while True:
+                try:
+                    message = sock.recv(4096)
+                except BlockingIOError:
+                    break
+                except OSError:
+                    # ECONNREFUSED while unbound is not answering yet
+                    continue
+                try:
+                    query_id, rcode = dnswire.parse_header(message)
+                except struct.error:
+                    continue
+                query = pending.pop(query_id, None)
+                if query is not None:
+                    rcodes[query[0]] = rcode
+    finally:
+        sock.close()
+    return rcodes
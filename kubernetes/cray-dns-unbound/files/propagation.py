@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+#
+# Trace how long each records generation takes to reach every unbound
+# replica.
+#
+# With MANAGER_PROPAGATION_CANARY set, manager.py writes every records
+# generation with a canary record whose address encodes the generation and
+# stores the write time in records-propagation.json in the unbound
+# configmap.  For each new generation this verifier queries the canary on
+# every running unbound pod concurrently until the pod answers with that
+# generation, or a newer one, and reports each pod's convergence latency
+# from the manager's write as metrics.
+#
+# That covers the whole path: manager write, kubelet configmap volume sync,
+# initialize.py noticing the new data and unbound reloading.  initialize.py
+# records its own side as records_propagation_seconds.
+#
+# Runs as a watcher by default; --once traces the current generation and
+# exits non-zero unless every replica converged.
+#
+
+import asyncio
+import json
+import logging
+import os
+import struct
+import sys
+import time
+
+import dnswire
+import kubeapi
+import metrics
+import records_codec
+
+log = logging.getLogger(__name__)
+log.setLevel(level=os.environ.get('LOG_LEVEL', 'INFO'))
+
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.DEBUG)
+handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log.addHandler(handler)
+
+GENERATIONS = 1 << 22
+
+def read_propagation(kube, namespace, name):
+    configmap = kube.get_configmap(namespace, name)
+    value = (configmap.get('data') or {}).get(records_codec.PROPAGATION_KEY)
+    if not value:
+        return None
+    return json.loads(value)
+
+def list_replicas(kube, namespace, selector):
+    return {pod['metadata']['name']: pod['status']['podIP']
+            for pod in kube.list_pods(namespace, selector)
+            if pod.get('status', {}).get('phase') == 'Running' and pod['status'].get('podIP')}
+
+#
+# Whether a canary address belongs to the generation, or a later one.
+# Generations wrap at the size of the canary network.
+#
+def generation_reached(address, generation):
+    loaded = records_codec.canary_generation(address)
+    if loaded is None:
+        return False
+    return (loaded - generation) % GENERATIONS < GENERATIONS // 2
+
+class CanaryQuery(asyncio.DatagramProtocol):
+    def __init__(self, query_id):
+        self.query_id = query_id
+        self.answer = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data, addr):
+        try:
+            response = dnswire.parse_response(data)
+        except (ValueError, IndexError, struct.error):
+            return
+        if response.id == self.query_id and not self.answer.done():
+            self.answer.set_result(response)
+
+    def error_received(self, exc):
+        if not self.answer.done():
+            self.answer.set_exception(exc)
+
+async def query_canary(address, port, name, timeout):
+    loop = asyncio.get_running_loop()
+    query_id = int(time.monotonic() * 1000) & 0xffff
+    transport, protocol = await loop.create_datagram_endpoint(lambda: CanaryQuery(query_id),
+                                                              remote_addr=(address, port))
+    try:
+        transport.sendto(dnswire.build_query(query_id, name))
+        response = await asyncio.wait_for(protocol.answer, timeout)
+    except (asyncio.TimeoutError, OSError):
+        return []
+    finally:
+        transport.close()
+    return [answer.data for answer in response.answers if answer.type == dnswire.TYPE_A]
+
+#
+# Query one replica until it answers with the generation.  Returns the
+# seconds from the manager's write, None if the deadline passed first.
+#
+async def wait_for_replica(pod, address, port, propagation, deadline, interval):
+    while True:
+        addresses = await query_canary(address, port, propagation['canary'], min(interval, 1.0))
+        if any(generation_reached(answer, propagation['generation']) for answer in addresses):
+            seconds = time.time() - propagation['written_at']
+            log.info(f'  {pod} answered with generation {propagation["generation"]} after {seconds:.1f}s')
+            return seconds
+        if time.time() >= deadline:
+            log.warning(f'  {pod} did not answer with generation {propagation["generation"]} in time')
+            return None
+        await asyncio.sleep(interval)
+
+async def trace(propagation, replicas, port, timeout, interval):
+    deadline = propagation['written_at'] + timeout
+    pods = sorted(replicas)
+    latencies = await asyncio.gather(*(wait_for_replica(pod, replicas[pod], port, propagation, deadline, interval)
+                                       for pod in pods))
+    return dict(zip(pods, latencies))
+
+def report(propagation, latencies, traced_at):
+    registry = metrics.Registry.from_environment('cray_dns_unbound_propagation', instance='cray-dns-unbound')
+    converged = [seconds for seconds in latencies.values() if seconds is not None]
+    registry.set('generation', propagation['generation'], 'Records generation traced')
+    registry.set('written_timestamp_seconds', propagation['written_at'], 'When the manager wrote the generation')
+    registry.set('trace_start_delay_seconds', traced_at - propagation['written_at'],
+                 'Time from the write to the start of the trace, latencies below it are upper bounds')
+    registry.set('replicas', len(latencies), 'Unbound replicas traced')
+    registry.set('replicas_converged', len(converged), 'Unbound replicas that answered with the generation')
+    for pod, seconds in latencies.items():
+        registry.set('converged', int(seconds is not None), 'Whether the replica answered with the generation',
+                     pod=pod)
+        if seconds is not None:
+            registry.set('seconds', seconds, 'Time from the write until the replica answered with the generation',
+                         pod=pod)
+    if converged:
+        registry.set('max_seconds', max(converged), 'Time until the slowest converged replica answered')
+    registry.write()
+
+    log.info(f'Generation {propagation["generation"]}: {len(converged)} of {len(latencies)} replicas converged'
+             + (f', slowest after {max(converged):.1f}s' if converged else ''))
+    return len(converged) == len(latencies)
+
+def trace_generation(kube, propagation, settings):
+    traced_at = time.time()
+    replicas = list_replicas(kube, settings['namespace'], settings['selector'])
+    log.info(f'Tracing generation {propagation["generation"]} ({propagation["canary"]} '
+             f'{propagation["address"]}) on {len(replicas)} replicas')
+    latencies = asyncio.run(trace(propagation, replicas, settings['port'], settings['timeout'],
+                                  settings['interval']))
+    return report(propagation, latencies, traced_at)
+
+def main():
+    settings = {
+        'namespace': os.environ['KUBERNETES_NAMESPACE'],
+        'configmap': os.environ['KUBERNETES_UNBOUND_CONFIGMAP_NAME'],
+        'selector': os.environ.get('PROPAGATION_POD_SELECTOR', 'app.kubernetes.io/name=cray-dns-unbound'),
+        'port': int(os.environ.get('PROPAGATION_DNS_PORT', '5053')),
+        'timeout': float(os.environ.get('PROPAGATION_TIMEOUT_SECONDS', '600')),
+        'interval': float(os.environ.get('PROPAGATION_QUERY_INTERVAL_SECONDS', '0.5')),
+    }
+    poll = float(os.environ.get('PROPAGATION_POLL_SECONDS', '5'))
+    kube = kubeapi.KubernetesAPI()
+
+    if '--once' in sys.argv[1:]:
+        propagation = read_propagation(kube, settings['namespace'], settings['configmap'])
+        if propagation is None:
+            raise SystemExit(f'No {records_codec.PROPAGATION_KEY} in the configmap, is MANAGER_PROPAGATION_CANARY set?')
+        if not trace_generation(kube, propagation, settings):
+            raise SystemExit(1)
+        return
+
+    # The generation loaded before the watch started has long propagated
+    started = False
+    traced = None
+    while True:
+        try:
+            propagation = read_propagation(kube, settings['namespace'], settings['configmap'])
+            generation = propagation['generation'] if propagation is not None else None
+            if not started:
+                started = True
+                traced = generation
+                log.info(f'Watching for records generations after {traced}')
+            elif generation is not None and generation != traced:
+                traced = generation
+                trace_generation(kube, propagation, settings)
+        except Exception as err:
+            log.error(f'Unable to trace records propagation: {err}')
+        time.sleep(poll)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+import gzip
+import hashlib
+import itertools
+import json
+import zlib
+
+#
+# Encoding of the records.json.gz payload shared by manager.py and
+# initialize.py.
+#
+# Records are kept in a canonical (hostname, ip-address) order and
+# compressed without a timestamp, so identical record sets always produce
+# identical bytes and the same SHA-256 digest.
+#
+# Two encodings are supported and decode() detects which one it is given:
+#
+#   v1  a JSON list of {"hostname": ..., "ip-address": ...} objects
+#   v2  a columnar JSON object
+#         {"version": 2,
+#          "hostnames": [unique hostnames in order of first use],
+#          "addresses": [unique addresses in order of first use],
+#          "records": [hostname step, address reference, ...]}
+#
+# In v2 each record is a pair of integers.  The hostname step is added to
+# the previous record's hostname index (records are sorted by hostname, so
+# it is almost always 0 or 1).  An address reference of 0 takes the next
+# unused address, n refers back to the address n before that.  IPv4
+# addresses are stored as 32-bit integers, each the difference from the
+# previous IPv4 address in the table.  Small, repetitive integers like
+# these compress far better than the equivalent text.
+#
+
+# ConfigMap annotation holding the digest of the stored records
+DIGEST_ANNOTATION = 'dns.cray.io/records-sha256'
+
+# Key of the manifest listing the shards of sharded records
+MANIFEST_KEY = 'records-manifest.json'
+MANIFEST_VERSION = 1
+
+# Key of the write time and canary of the current records generation
+PROPAGATION_KEY = 'records-propagation.json'
+
+# Canary record addresses, one per records generation
+CANARY_NETWORK = 0x7f800000  # 127.128.0.0/10
+
+FORMAT_VERSIONS = (1, 2)
+
+def record_key(record):
+    return (record['hostname'], record['ip-address'])
+
+def sort_records(records):
+    records.sort(key=record_key)
+    return records
+
+#
+# Pack a dotted quad into an integer.  Anything that would not format back
+# to the exact same string is kept as text.
+#
+def pack_address(address):
+    octets = address.split('.')
+    if len(octets) != 4:
+        return address
+    packed = 0
+    for octet in octets:
+        if not octet.isdigit() or str(int(octet)) != octet or int(octet) > 255:
+            return address
+        packed = packed << 8 | int(octet)
+    return packed
+
+def unpack_address(address):
+    if isinstance(address, str):
+        return address
+    return f'{address >> 24}.{address >> 16 & 255}.{address >> 8 & 255}.{address & 255}'
+
+def to_columnar(records):
+    hostnames = {}
+    addresses = {}
+    pairs = []
+    previous_hostname = 0
+    for record in records:
+        hostname = hostnames.setdefault(record['hostname'], len(hostnames))
+        next_address = len(addresses)
+        address = addresses.setdefault(record['ip-address'], next_address)
+        pairs.append(hostname - previous_hostname)
+        pairs.append(next_address - address if address != next_address else 0)
+        previous_hostname = hostname
+
+    packed_addresses = []
+    previous_address = 0
+    for address in addresses:
+        address = pack_address(address)
+        if isinstance(address, int):
+            address, previous_address = address - previous_address, address
+        packed_addresses.append(address)
+
+    return {
+        'version': 2,
+        'hostnames': list(hostnames),
+        'addresses': packed_addresses,
+        'records': pairs,
+    }
+
+def from_columnar(document):
+    hostnames = document['hostnames']
+    addresses = []
+    previous_address = 0
+    for address in document['addresses']:
+        if isinstance(address, int):
+            previous_address += address
+            address = unpack_address(previous_address)
+        addresses.append(address)
+
+    # The n-th new address is the n-th address in the table, so a record's
+    # address index is the count of new addresses so far less its reference.
+    pairs = document['records']
+    references = pairs[1::2]
+    return [{'hostname': hostnames[hostname], 'ip-address': addresses[seen - (reference or 1)]}
+            for hostname, seen, reference in zip(itertools.accumulate(pairs[0::2]),
+                                                 itertools.accumulate(r == 0 for r in references),
+                                                 references)]
+
+def dumps(records, version=1):
+    if version == 2:
+        return json.dumps(to_columnar(records), separators=(',', ':')).encode('utf-8')
+    return json.dumps(records).encode('utf-8')
+
+def digest(records, version=1):
+    return hashlib.sha256(dumps(records, version)).hexdigest()
+
+def compress(data):
+    return gzip.compress(data, mtime=0)
+
+def encode(records, version=1):
+    return compress(dumps(records, version))
+
+def loads(data):
+    document = json.loads(data)
+    if isinstance(document, dict) and document.get('version') == 2 and 'records' in document:
+        return from_columnar(document)
+    return document
+
+def decode(data):
+    return loads(gzip.decompress(data))
+
+#
+# Records can be split into shards, each encoded like records.json.gz on
+# its own.  A record's shard depends only on its hostname, so every record
+# for a name lands in the same shard and a change to a few names rewrites
+# only the shards holding them.  Sorted records stay sorted within a shard.
+#
+def shard_index(hostname, shards):
+    return zlib.crc32(hostname.encode('utf-8')) % shards
+
+def partition_records(records, shards):
+    partitions = [[] for _ in range(shards)]
+    for record in records:
+        partitions[shard_index(record['hostname'], shards)].append(record)
+    return partitions
+
+def shard_path(index):
+    return f'records-{index}.json.gz'
+
+#
+# The canary record of a records generation points its name at a loopback
+# address derived from the generation, so an answer tells which generation
+# a resolver has loaded.
+#
+def canary_record(name, generation):
+    return {'hostname': name, 'ip-address': unpack_address(CANARY_NETWORK + generation % (1 << 22))}
+
+def canary_generation(address):
+    packed = pack_address(address)
+    if not isinstance(packed, int) or packed & ~((1 << 22) - 1) != CANARY_NETWORK:
+        return None
+    return packed - CANARY_NETWORK
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+import datetime
+import fcntl
+import os
+import time
+import zlib
+
+import kubeapi
+
+#
+# Coordination of full unbound reloads across replicas.
+#
+# A reload flushes unbound's caches, so replicas that all pick up the same
+# configmap write and reload together push their whole query load upstream
+# at once.  A semaphore of max_concurrent slots lets only that many replicas
+# reload at a time; each holds its slot until its reloaded unbound answers
+# again.
+#
+# Two backends are supported:
+#
+#   lease  one coordination.k8s.io Lease per slot, held by writing the pod
+#          name into it.  A slot whose holder has not renewed it within
+#          its lease duration is free again, so a pod dying mid-reload does
+#          not block the others for longer than that.
+#   file   one flock'd file per slot in a directory, for running several
+#          unbound instances on one host without a Kubernetes API.
+#
+
+LEASE_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+def format_lease_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime(LEASE_TIME_FORMAT)
+
+def parse_lease_time(value):
+    for time_format in (LEASE_TIME_FORMAT, '%Y-%m-%dT%H:%M:%SZ'):
+        try:
+            return datetime.datetime.strptime(value, time_format).replace(
+                tzinfo=datetime.timezone.utc).timestamp()
+        except (TypeError, ValueError):
+            continue
+    return 0.0
+
+#
+# A delay in [0, seconds) fixed per identity, so replicas that notice the
+# same change at the same moment still try for a slot at different times.
+#
+def jitter(identity, seconds):
+    if seconds <= 0:
+        return 0.0
+    return zlib.crc32(identity.encode('utf-8')) % int(seconds * 1000) / 1000
+
+class LeaseSemaphore(object):
+    """
+    At most `slots` holders at a time across pods, using one Lease per slot
+    named {prefix}-{slot}.
+
+    Example use:
+        semaphore = LeaseSemaphore(kubeapi.KubernetesAPI(), 'services',
+                                   'cray-dns-unbound-reload', 1, 'cray-dns-unbound-abc12')
+        if semaphore.acquire(timeout=600):
+            try:
+                reload()
+            finally:
+                semaphore.release()
+    """
+
+    def __init__(self, kube, namespace, prefix, slots, identity, duration=300):
+        self._kube = kube
+        self._namespace = namespace
+        self._prefix = prefix
+        self._slots = max(1, slots)
+        self._identity = identity
+        self._duration = int(duration)
+        self._held = None
+
+    def _lease_name(self, slot):
+        return f'{self._prefix}-{slot}'
+
+    def _spec(self, now):
+        return {'holderIdentity': self._identity, 'leaseDurationSeconds': self._duration,
+                'acquireTime': format_lease_time(now), 'renewTime': format_lease_time(now)}
+
+    def _try_slot(self, slot):
+        name = self._lease_name(slot)
+        now = time.time()
+        try:
+            lease = self._kube.get_lease(self._namespace, name)
+        except kubeapi.NotFoundError:
+            try:
+                self._kube.create_lease(self._namespace, {
+                    'apiVersion': 'coordination.k8s.io/v1', 'kind': 'Lease',
+                    'metadata': {'name': name, 'namespace': self._namespace},
+                    'spec': self._spec(now)})
+                return True
+            except kubeapi.ConflictError:
+                return False
+
+        spec = lease.get('spec') or {}
+        holder = spec.get('holderIdentity')
+        renewed = parse_lease_time(spec.get('renewTime') or spec.get('acquireTime'))
+        expired = renewed + int(spec.get('leaseDurationSeconds') or 0) < now
+        if holder and holder != self._identity and not expired:
+            return False
+        lease['spec'] = self._spec(now)
+        try:
+            self._kube.replace_lease(self._namespace, lease)
+            return True
+        except kubeapi.ConflictError:
+            return False
+
+    def acquire(self, timeout, poll=2.0):
+        deadline = time.monotonic() + timeout
+        # Start at a different slot per holder so they do not all contend for slot 0
+        first = zlib.crc32(self._identity.encode('utf-8')) % self._slots
+        while True:
+            for i in range(self._slots):
+                slot = (first + i) % self._slots
+                if self._try_slot(slot):
+                    self._held = slot
+                    return True
+            if time.monotonic() + poll > deadline:
+                return False
+            time.sleep(poll)
+
+    def release(self):
+        if self._held is None:
+            return
+        name = self._lease_name(self._held)
+        self._held = None
+        try:
+            lease = self._kube.get_lease(self._namespace, name)
+            if (lease.get('spec') or {}).get('holderIdentity') != self._identity:
+                return
+            lease['spec'] = dict(lease['spec'], holderIdentity=None)
+            self._kube.replace_lease(self._namespace, lease)
+        except Exception:
+            # The lease frees itself once its duration passes
+            pass
+
+    def describe(self):
+        return f'lease {self._lease_name(self._held)}'
+
+class FileSemaphore(object):
+    """
+    At most `slots` holders at a time across processes on one host, using
+    an exclusive flock on one file per slot in a directory.
+    """
+
+    def __init__(self, directory, slots):
+        self._directory = directory
+        self._slots = max(1, slots)
+        self._held = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, slot):
+        return os.path.join(self._directory, f'reload-{slot}.lock')
+
+    def acquire(self, timeout, poll=0.5):
+        deadline = time.monotonic() + timeout
+        while True:
+            for slot in range(self._slots):
+                fd = os.open(self._path(slot), os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    os.close(fd)
+                    continue
+                self._held = (slot, fd)
+                return True
+            if time.monotonic() + poll > deadline:
+                return False
+            time.sleep(poll)
+
+    def release(self):
+        if self._held is None:
+            return
+        fd = self._held[1]
+        self._held = None
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def describe(self):
+        return f'lock {self._path(self._held[0])}'
+
+#
+# The semaphore configured by UNBOUND_RELOAD_COORDINATION, None when
+# reloads are not coordinated.
+#
+def from_environment():
+    mode = os.environ.get('UNBOUND_RELOAD_COORDINATION', '').lower()
+    slots = int(os.environ.get('UNBOUND_RELOAD_MAX_CONCURRENT', '1'))
+    if mode == 'lease':
+        return LeaseSemaphore(kubeapi.KubernetesAPI(timeout=(5, 10)),
+                              os.environ['KUBERNETES_NAMESPACE'],
+                              os.environ.get('UNBOUND_RELOAD_LEASE_PREFIX', 'cray-dns-unbound-reload'),
+                              slots, os.environ.get('POD_NAME') or os.uname().nodename,
+                              int(os.environ.get('UNBOUND_RELOAD_LEASE_SECONDS', '300')))
+    if mode == 'file':
+        return FileSemaphore(os.environ.get('UNBOUND_RELOAD_LOCK_DIRECTORY', '/var/run/unbound/reload'), slots)
+    return None
@@ -1,14 +1,100 @@
 #!/usr/bin/env python3
 # Copyright 2014-2022 Hewlett Packard Enterprise Development LP
 
+import codecs
+import json
 import subprocess
 
-def run_command(cmd):
+def run_command(cmd, quiet=False):
     p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     output = p.stdout.decode('utf-8')
     err = p.stderr.decode('utf-8')
-    print("Stdout:\n" + output)
+    # quiet skips echoing stdout, e.g. for large objects returned by kubectl
+    if not quiet:
+        print("Stdout:\n" + output)
     print("Stderr:\n" + err)
     if p.returncode != 0:
         raise SystemExit('Error running command')
     return output
+
+#
+# Incrementally decode a JSON array from an iterable of byte chunks, yielding
+# one item at a time so the whole document never has to be held in memory.
+# When key is given the document is an object and the array stored under
+# that top-level key is walked instead; other members are skipped.
+#
+def iter_json_array(chunks, key=None):
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    state = {'buffer': '', 'pos': 0, 'eof': False}
+
+    def fill():
+        # Drop consumed text and append the next chunk, False at end of input
+        if state['eof']:
+            return False
+        try:
+            chunk = utf8.decode(next(chunks))
+        except StopIteration:
+            chunk = utf8.decode(b'', final=True)
+            state['eof'] = True
+        state['buffer'] = state['buffer'][state['pos']:] + chunk
+        state['pos'] = 0
+        return True
+
+    def peek():
+        # Skip whitespace and return the next significant character
+        while True:
+            buffer = state['buffer']
+            pos = state['pos']
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            state['pos'] = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def expect(chars):
+        char = peek()
+        if char not in chars:
+            raise ValueError(f'Expected one of {chars!r} in JSON document, found {char!r}')
+        state['pos'] += 1
+        return char
+
+    def value():
+        # A value is only complete once it is followed by a delimiter,
+        # otherwise it may be a number or literal cut off by the chunking.
+        peek()
+        while True:
+            try:
+                item, end = decoder.raw_decode(state['buffer'], state['pos'])
+                if (end < len(state['buffer']) and state['buffer'][end] in ' \t\r\n,:]}') or \
+                        state['eof']:
+                    state['pos'] = end
+                    return item
+            except json.JSONDecodeError:
+                if state['eof']:
+                    raise
+            fill()
+
+    if key is not None:
+        expect('{')
+        if peek() == '}':
+            return
+        while True:
+            member = value()
+            expect(':')
+            if member == key:
+                break
+            value()
+            if expect(',}') == '}':
+                return
+
+    expect('[')
+    if peek() == ']':
+        return
+    while True:
+        yield value()
+        if expect(',]') == ']':
+            return
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+import glob
+import gzip
+import hashlib
+import json
+import os
+
+class SnapshotCache(object):
+    """
+    Persistent cache of upstream responses and derived manager data, stored
+    as gzip'd JSON files named by the SHA-256 of their inputs.
+
+    Upstream responses are kept together with their ETag/Last-Modified
+    validators so unchanged sources can be fetched conditionally.  Derived
+    stage outputs are memoized by a key built from the digests of the
+    inputs they were computed from.  A cache without a directory is
+    disabled and every lookup misses.
+
+    Example use:
+        cache = SnapshotCache.from_environment()
+        key = cache.key('kea', kea_digest)
+        records, hit = cache.memoize('kea', key, lambda: merge(kea))
+    """
+
+    def __init__(self, directory=None, keep=4):
+        self.directory = directory
+        self.enabled = bool(directory)
+        self._keep = keep
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_environment(cls):
+        return cls(os.environ.get('MANAGER_CACHE_DIRECTORY') or None)
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256('\0'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def _path(self, kind, key):
+        return os.path.join(self.directory, f'{kind}.{key}.json.gz')
+
+    def _write(self, path, value):
+        tmp = path + '.tmp'
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+    def get(self, kind, key):
+        if not self.enabled:
+            return None
+        path = self._path(kind, key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def put(self, kind, key, value):
+        if not self.enabled:
+            return
+        self._write(self._path(kind, key), value)
+
+        # Only the most recently used entries of each kind are worth keeping
+        entries = sorted(glob.glob(self._path(kind, '*')), key=os.path.getmtime, reverse=True)
+        for stale in entries[self._keep:]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+    def memoize(self, kind, key, compute):
+        value = self.get(kind, key)
+        if value is not None:
+            return value, True
+        value = compute()
+        self.put(kind, key, value)
+        return value, False
+
+    #
+    # Upstream responses, kept per source with the validators of the
+    # response they came from.
+    #
+    def get_source(self, name, digest):
+        return self.get(f'source-{name}', digest)
+
+    def get_validators(self, name):
+        validators = self.get(f'validators-{name}', 'current')
+        if validators is None or not os.path.isfile(self._path(f'source-{name}', validators['digest'])):
+            return None
+        return validators
+
+    def put_source(self, name, digest, value, etag=None, last_modified=None):
+        self.put(f'source-{name}', digest, value)
+        self.put(f'validators-{name}', 'current',
+                 {'etag': etag, 'last_modified': last_modified, 'digest': digest})
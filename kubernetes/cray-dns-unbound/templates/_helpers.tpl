@@ -47,3 +47,12 @@ app.kubernetes.io/name: {{ include "cray-dns-unbound.name" . }}
 app.kubernetes.io/instance: {{ .Release.Name }}
 app.kubernetes.io/managed-by: {{ .Release.Service }}
 {{- end -}}
+
+{{/*
+Zones unbound answers only from the records, never recursing for them.  They
+are static local zones, or auth zones written by initialize.py with
+recordsFormat auth-zone.
+*/}}
+{{- define "cray-dns-unbound.recordZones" -}}
+local nmn. hmn. mtl. hsn. can. cmn. chn.
+{{- end -}}
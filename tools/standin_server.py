@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# Copyright 2026 Hewlett Packard Enterprise Development LP
+
+#
+# Local stand-in for the Kea, SMD, SLS and Kubernetes ConfigMap APIs used by
+# manager.py, so the manager can be run end to end without a CSM cluster.
+# It also serves the Leases initialize.py coordinates reloads with.
+#
+# Responses come from a recorded JSON file (an object keyed by source name,
+# as written by benchmarks/synthetic.py) or are generated for --nodes compute
+# nodes.  Latency, throttling (429/503 with Retry-After) and empty responses
+# can be injected per run to exercise retries and the api_errors paths, and
+# --etag answers conditional GETs with 304 Not Modified.
+#
+# Example:
+#   tools/standin_server.py --nodes 5000 --latency 0.2 --fail-first 2 &
+#   export KEA_API_ENDPOINT=http://127.0.0.1:8080 SMD_API_ENDPOINT=http://127.0.0.1:8080 \
+#          SLS_API_ENDPOINT=http://127.0.0.1:8080 KUBERNETES_API_ENDPOINT=http://127.0.0.1:8080
+#   export PATH=$PWD/tools:$PATH LOG_LEVEL=INFO KUBERNETES_NAMESPACE=services \
+#          KUBERNETES_UNBOUND_CONFIGMAP_NAME=cray-dns-unbound
+#   (cd kubernetes/cray-dns-unbound/files && ./manager.py)
+#
+
+import argparse
+import collections
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+import synthetic
+
+# Routes manager.py calls, by source name
+ROUTES = {
+    '/': 'kea',
+    '/hsm/v2/Inventory/EthernetInterfaces': 'smd_ethernet_interfaces',
+    '/hsm/v2/State/Components/': 'smd_state_components',
+    '/v1/hardware': 'sls_hardware',
+    '/v1/networks': 'sls_networks',
+}
+
+# What each source returns when it is emptied
+EMPTY = {
+    'kea': [],
+    'smd_ethernet_interfaces': [],
+    'smd_state_components': {'Components': []},
+    'sls_hardware': [],
+    'sls_networks': [],
+}
+
+CONFIGMAP_ROUTE = re.compile(r'^/api/v1/namespaces/([^/]+)/configmaps/([^/?]+)$')
+LEASE_ROUTE = re.compile(r'^/apis/coordination.k8s.io/v1/namespaces/([^/]+)/leases(?:/([^/?]+))?$')
+
+# base64 of a gzip'd empty records list
+EMPTY_RECORDS = 'H4sICLQ/Z2AAA3JlY29yZHMuanNvbgCLjuUCAETSaHADAAAA'
+
+def merge_patch(target, patch):
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_patch(target[key], value)
+        else:
+            target[key] = value
+
+class StandIn(object):
+    """
+    Shared state of the stand-in server: pre-encoded responses, fault
+    injection settings, ConfigMaps and request statistics.
+    """
+
+    def __init__(self, payloads, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+        self.failures = collections.Counter()
+        self.random = random.Random(args.seed)
+        self.configmaps = {}
+        self.leases = {}
+        if args.configmap_file and os.path.isfile(args.configmap_file):
+            with open(args.configmap_file) as f:
+                configmaps = json.load(f)
+            # A list of ConfigMaps, or a single one
+            for configmap in configmaps if isinstance(configmaps, list) else [configmaps]:
+                self.configmaps[(configmap['metadata']['namespace'], configmap['metadata']['name'])] = configmap
+
+        # Encode every response once so the server is never the bottleneck
+        self.bodies = {}
+        for source in EMPTY:
+            document = EMPTY[source] if source in args.empty else payloads[source]
+            body = json.dumps(document).encode('utf-8')
+            self.bodies[source] = (body, gzip.compress(body, compresslevel=6))
+        self.etags = {source: '"' + hashlib.sha256(self.bodies[source][0]).hexdigest()[:32] + '"'
+                      for source in self.bodies}
+
+    def configmap(self, namespace, name):
+        key = (namespace, name)
+        if key not in self.configmaps:
+            self.configmaps[key] = {
+                'apiVersion': 'v1', 'kind': 'ConfigMap',
+                'metadata': {'name': name, 'namespace': namespace, 'resourceVersion': '1',
+                             'annotations': {}},
+                'binaryData': {'records.json.gz': EMPTY_RECORDS},
+                'data': {'unbound.conf': '', 'custom_records.conf': ''},
+            }
+        return self.configmaps[key]
+
+    def save_configmaps(self):
+        if self.args.configmap_file:
+            tmp = self.args.configmap_file + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(list(self.configmaps.values()), f)
+            os.replace(tmp, self.args.configmap_file)
+
+    def should_fail(self, source):
+        with self.lock:
+            self.failures[source] += 1
+            if self.failures[source] <= self.args.fail_first:
+                return True
+            return self.random.random() < self.args.throttle
+
+    def count(self, route, status):
+        with self.lock:
+            self.stats[(route, status)] += 1
+
+    def report(self):
+        print('requests by route and status:', file=sys.stderr)
+        for (route, status), count in sorted(self.stats.items()):
+            print(f'  {route} {status} {count}', file=sys.stderr)
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    standin = None
+
+    def reply(self, status, body, content_encoding=None, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if content_encoding:
+            self.send_header('Content-Encoding', content_encoding)
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reply_json(self, status, document):
+        self.reply(status, json.dumps(document).encode('utf-8'))
+
+    def handle_request(self):
+        standin = self.standin
+        length = int(self.headers.get('Content-Length') or 0)
+        request_body = self.rfile.read(length) if length else b''
+        route = self.path.split('?', 1)[0]
+
+        match = CONFIGMAP_ROUTE.match(route)
+        if match:
+            status = self.handle_configmap(match.group(1), match.group(2), request_body)
+            standin.count('configmap', status)
+            return
+
+        match = LEASE_ROUTE.match(route)
+        if match:
+            status = self.handle_lease(match.group(1), match.group(2), request_body)
+            standin.count('lease', status)
+            return
+
+        source = ROUTES.get(route)
+        if source is None or (source == 'kea') != (self.command == 'POST'):
+            standin.count(route, 404)
+            return self.reply_json(404, {'message': f'{self.command} {route} not found'})
+
+        args = standin.args
+        if args.latency or args.jitter:
+            time.sleep(args.latency + standin.random.uniform(0, args.jitter))
+
+        if standin.should_fail(source):
+            status = standin.random.choice(args.throttle_status)
+            standin.count(route, status)
+            headers = [('Retry-After', str(args.retry_after))] if args.retry_after else []
+            return self.reply(status, b'{"message": "injected failure"}', headers=headers)
+
+        headers = []
+        if args.etag and self.command == 'GET':
+            etag = standin.etags[source]
+            if self.headers.get('If-None-Match') == etag:
+                standin.count(route, 304)
+                return self.reply(304, b'', headers=[('ETag', etag)])
+            headers.append(('ETag', etag))
+
+        body, gzipped = standin.bodies[source]
+        standin.count(route, 200)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            return self.reply(200, gzipped, content_encoding='gzip', headers=headers)
+        return self.reply(200, body, headers=headers)
+
+    def handle_configmap(self, namespace, name, request_body):
+        standin = self.standin
+        with standin.lock:
+            configmap = standin.configmap(namespace, name)
+            if self.command == 'GET':
+                self.reply_json(200, configmap)
+                return 200
+            if self.command not in ('PATCH', 'PUT'):
+                self.reply_json(405, {'message': f'{self.command} not supported'})
+                return 405
+
+            patch = json.loads(request_body)
+            resource_version = patch.get('metadata', {}).pop('resourceVersion', None)
+            if resource_version is not None and resource_version != configmap['metadata']['resourceVersion']:
+                self.reply_json(409, {'reason': 'Conflict',
+                                      'message': f'resourceVersion {resource_version} is stale'})
+                return 409
+            if self.command == 'PUT':
+                patch['metadata'] = dict(patch.get('metadata', {}), namespace=namespace, name=name)
+                configmap.clear()
+            merge_patch(configmap, patch)
+            configmap['metadata']['resourceVersion'] = str(int(configmap['metadata'].get('resourceVersion', '0')) + 1)
+            standin.save_configmaps()
+            self.reply_json(200, configmap)
+            return 200
+
+    def handle_lease(self, namespace, name, request_body):
+        standin = self.standin
+        with standin.lock:
+            if self.command == 'POST' and name is None:
+                lease = json.loads(request_body)
+                key = (namespace, lease['metadata']['name'])
+                if key in standin.leases:
+                    self.reply_json(409, {'reason': 'AlreadyExists', 'message': f'lease {key[1]} exists'})
+                    return 409
+                lease['metadata'].update(namespace=namespace, resourceVersion='1')
+                standin.leases[key] = lease
+                self.reply_json(201, lease)
+                return 201
+            lease = standin.leases.get((namespace, name))
+            if lease is None:
+                self.reply_json(404, {'reason': 'NotFound', 'message': f'lease {name} not found'})
+                return 404
+            if self.command == 'GET':
+                self.reply_json(200, lease)
+                return 200
+            if self.command != 'PUT':
+                self.reply_json(405, {'message': f'{self.command} not supported'})
+                return 405
+            replacement = json.loads(request_body)
+            if replacement['metadata'].get('resourceVersion') != lease['metadata']['resourceVersion']:
+                self.reply_json(409, {'reason': 'Conflict', 'message': f'lease {name} was modified'})
+                return 409
+            replacement['metadata']['resourceVersion'] = str(int(lease['metadata']['resourceVersion']) + 1)
+            standin.leases[(namespace, name)] = replacement
+            self.reply_json(200, replacement)
+            return 200
+
+    do_GET = do_POST = do_PATCH = do_PUT = handle_request
+
+    def log_message(self, format, *args):
+        if self.standin.args.verbose:
+            super().log_message(format, *args)
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in Kea/SMD/SLS/ConfigMap API server for manager.py.')
+    parser.add_argument('--bind', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--data', help='recorded responses, a JSON object keyed by source name')
+    parser.add_argument('--nodes', type=int, default=1000, help='compute nodes to generate without --data')
+    parser.add_argument('--hsn-nics', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra random seconds')
+    parser.add_argument('--throttle', type=float, default=0.0,
+                        help='fraction of requests rejected with a --throttle-status')
+    parser.add_argument('--throttle-status', type=int, action='append',
+                        help='status for rejected requests, may be repeated (default: 429 and 503)')
+    parser.add_argument('--retry-after', type=int, default=0, help='Retry-After seconds on rejections')
+    parser.add_argument('--fail-first', type=int, default=0,
+                        help='reject the first N requests for each source')
+    parser.add_argument('--empty', action='append', default=[], choices=sorted(EMPTY),
+                        help='serve an empty response for this source, may be repeated')
+    parser.add_argument('--etag', action='store_true',
+                        help='send ETags and answer matching If-None-Match GETs with 304')
+    parser.add_argument('--configmap-file', help='persist the ConfigMaps to this JSON file')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+    if not args.throttle_status:
+        args.throttle_status = [429, 503]
+
+    if args.data:
+        with open(args.data) as f:
+            payloads = json.load(f)
+    else:
+        payloads = synthetic.generate(args.nodes, hsn_nics=args.hsn_nics)
+
+    Handler.standin = StandIn(payloads, args)
+    server = ThreadingHTTPServer((args.bind, args.port), Handler)
+    server.daemon_threads = True
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f'Serving on http://{args.bind}:{server.server_port}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        Handler.standin.report()
+
+if __name__ == "__main__":
+    main()